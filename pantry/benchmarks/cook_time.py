@@ -0,0 +1,157 @@
+"""
+Benchmark of the time it takes to build and cook the networks of the lenet and mlp tutorials.
+The layers are added and the network is cooked exactly as in ``pantry/tutorials/lenet.py`` and
+``pantry/tutorials/mlp.py``, but the networks are not trained. The seconds spent adding the
+layers, the seconds spent cooking and how many of those went into compiling functions, the
+number of layer objects in the three streams of the network and the number of symbolic nodes
+behind them are reported. Cooking also visualizes the network once, which runs the network and
+can take longer than compiling it.
+
+Run this as ``python -m pantry.benchmarks.cook_time [dataset]``. If no dataset is provided, a
+synthetic one is created.
+"""
+import time
+import theano
+from yann.network import network
+
+def _network ( dataset, verbose = 1 ):
+    """
+    Makes the network of the tutorials with their optimizer and datastream.
+    """
+    optimizer_params =  {
+                "momentum_type"       : 'polyak',
+                "momentum_params"     : (0.9, 0.95, 30),
+                "regularization"      : (0.0001, 0.0001),
+                "optimizer_type"      : 'adagrad',
+                "id"                  : "main"
+                        }
+    dataset_params  = {
+                "dataset"   : dataset,
+                "svm"       : False,
+                "n_classes" : 10,
+                "id"        : 'data'
+                        }
+    net = network( borrow = True, verbose = verbose )
+    net.add_module ( type = 'optimizer', params = optimizer_params, verbose = verbose )
+    net.add_module ( type = 'datastream', params = dataset_params, verbose = verbose )
+    net.add_layer ( type = "input", id = "input", datastream_origin = 'data',
+                    verbose = verbose )
+    return net
+
+def add_mlp ( net, verbose = 1 ):
+    """
+    Adds the layers of ``pantry/tutorials/mlp.py``.
+    """
+    net.add_layer ( type = "dot_product", origin = "input", id = "dot_product_1",
+                    num_neurons = 800, activation = 'relu', verbose = verbose )
+    net.add_layer ( type = "dot_product", origin = "dot_product_1", id = "dot_product_2",
+                    num_neurons = 800, activation = 'relu', verbose = verbose )
+    net.add_layer ( type = "classifier", id = "softmax", origin = "dot_product_2",
+                    num_classes = 10, activation = 'softmax', verbose = verbose )
+    net.add_layer ( type = "objective", id = "obj", origin = "softmax", verbose = verbose )
+
+def add_lenet ( net, verbose = 1 ):
+    """
+    Adds the layers of ``lenet5`` in ``pantry/tutorials/lenet.py``.
+    """
+    net.add_layer ( type = "conv_pool", origin = "input", id = "conv_pool_1",
+                    num_neurons = 20, filter_size = (5,5), pool_size = (2,2),
+                    activation = 'relu', regularize = True, verbose = verbose )
+    net.add_layer ( type = "conv_pool", origin = "conv_pool_1", id = "conv_pool_2",
+                    num_neurons = 50, filter_size = (3,3), pool_size = (2,2),
+                    activation = 'relu', regularize = True, verbose = verbose )
+    net.add_layer ( type = "dot_product", origin = "conv_pool_2", id = "dot_product_1",
+                    num_neurons = 1250, activation = 'relu', regularize = True,
+                    verbose = verbose )
+    net.add_layer ( type = "dot_product", origin = "dot_product_1", id = "dot_product_2",
+                    num_neurons = 1250, activation = 'relu', regularize = True,
+                    verbose = verbose )
+    net.add_layer ( type = "classifier", id = "softmax", origin = "dot_product_2",
+                    num_classes = 10, regularize = True, activation = 'softmax',
+                    verbose = verbose )
+    net.add_layer ( type = "objective", id = "obj", origin = "softmax", objective = "nll",
+                    datastream_origin = 'data', regularization = (0.0001, 0.0001),
+                    verbose = verbose )
+
+def graph_size ( net ):
+    """
+    Counts the layer objects in the three streams of ``net`` and the symbolic nodes that
+    compute their outputs.
+
+    Returns:
+        tuple: ``(layers, nodes)``
+    """
+    layers = {}
+    for stream in [net.dropout_layers, net.layers, net.inference_layers]:
+        for layer in stream.values():
+            layers[id(layer)] = layer
+    outputs = []
+    for layer in layers.values():
+        for output in [layer.output, layer.inference]:
+            if isinstance(output, theano.Variable):
+                outputs.append(output)
+    nodes = set()
+    for variable in theano.gof.graph.ancestors(outputs):
+        if variable.owner is not None:
+            nodes.add(variable.owner)
+    return len(layers), len(nodes)
+
+def cook_time_benchmark ( dataset, repeats = 3, verbose = 1 ):
+    """
+    Times adding the layers and cooking both tutorial networks and prints the results.
+
+    Args:
+        dataset: location of the dataset.
+        repeats: the best of these many runs is reported.
+        verbose: as always
+
+    Returns:
+        dict: ``(build seconds, cook seconds, compile seconds, layers, nodes)`` of each network.
+    """
+    results = {}
+    for name, add in [('mlp', add_mlp), ('lenet', add_lenet)]:
+        build_times = []
+        cook_times = []
+        compile_times = []
+        for count in xrange(repeats):
+            net = _network( dataset, verbose = 0 )
+            start = time.time()
+            add( net, verbose = 0 )
+            build_times.append(time.time() - start)
+
+            compiling = [0.]
+            function = net._function
+            def timed_function(**kwargs):
+                start = time.time()
+                compiled = function(**kwargs)
+                compiling[0] = compiling[0] + time.time() - start
+                return compiled
+            net._function = timed_function
+
+            start = time.time()
+            net.cook( optimizer = 'main', objective_layer = 'obj', datastream = 'data',
+                      classifier_layer = 'softmax', verbose = 0 )
+            cook_times.append(time.time() - start)
+            compile_times.append(compiling[0])
+        layers, nodes = graph_size(net)
+        results[name] = (min(build_times), min(cook_times), min(compile_times), layers, nodes)
+        if verbose >= 1:
+            print(". " + name)
+            print(".. Seconds to add the layers : " + str(min(build_times)))
+            print(".. Seconds to cook           : " + str(min(cook_times)))
+            print(".. Seconds compiling         : " + str(min(compile_times)))
+            print(".. Layer objects             : " + str(layers))
+            print(".. Symbolic nodes            : " + str(nodes))
+    return results
+
+## Boiler Plate ##
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) > 1:
+        dataset = sys.argv[1]
+    else:
+        from pantry.benchmarks.synthetic import cook_synthetic
+        dataset = cook_synthetic ( mini_batch_size = 20,
+                                   mini_batches_per_batch = (10, 5, 5),
+                                   batches = (1, 1, 1) )
+    cook_time_benchmark ( dataset )
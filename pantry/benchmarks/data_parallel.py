@@ -0,0 +1,78 @@
+"""
+Scaling benchmark for :mod:`yann.special.data_parallel`. The same mlp is trained with 1, 2, 4
+and 8 workers and the time taken per epoch, the speed up over one worker and the fewest
+validation errors are reported. Each worker needs a core of its own for the epoch time to
+go down, so run this with ``OMP_NUM_THREADS=1``.
+
+Run this as ``python -m pantry.benchmarks.data_parallel [dataset]``. Cook MNIST with
+:mod:`yann.special.datasets.cook_mnist` and supply its location to scale on MNIST. If no dataset
+is provided, a synthetic one of the same shape is created.
+"""
+import time
+from yann.special.data_parallel import data_parallel
+
+def train_epochs ( dataset, workers, average_after = 1, epochs = 2, verbose = 1 ):
+    """
+    Builds an mlp, trains it on ``workers`` processes and returns the seconds taken per epoch
+    and the fewest validation errors.
+
+    Args:
+        dataset: location of the dataset.
+        workers: number of worker processes.
+        average_after: mini batches between averaging the parameters.
+        epochs: number of epochs to time.
+        verbose: as always
+    """
+    dataset_params  = { "dataset"   : dataset,
+                        "svm"       : False,
+                        "n_classes" : 10,
+                        "id"        : 'data' }
+    net = data_parallel( workers = workers, average_after = average_after, verbose = verbose )
+    net.add_module ( type = 'datastream', params = dataset_params, verbose = verbose )
+    net.add_layer ( type = "input", id = "input", datastream_origin = 'data', verbose = verbose )
+    net.add_layer ( type = "dot_product", id = "fc1", origin = "input", num_neurons = 800,
+                    activation = 'relu', verbose = verbose )
+    net.add_layer ( type = "dot_product", id = "fc2", origin = "fc1", num_neurons = 800,
+                    activation = 'relu', verbose = verbose )
+    net.add_layer ( type = "classifier", id = "softmax", origin = "fc2", num_classes = 10,
+                    verbose = verbose )
+    net.add_layer ( type = "objective", id = "obj", origin = "softmax", verbose = verbose )
+    net.cook( verbose = verbose )
+
+    start = time.time()
+    net.train( epochs = (epochs, 1), show_progress = False, verbose = verbose )
+    seconds = (time.time() - start) / (epochs + 1)
+    return seconds, net.best_validation_errors
+
+def data_parallel_benchmark ( dataset, workers = (1, 2, 4, 8), epochs = 2, verbose = 1 ):
+    """
+    Times training with each number of workers and prints the results.
+
+    Args:
+        dataset: location of the dataset.
+        workers: numbers of workers to time.
+        epochs: number of epochs to time.
+        verbose: as always
+    """
+    baseline = None
+    for count in workers:
+        seconds, errors = train_epochs( dataset, workers = count, epochs = epochs,
+                                                                        verbose = verbose )
+        if baseline is None:
+            baseline = seconds
+        print(". Workers : " + str(count))
+        print(".. Seconds per epoch                : " + str(seconds))
+        print(".. Speed up                         : " + str(baseline / seconds))
+        print(".. Best validation errors           : " + str(errors))
+
+## Boiler Plate ##
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) > 1:
+        dataset = sys.argv[1]
+    else:
+        from pantry.benchmarks.synthetic import cook_synthetic
+        dataset = cook_synthetic ( mini_batch_size = 100,
+                                   mini_batches_per_batch = (100, 20, 20),
+                                   batches = (5, 1, 1) )
+    data_parallel_benchmark ( dataset )
@@ -0,0 +1,75 @@
+"""
+Benchmark for the ``fused_train`` option of ``network.cook``. The same network is trained
+with one theano call per mini batch and with one theano call per cached batch, and the time
+taken per epoch is reported. Small networks such as the logistic regression and the mlp from
+the tutorials benefit the most.
+
+Run this as ``python -m pantry.benchmarks.fused_train [dataset]``. If no dataset is provided, a
+synthetic one is created.
+"""
+import time
+from yann.network import network
+
+def train_epochs ( dataset, fused_train, hidden = None, epochs = 2, verbose = 1 ):
+    """
+    Builds a logistic regression or a small mlp, trains it and returns the seconds taken per
+    epoch.
+
+    Args:
+        dataset: location of the dataset.
+        fused_train: supplied to ``cook``.
+        hidden: number of neurons in the hidden layer. If ``None``, logistic regression.
+        epochs: number of epochs to time.
+        verbose: as always
+    """
+    dataset_params  = { "dataset"   : dataset,
+                        "svm"       : False,
+                        "n_classes" : 10,
+                        "id"        : 'data' }
+    net = network( verbose = verbose )
+    net.add_module ( type = 'datastream', params = dataset_params, verbose = verbose )
+    net.add_layer ( type = "input", id = "input", datastream_origin = 'data', verbose = verbose )
+    origin = "input"
+    if hidden is not None:
+        net.add_layer ( type = "dot_product", id = "fc", origin = "input",
+                        num_neurons = hidden, activation = 'relu', verbose = verbose )
+        origin = "fc"
+    net.add_layer ( type = "classifier", id = "softmax", origin = origin, num_classes = 10,
+                    verbose = verbose )
+    net.add_layer ( type = "objective", id = "obj", origin = "softmax", verbose = verbose )
+    net.cook( fused_train = fused_train, verbose = verbose )
+
+    start = time.time()
+    net.train( epochs = epochs, show_progress = False, verbose = verbose )
+    return (time.time() - start) / epochs
+
+def fused_train_benchmark ( dataset, epochs = 2, verbose = 1 ):
+    """
+    Times training with and without ``fused_train`` and prints the results.
+
+    Args:
+        dataset: location of the dataset.
+        epochs: number of epochs to time.
+        verbose: as always
+    """
+    for name, hidden in [('logistic regression', None), ('mlp', 200)]:
+        unfused = train_epochs( dataset, fused_train = False, hidden = hidden,
+                                                        epochs = epochs, verbose = verbose )
+        fused = train_epochs( dataset, fused_train = True, hidden = hidden,
+                                                        epochs = epochs, verbose = verbose )
+        print(". " + name)
+        print(".. Seconds per epoch, one call per mini batch : " + str(unfused))
+        print(".. Seconds per epoch, one call per batch      : " + str(fused))
+        print(".. Speed up                                   : " + str(unfused / fused))
+
+## Boiler Plate ##
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) > 1:
+        dataset = sys.argv[1]
+    else:
+        from pantry.benchmarks.synthetic import cook_synthetic
+        dataset = cook_synthetic ( mini_batch_size = 20,
+                                   mini_batches_per_batch = (200, 50, 50),
+                                   batches = (2, 1, 1) )
+    fused_train_benchmark ( dataset )
@@ -0,0 +1,81 @@
+"""
+Benchmark of the time it takes to import the toolbox. Every module is imported in a fresh python
+process, after ``theano`` and ``numpy``, which every process that uses the toolbox needs anyway.
+The time taken by the import on top of those and the optional dependencies it loaded are
+reported. Workers that only run a cooked or exported network pay this on every spawn.
+
+Run this as ``python -m pantry.benchmarks.imports [repeats]``.
+
+Notes:
+    ``python -X importtime`` is not there in python 2, so the import is timed inside the fresh
+    process instead.
+"""
+import sys
+import json
+import subprocess
+
+modules = [ 'yann.network',
+            'yann.modules.datastream',
+            'yann.modules.visualizer',
+            'yann.utils.dataset',
+            'yann.utils.export',
+            'yann.special.gan' ]
+
+# optional dependencies that should be loaded only by the features that need them.
+optional = [ 'progressbar', 'networkx', 'matplotlib', 'scipy.io', 'scipy.misc', 'skdata',
+             'theano.d3viz' ]
+
+_script = """
+import sys, time, json
+import numpy, theano
+before = [name for name in %r if sys.modules.get(name) is not None]
+start = time.time()
+__import__(%r)
+seconds = time.time() - start
+print(json.dumps([seconds, [name for name in %r if sys.modules.get(name) is not None and
+                                                                    not name in before]]))
+"""
+
+def time_import ( module ):
+    """
+    Imports ``module`` in a fresh process.
+
+    Args:
+        module: name of the module to import.
+
+    Returns:
+        tuple: ``(seconds, loaded)``, the time the import took and the optional dependencies
+            it loaded, leaving out those that ``theano`` had already loaded.
+    """
+    output = subprocess.check_output([sys.executable, '-c',
+                                      _script % (optional, module, optional)])
+    seconds, loaded = json.loads(output.strip().split('\n')[-1])
+    return seconds, loaded
+
+def imports_benchmark ( repeats = 5, verbose = 1 ):
+    """
+    Times the import of every module and prints the results.
+
+    Args:
+        repeats: the best of these many imports is reported.
+        verbose: as always
+
+    Returns:
+        dict: ``(seconds, loaded)`` of each module.
+    """
+    results = {}
+    for module in modules:
+        runs = [time_import(module) for count in xrange(repeats)]
+        seconds = min([run[0] for run in runs])
+        loaded = runs[0][1]
+        results[module] = (seconds, loaded)
+        if verbose >= 1:
+            print(".. " + module.ljust(26) + " %.3f s" % seconds + \
+                  (", loaded " + ', '.join(loaded) if len(loaded) > 0 else ""))
+    return results
+
+if __name__ == '__main__':
+    repeats = 5
+    if len(sys.argv) > 1:
+        repeats = int(sys.argv[1])
+    imports_benchmark(repeats = repeats)
@@ -0,0 +1,83 @@
+"""
+Micro benchmark of :mod:`yann.core.activations.Maxout`. The maxout of a layer is timed forward
+and backward against the way it used to be built, by chaining ``T.maximum`` over ``maxout_size``
+strided slices of the channels. Both 1D maxout of a fully connected layer and 2D maxout of a
+convolutional layer are timed.
+
+Run this as ``python -m pantry.benchmarks.maxout``.
+"""
+import time
+import numpy
+import theano
+import theano.tensor as T
+from yann.core.activations import Maxout
+
+def strided_maxout ( x, maxout_size, dimension = 1 ):
+    """
+    Maxout built the old way, for comparison.
+
+    Args:
+        x: ``theano.tensor`` whose second dimension is the channels to maxout from.
+        maxout_size: number of channels reduced to one.
+        dimension: ``1`` or ``2`` as in ``Maxout``.
+    """
+    output = None
+    for i in xrange(maxout_size):
+        if dimension == 1:
+            temp = x[:, i::maxout_size]
+        else:
+            temp = x[:, i::maxout_size, :, :]
+        output = temp if output is None else T.maximum(output, temp)
+    return output
+
+def _compile ( x, output ):
+    """
+    Returns the forward function and the function that also runs the backward pass.
+    """
+    forward = theano.function([x], output)
+    backward = theano.function([x], T.grad(output.sum(), x))
+    return forward, backward
+
+def _time ( function, data, repeats ):
+    """
+    Returns the best of ``repeats`` runs of ``function`` on ``data`` in seconds.
+    """
+    function(data)
+    best = numpy.inf
+    for i in xrange(repeats):
+        start = time.time()
+        function(data)
+        best = min(best, time.time() - start)
+    return best
+
+def maxout_benchmark ( repeats = 10, verbose = 1 ):
+    """
+    Times the strided and the reshaped maxout and prints the results.
+
+    Args:
+        repeats: the best of these many runs is reported.
+        verbose: as always
+    """
+    cases = [ ('1D', (500, 2400), 4),
+              ('2D', (100, 96, 24, 24), 2),
+              ('2D', (100, 96, 12, 12), 4) ]
+    for name, shape, maxout_size in cases:
+        dimension = len(shape) - 1 if len(shape) == 2 else 2
+        x = T.matrix('x') if dimension == 1 else T.tensor4('x')
+        data = numpy.random.uniform(size = shape).astype(theano.config.floatX)
+        reshaped, _ = Maxout(x, maxout_size = maxout_size, input_size = shape,
+                             dimension = dimension)
+        strided = strided_maxout(x, maxout_size = maxout_size, dimension = dimension)
+        print(". " + name + " maxout of " + str(shape) + " by " + str(maxout_size))
+        times = []
+        for label, output in [('strided ', strided), ('reshaped', reshaped)]:
+            forward, backward = _compile(x, output)
+            times.append((_time(forward, data, repeats), _time(backward, data, repeats)))
+            print(".. " + label + " forward : " + str(times[-1][0]) +
+                                            " s, forward and backward : " + str(times[-1][1]) + " s")
+        print(".. Speed up forward : " + str(times[0][0] / times[1][0]) +
+                                    ", forward and backward : " + str(times[0][1] / times[1][1]))
+
+## Boiler Plate ##
+if __name__ == '__main__':
+    maxout_benchmark()
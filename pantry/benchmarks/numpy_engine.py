@@ -0,0 +1,96 @@
+"""
+Benchmark of the numpy engine against the compiled ``theano`` forward function. A small lenet
+is cooked, exported with :mod:`export` and loaded both ways. The time taken to load, the latency
+of predicting one sample and the throughput of predicting many samples are reported, along with
+the largest difference between the posteriors of the two.
+
+Run this as ``python -m pantry.benchmarks.numpy_engine [dataset]``. If no dataset is provided, a
+synthetic one is created.
+"""
+import time
+import numpy
+from yann.network import network
+from yann.utils.export import export, load
+from yann.utils import numpy_engine
+
+def cook_lenet ( dataset, verbose = 1 ):
+    """
+    Cooks a small lenet without training it.
+
+    Args:
+        dataset: location of the dataset.
+        verbose: as always
+    """
+    dataset_params  = { "dataset"   : dataset,
+                        "svm"       : False,
+                        "n_classes" : 10,
+                        "id"        : 'data' }
+    net = network( verbose = verbose )
+    net.add_module ( type = 'datastream', params = dataset_params, verbose = verbose )
+    net.add_layer ( type = "input", id = "input", datastream_origin = 'data', verbose = verbose )
+    net.add_layer ( type = "conv_pool", id = "conv", origin = "input", num_neurons = 20,
+                    filter_size = (5,5), pool_size = (2,2), activation = 'relu',
+                    verbose = verbose )
+    net.add_layer ( type = "flatten", id = "flatten", origin = "conv", verbose = verbose )
+    net.add_layer ( type = "dot_product", id = "fc", origin = "flatten", num_neurons = 200,
+                    activation = 'relu', batch_norm = True, verbose = verbose )
+    net.add_layer ( type = "classifier", id = "softmax", origin = "fc", num_classes = 10,
+                    verbose = verbose )
+    net.add_layer ( type = "objective", id = "obj", origin = "softmax", verbose = verbose )
+    net.cook( verbose = verbose )
+    return net
+
+def numpy_engine_benchmark ( dataset, samples = 5000, repeats = 3, verbose = 1 ):
+    """
+    Times the compiled and the numpy forward passes and prints the results.
+
+    Args:
+        dataset: location of the dataset.
+        samples: number of samples to time the throughput with.
+        repeats: the best of these many runs is reported.
+        verbose: as always
+    """
+    net = cook_lenet( dataset, verbose = verbose )
+    export( net, '_frozen.npz', verbose = verbose )
+    features = net.height * net.width * net.channels
+    data = numpy.random.uniform(size = (samples, features))
+
+    engines = []
+    start = time.time()
+    engines.append(('theano', load('_frozen.npz', verbose = verbose)))
+    load_times = [time.time() - start]
+    start = time.time()
+    engines.append(('numpy', numpy_engine.load('_frozen.npz', verbose = verbose)))
+    load_times.append(time.time() - start)
+
+    for (name, engine), load_time in zip(engines, load_times):
+        engine.predict(data[:1])
+        engine.predict(data)          # allocates the buffers for both sizes
+        latency = min([ _time(engine, data[:1]) for i in xrange(repeats) ])
+        throughput = samples / min([ _time(engine, data) for i in xrange(repeats) ])
+        print(". " + name)
+        print(".. Seconds to load                  : " + str(load_time))
+        print(".. Seconds to predict one sample    : " + str(latency))
+        print(".. Samples predicted per second     : " + str(throughput))
+    difference = numpy.abs(engines[0][1].posterior(data) - engines[1][1].posterior(data)).max()
+    print(". Largest difference in posteriors  : " + str(difference))
+
+def _time ( engine, data ):
+    """
+    Returns the seconds ``engine`` takes to predict ``data``.
+    """
+    start = time.time()
+    engine.predict(data)
+    return time.time() - start
+
+## Boiler Plate ##
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) > 1:
+        dataset = sys.argv[1]
+    else:
+        from pantry.benchmarks.synthetic import cook_synthetic
+        dataset = cook_synthetic ( mini_batch_size = 20,
+                                   mini_batches_per_batch = (10, 5, 5),
+                                   batches = (1, 1, 1) )
+    numpy_engine_benchmark ( dataset )
@@ -0,0 +1,80 @@
+"""
+Benchmark for the ``prefetch`` option of the datastream. The same network is trained on a
+multi-batch dataset with and without prefetching and the time taken per epoch along with the
+time spent waiting for data is reported. The reader process needs a core of its own for the
+epoch time to go down.
+
+Run this as ``python -m pantry.benchmarks.prefetch [dataset]``. If no dataset is provided, a
+synthetic one is created.
+"""
+import time
+from yann.network import network
+
+def train_epochs ( dataset, prefetch, epochs = 2, verbose = 1 ):
+    """
+    Builds a small mlp, trains it and returns the seconds taken per epoch and the seconds per
+    epoch spent waiting in ``set_data``.
+
+    Args:
+        dataset: location of the dataset.
+        prefetch: supplied to the datastream.
+        epochs: number of epochs to time.
+        verbose: as always
+    """
+    dataset_params  = { "dataset"   : dataset,
+                        "svm"       : False,
+                        "n_classes" : 10,
+                        "prefetch"  : prefetch,
+                        "id"        : 'data' }
+    net = network( verbose = verbose )
+    net.add_module ( type = 'datastream', params = dataset_params, verbose = verbose )
+    net.add_layer ( type = "input", id = "input", datastream_origin = 'data', verbose = verbose )
+    net.add_layer ( type = "dot_product", id = "fc", origin = "input", num_neurons = 200,
+                    activation = 'relu', verbose = verbose )
+    net.add_layer ( type = "classifier", id = "softmax", origin = "fc", num_classes = 10,
+                    verbose = verbose )
+    net.add_layer ( type = "objective", id = "obj", origin = "softmax", verbose = verbose )
+    net.cook( verbose = verbose )
+
+    waited = [0.]
+    set_data = net.set_data
+    def timed_set_data(*args, **kwargs):
+        start = time.time()
+        set_data(*args, **kwargs)
+        waited[0] = waited[0] + time.time() - start
+    net.set_data = timed_set_data
+
+    start = time.time()
+    net.train( epochs = epochs, show_progress = False, verbose = verbose )
+    return (time.time() - start) / epochs, waited[0] / epochs
+
+def prefetch_benchmark ( dataset, epochs = 2, verbose = 1 ):
+    """
+    Times training with and without prefetching and prints the results.
+
+    Args:
+        dataset: location of the dataset.
+        epochs: number of epochs to time.
+        verbose: as always
+    """
+    without, without_waited = train_epochs( dataset, prefetch = False, epochs = epochs,
+                                                                        verbose = verbose )
+    with_prefetch, with_waited = train_epochs( dataset, prefetch = True, epochs = epochs,
+                                                                        verbose = verbose )
+    print(". Seconds per epoch without prefetch : " + str(without) +
+                                        " (waiting for data " + str(without_waited) + ")")
+    print(". Seconds per epoch with prefetch    : " + str(with_prefetch) +
+                                        " (waiting for data " + str(with_waited) + ")")
+    print(". Time saved per epoch               : " + str(100 * (without - with_prefetch)
+                                                                        / without) + " %")
+
+## Boiler Plate ##
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) > 1:
+        dataset = sys.argv[1]
+    else:
+        from pantry.benchmarks.synthetic import cook_synthetic
+        dataset = cook_synthetic ( mini_batches_per_batch = (20, 10, 10),
+                                   batches = (8, 2, 1) )
+    prefetch_benchmark ( dataset )
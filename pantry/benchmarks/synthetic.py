@@ -0,0 +1,75 @@
+"""
+Synthetic datasets for the benchmarks. These are written in the same layout that
+:mod:`yann.utils.dataset.setup_dataset` produces so that a ``datastream`` can read them, but
+need neither ``skdata`` nor a download.
+"""
+import os
+import numpy
+import pickle as cPickle
+from random import randint
+
+import theano
+
+from yann.utils.dataset import pickle_dataset
+
+def cook_synthetic ( save_directory = '_datasets',
+                     mini_batch_size = 500,
+                     mini_batches_per_batch = (20, 5, 5),
+                     batches = (4, 1, 1),
+                     height = 28,
+                     width = 28,
+                     channels = 1,
+                     n_classes = 10,
+                     verbose = 1 ):
+    """
+    Creates a random dataset in the ``_dataset_XXXXX`` layout. The labels are a linear function
+    of the images so that networks do learn something on them.
+
+    Args:
+        save_directory: which directory to save the cooked dataset onto.
+        mini_batch_size: as in :mod:`setup_dataset`.
+        mini_batches_per_batch: ``(train, valid, test)`` mini batches in each batch.
+        batches: ``(batches2train, batches2validate, batches2test)``
+        height: height of the images
+        width: width of the images
+        channels: channels of the images
+        n_classes: number of classes in the labels
+        verbose: as always
+
+    Returns:
+        str: location of the dataset.
+    """
+    root = save_directory + '/_dataset_' + str(randint(11111,99999))
+    if verbose >= 1:
+        print(". Creating a synthetic dataset at " + root)
+    for type in ['train', 'valid', 'test']:
+        os.makedirs(root + '/' + type)
+
+    rng = numpy.random.RandomState(1234)
+    features = height * width * channels
+    projection = rng.randn(features, n_classes)
+    for type, mini_batches, count in zip(['train', 'valid', 'test'],
+                                        mini_batches_per_batch, batches):
+        for batch in range(count):
+            data_x = rng.uniform(size = (mini_batches * mini_batch_size, features))
+            data_x = numpy.asarray(data_x, dtype = theano.config.floatX)
+            data_y = numpy.asarray(numpy.argmax(numpy.dot(data_x - 0.5, projection), axis = 1),
+                                                            dtype = theano.config.floatX)
+            pickle_dataset(loc = root + '/' + type + '/', batch = batch, data = (data_x, data_y))
+
+    dataset_args = {
+            "location"                  : root,
+            "mini_batch_size"           : mini_batch_size,
+            "cache_batches"             : mini_batches_per_batch,
+            "batches2train"             : batches[0],
+            "batches2test"              : batches[2],
+            "batches2validate"          : batches[1],
+            "height"                    : height,
+            "width"                     : width,
+            "channels"                  : channels,
+            "cache"                     : not batches == (1, 1, 1),
+            }
+    f = open(root + '/data_params.pkl', 'wb')
+    cPickle.dump(dataset_args, f, protocol=2)
+    f.close()
+    return root
@@ -0,0 +1,82 @@
+"""
+networks.py - Tiny synthetic datasets and networks shared by the tests that cook and train
+networks. Everything is written into a temporary directory that is removed afterwards.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from yann.network import network
+from pantry.benchmarks.synthetic import cook_synthetic
+
+
+class NetworkTestCase(unittest.TestCase):
+    """
+    Runs each test inside a temporary directory, so that datasets, results and
+    visualizations don't end up in the working tree.
+    """
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp()
+        os.chdir(self.root)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def dataset(self, mini_batch_size=10, mini_batches_per_batch=(3, 1, 1),
+                batches=(2, 1, 1), height=8, width=8, channels=1):
+        return cook_synthetic(mini_batch_size=mini_batch_size,
+                              mini_batches_per_batch=mini_batches_per_batch,
+                              batches=batches, height=height, width=width,
+                              channels=channels, verbose=0)
+
+    def mlp(self, dataset, optimizer=None, datastream=None, dropout_rate=0,
+            cls=network, seed=1234, cook=None, **kwargs):
+        """
+        Builds and cooks a network with one hidden layer. ``optimizer`` and ``datastream``
+        are extra parameters of those modules, ``cook`` of ``network.cook``.
+        """
+        np.random.seed(seed)
+        net = cls(verbose=0, **kwargs)
+        dataset_params = {"dataset": dataset, "svm": False, "n_classes": 10, "id": "data"}
+        dataset_params.update(datastream or {})
+        net.add_module(type='datastream', params=dataset_params, verbose=0)
+        optimizer_params = {"optimizer_type": 'sgd', "momentum_type": 'false', "id": "main"}
+        optimizer_params.update(optimizer or {})
+        net.add_module(type='optimizer', params=optimizer_params, verbose=0)
+        net.add_layer(type="input", id="input", datastream_origin='data', verbose=0)
+        net.add_layer(type="dot_product", id="fc", origin="input", num_neurons=12,
+                      activation='relu', dropout_rate=dropout_rate, verbose=0)
+        net.add_layer(type="classifier", id="softmax", origin="fc", num_classes=10,
+                      verbose=0)
+        net.add_layer(type="objective", id="obj", origin="softmax", verbose=0)
+        net.cook(verbose=0, **(cook or {}))
+        return net
+
+    def params(self, net):
+        return [param.get_value() for param in net.params]
+
+    def cnn(self, dataset, seed=1234):
+        """
+        Builds and cooks a classifier of a conv pool layer and a dot product layer, both with
+        batch norm.
+        """
+        np.random.seed(seed)
+        net = network(verbose=0)
+        net.add_module(type='datastream', params={"dataset": dataset, "svm": False,
+                                                  "n_classes": 10, "id": "data"}, verbose=0)
+        net.add_layer(type="input", id="input", datastream_origin='data', verbose=0)
+        net.add_layer(type="conv_pool", id="conv", origin="input", num_neurons=4,
+                      filter_size=(3, 3), pool_size=(2, 2), batch_norm=True,
+                      activation='relu', verbose=0)
+        net.add_layer(type="dot_product", id="fc", origin="conv", num_neurons=12,
+                      batch_norm=True, activation='relu', verbose=0)
+        net.add_layer(type="classifier", id="softmax", origin="fc", num_classes=10,
+                      verbose=0)
+        net.add_layer(type="objective", id="obj", origin="softmax", verbose=0)
+        net.cook(verbose=0)
+        return net
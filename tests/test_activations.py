@@ -122,3 +122,69 @@ class TestActivations(unittest.TestCase):
         theano_result = A.Squared(self.theano_input).eval({self.theano_input: self.numpy_input})
         self.assertEqual(theano_result.shape, expected_array.shape)
         self.assertTrue(np.allclose(theano_result, expected_array))
+
+    def test_maxout(self):
+        numpy_input = np.array([[-1, 2, -3, 4, 5, 0],
+                                [6, -2, 3, 1, -5, -4]], dtype=theano.config.floatX)
+        expected_array = np.array([[2., 4., 5.],
+                                   [6., 3., -4.]])
+        theano_result, shape = A.Maxout(self.theano_input, maxout_size=2, input_size=(2, 6),
+                                        type='maxout')
+        theano_result = theano_result.eval({self.theano_input: numpy_input})
+        self.assertEqual(shape, (2, 3))
+        self.assertEqual(theano_result.shape, expected_array.shape)
+        self.assertTrue(np.allclose(theano_result, expected_array))
+
+    def test_meanout(self):
+        numpy_input = np.array([[-1, 2, -3, 4, 5, 0],
+                                [6, -2, 3, 1, -5, -4]], dtype=theano.config.floatX)
+        expected_array = np.array([[-2/3., 3.],
+                                   [7/3., -8/3.]])
+        theano_result, shape = A.Maxout(self.theano_input, maxout_size=3, input_size=(2, 6),
+                                        type='meanout')
+        theano_result = theano_result.eval({self.theano_input: numpy_input})
+        self.assertEqual(shape, (2, 2))
+        self.assertEqual(theano_result.shape, expected_array.shape)
+        self.assertTrue(np.allclose(theano_result, expected_array))
+
+    def test_mixedout(self):
+        """
+        mixedout lies between the mean and the max of each group.
+        """
+        numpy_input = np.random.RandomState(0).uniform(-1, 1, (4, 12)).astype(
+                                                                        theano.config.floatX)
+        groups = numpy_input.reshape(4, 3, 4)
+        theano_result, shape = A.Maxout(self.theano_input, maxout_size=4, input_size=(4, 12),
+                                        type='mixedout')
+        theano_result = theano_result.eval({self.theano_input: numpy_input})
+        self.assertEqual(theano_result.shape, (4, 3))
+        self.assertTrue(np.all(theano_result <= groups.max(axis=2) + 1e-7))
+        self.assertTrue(np.all(theano_result >= groups.mean(axis=2) - 1e-7))
+
+    def test_maxout_2d(self):
+        theano_input = T.tensor4()
+        numpy_input = np.random.RandomState(0).uniform(-1, 1, (2, 6, 3, 4)).astype(
+                                                                        theano.config.floatX)
+        expected_array = numpy_input.reshape(2, 3, 2, 3, 4).max(axis=2)
+        theano_result, shape = A.Maxout(theano_input, maxout_size=2, input_size=(2, 6, 3, 4),
+                                        type='maxout', dimension=2)
+        theano_result = theano_result.eval({theano_input: numpy_input})
+        self.assertEqual(shape, (2, 3, 3, 4))
+        self.assertTrue(np.allclose(theano_result, expected_array))
+
+    def test_maxout_gradient(self):
+        """
+        The gradient goes to the largest unit of each group for maxout and is shared equally
+        for meanout.
+        """
+        numpy_input = np.array([[-1, 2, -3, 4, 5, 0],
+                                [6, -2, 3, 1, -5, -4]], dtype=theano.config.floatX)
+        expected = {'maxout': np.array([[0., 1., 0., 1., 1., 0.],
+                                        [1., 0., 1., 0., 0., 1.]]),
+                    'meanout': np.ones((2, 6)) / 2.}
+        for maxout_type in ['maxout', 'meanout']:
+            output, _ = A.Maxout(self.theano_input, maxout_size=2, input_size=(2, 6),
+                                 type=maxout_type)
+            gradient = T.grad(output.sum(), self.theano_input).eval(
+                                                            {self.theano_input: numpy_input})
+            self.assertTrue(np.allclose(gradient, expected[maxout_type]))
@@ -0,0 +1,95 @@
+"""
+test_augmentation.py - Unit tests for the augmentation of training batches defined in
+yann/utils/augmentation.py
+"""
+
+import unittest
+import numpy as np
+from yann.utils.augmentation import augmenter
+from tests.networks import NetworkTestCase
+
+
+class TestAugmenter(unittest.TestCase):
+    """
+    Batches are augmented and every image is checked against the original moved by hand.
+    """
+
+    def setUp(self):
+        self.height, self.width, self.channels = 5, 7, 3
+        rng = np.random.RandomState(1234)
+        self.images = rng.uniform(0.1, 1, size=(50, self.height, self.width, self.channels))
+        self.data = self.images.reshape(50, -1)
+
+    def augment(self, **options):
+        augmented = augmenter(options, self.height, self.width, self.channels,
+                              verbose=0).apply(self.data)
+        self.assertEqual(augmented.shape, self.data.shape)
+        return augmented.reshape(self.images.shape)
+
+    def shifted(self, image, rows, cols):
+        shifted = np.zeros_like(image)
+        source = image[max(0, -rows):self.height - max(0, rows),
+                       max(0, -cols):self.width - max(0, cols)]
+        shifted[max(0, rows):max(0, rows) + source.shape[0],
+                max(0, cols):max(0, cols) + source.shape[1]] = source
+        return shifted
+
+    def test_flip_mirrors(self):
+        augmented = self.augment(flip=True)
+        flipped = 0
+        for image, result in zip(self.images, augmented):
+            if np.array_equal(result, image[:, ::-1]):
+                flipped = flipped + 1
+            else:
+                self.assertTrue(np.array_equal(result, image))
+        self.assertTrue(0 < flipped < len(self.images))
+
+    def test_crop_fills_zeros(self):
+        crop = 2
+        augmented = self.augment(crop=crop)
+        shifts = [(rows, cols) for rows in xrange(-crop, crop + 1)
+                               for cols in xrange(-crop, crop + 1)]
+        moved = 0
+        for image, result in zip(self.images, augmented):
+            matches = [shift for shift in shifts
+                       if np.array_equal(result, self.shifted(image, *shift))]
+            self.assertEqual(len(matches), 1)
+            if not matches[0] == (0, 0):
+                moved = moved + 1
+                self.assertTrue((result == 0).any())
+        self.assertTrue(moved > 0)
+
+    def test_nothing_to_do(self):
+        self.assertTrue(np.array_equal(self.augment(), self.images))
+
+
+class TestAugmentedDatastream(NetworkTestCase):
+    """
+    Only the batches the training loop trains on are augmented.
+    """
+
+    def check(self, prefetch):
+        net = self.mlp(self.dataset(), datastream={"prefetch": prefetch,
+                                                   "augment": {"flip": True, "crop": 2}})
+        stream = net.cooked_datastream
+        augmented = {'train': 0, 'valid': 0, 'test': 0}
+        set_data = stream.set_data
+        def checked(type='train', batch=0, augment=False, verbose=2):
+            set_data(type=type, batch=batch, augment=augment, verbose=verbose)
+            raw = stream.load_data(type=type, batch=batch, verbose=0)[0]
+            if not np.allclose(stream.data_x.get_value()[:stream.current_size], raw):
+                augmented[type] = augmented[type] + 1
+        stream.set_data = checked
+        net.set_data = checked
+        net.train(epochs=1, learning_rates=(0.05, 0.01), training_accuracy=True,
+                  show_progress=False, verbose=0)
+        net.test(show_progress=False, verbose=0)
+        self.assertTrue(augmented['train'] > 0)
+        self.assertEqual(augmented['valid'], 0)
+        self.assertEqual(augmented['test'], 0)
+
+    def test_only_training_batches(self):
+        self.check(False)
+
+    def test_only_training_batches_prefetched(self):
+        self.check(True)
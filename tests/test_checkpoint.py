@@ -0,0 +1,50 @@
+"""
+test_checkpoint.py - Unit tests for saving checkpoints of training and resuming from them,
+defined in yann/network.py
+"""
+
+import numpy as np
+from tests.networks import NetworkTestCase
+
+
+class Interrupted(Exception):
+    pass
+
+
+class TestCheckpoint(NetworkTestCase):
+
+    optimizer = {"optimizer_type": 'rmsprop', "momentum_type": 'polyak',
+                 "momentum_params": (0.5, 0.9, 2)}
+
+    def train(self, net, checkpoint, **kwargs):
+        net.train(epochs=(2, 1), learning_rates=(0.05, 0.01, 0.001), checkpoint=checkpoint,
+                  show_progress=False, verbose=0, **kwargs)
+
+    def test_resume(self):
+        dataset = self.dataset()
+        uninterrupted = self.mlp(dataset, optimizer=self.optimizer)
+        self.train(uninterrupted, 'uninterrupted.npz')
+
+        interrupted = self.mlp(dataset, optimizer=self.optimizer)
+        save = interrupted.save_checkpoint
+        def save_and_stop(*args, **kwargs):
+            save(*args, **kwargs)
+            raise Interrupted()
+        interrupted.save_checkpoint = save_and_stop
+        self.assertRaises(Interrupted, self.train, interrupted, 'resumed.npz')
+        self.assertEqual(np.load('resumed.npz')['train_epoch'], 1)
+
+        resumed = self.mlp(dataset, optimizer=self.optimizer, seed=4321)
+        self.train(resumed, 'resumed.npz', resume=True)
+
+        expected = np.load('uninterrupted.npz')
+        result = np.load('resumed.npz')
+        self.assertEqual(sorted(expected.files), sorted(result.files))
+        self.assertTrue(any([name.startswith('state_') for name in expected.files]))
+        for name in ['train_epoch', 'train_era', 'learning_rate_0']:
+            self.assertEqual(expected[name], result[name])
+        for name in expected.files:
+            self.assertTrue(np.allclose(expected[name], result[name]), name)
+        self.assertTrue(np.allclose(uninterrupted.cost.all(), resumed.cost.all()))
+        for a, b in zip(self.params(uninterrupted), self.params(resumed)):
+            self.assertTrue(np.allclose(a, b))
@@ -0,0 +1,60 @@
+"""
+test_data_parallel.py - Unit tests for training on many processes, defined in
+yann/special/data_parallel.py
+"""
+
+import multiprocessing
+import numpy as np
+from yann.special.data_parallel import data_parallel
+from tests.networks import NetworkTestCase
+
+
+class TestDataParallel(NetworkTestCase):
+
+    learning_rates = (0.05, 0.01)
+
+    def averaged_steps(self, dataset):
+        """
+        Trains a plain network for an epoch the way two workers that average after every mini
+        batch would.
+        """
+        net = self.mlp(dataset)
+        net.learning_rate.set_value(self.learning_rates[1])
+        costs = []
+        for batch in xrange(net.batches2train):
+            net._cache_data(type='train', batch=batch, verbose=0)
+            indices = range(net.mini_batches_per_batch[0])
+            for start in xrange(0, len(indices), 2):
+                params = self.params(net)
+                stepped = []
+                for index in indices[start:start + 2]:
+                    for param, value in zip(net.params, params):
+                        param.set_value(value.copy())
+                    costs.append(net.mini_batch_train(index, 0))
+                    stepped.append(self.params(net))
+                for count, param in enumerate(net.params):
+                    param.set_value(np.mean([values[count] for values in stepped], axis=0))
+        return costs, self.params(net)
+
+    def test_same_as_averaged_steps(self):
+        dataset = self.dataset()
+        net = self.mlp(dataset, cls=data_parallel, workers=2, average_after=1)
+        processes = []
+        start = net._start_replicas
+        def started(verbose=2):
+            start(verbose=verbose)
+            processes.extend(net.replicas["processes"])
+        net._start_replicas = started
+        net.train(epochs=1, learning_rates=self.learning_rates, shuffle=False,
+                  show_progress=False, verbose=0)
+
+        costs, params = self.averaged_steps(dataset)
+        self.assertTrue(np.allclose(net.cost.all(), costs))
+        for a, b in zip(self.params(net), params):
+            self.assertTrue(np.allclose(a, b))
+
+        self.assertEqual(len(processes), 2)
+        for process in processes:
+            self.assertFalse(process.is_alive())
+        self.assertTrue(net.replicas is None)
+        self.assertEqual(multiprocessing.active_children(), [])
@@ -0,0 +1,47 @@
+"""
+test_export.py - Unit tests for exporting a cooked network and loading it back, defined in
+yann/utils/export.py
+"""
+
+import json
+import numpy as np
+import theano
+from yann.utils.export import export, load
+from tests.networks import NetworkTestCase
+
+
+class TestExport(NetworkTestCase):
+
+    def setUp(self):
+        super(TestExport, self).setUp()
+        self.net = self.cnn(self.dataset(batches=(1, 1, 1)))
+        self.data = np.random.RandomState(1).uniform(size=(23, 64)).astype(theano.config.floatX)
+
+    def test_round_trip(self):
+        self.net.train(epochs=(1, 1), show_progress=False, verbose=0)
+        export(self.net, 'network.npz', verbose=0)
+        frozen = load('network.npz', verbose=0)
+        self.assertTrue(np.array_equal(frozen.predict(self.data, chunk_size=10, verbose=0),
+                                       self.net.predict(self.data, verbose=0)))
+        self.assertTrue(np.allclose(frozen.posterior(self.data, chunk_size=10, verbose=0),
+                                    self.net.posterior(self.data, verbose=0)))
+
+    def test_unsupported_layer_export(self):
+        self.assertRaises(Exception, export, self.net, 'network.npz', classifier='obj',
+                          verbose=0)
+
+    def test_unsupported_layer_load(self):
+        export(self.net, 'network.npz', verbose=0)
+        archive = np.load('network.npz')
+        arrays = dict(archive.items())
+        archive.close()
+        topology = json.loads(str(arrays['topology']))
+        topology['layers'][-1]['type'] = 'rotate'
+        arrays['topology'] = np.array(json.dumps(topology))
+        np.savez('network.npz', **arrays)
+        self.assertRaises(Exception, load, 'network.npz', verbose=0)
+
+    def test_no_samples(self):
+        export(self.net, 'network.npz', verbose=0)
+        frozen = load('network.npz', verbose=0)
+        self.assertRaises(Exception, frozen.predict, self.data[:0], verbose=0)
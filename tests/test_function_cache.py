@@ -0,0 +1,58 @@
+"""
+test_function_cache.py - Unit tests for the cache of compiled functions defined in
+yann/utils/function_cache.py
+"""
+
+import gc
+import weakref
+import numpy as np
+import yann.utils.function_cache as function_cache
+from tests.networks import NetworkTestCase
+
+
+class TestFunctionCache(NetworkTestCase):
+
+    def setUp(self):
+        super(TestFunctionCache, self).setUp()
+        function_cache._memory.clear()
+        self.data = self.dataset()
+
+    def tearDown(self):
+        function_cache._memory.clear()
+        super(TestFunctionCache, self).tearDown()
+
+    def train(self, net):
+        net.train(epochs=(1, 1), learning_rates=(0.05, 0.01, 0.001), show_progress=False,
+                  verbose=0)
+        return net
+
+    def check_same(self, first, second):
+        self.assertTrue(np.array_equal(first.cost.all(), second.cost.all()))
+        for a, b in zip(self.params(first), self.params(second)):
+            self.assertTrue(np.array_equal(a, b))
+
+    def test_second_cook_hits(self):
+        first = self.mlp(self.data, cook={"cache": True})
+        self.assertEqual(first.function_cache.hits, 0)
+        self.assertTrue(first.function_cache.misses > 0)
+        second = self.mlp(self.data, cook={"cache": True})
+        self.assertEqual(second.function_cache.hits, first.function_cache.misses)
+        self.assertEqual(second.function_cache.misses, 0)
+        self.check_same(self.train(self.mlp(self.data)), self.train(second))
+        self.check_same(self.train(first), second)
+
+    def test_hits_from_disk(self):
+        first = self.train(self.mlp(self.data, cook={"cache": "functions"}))
+        function_cache._memory.clear()
+        second = self.mlp(self.data, cook={"cache": "functions"})
+        self.assertEqual(second.function_cache.hits, first.function_cache.misses)
+        self.check_same(first, self.train(second))
+
+    def test_params_freed(self):
+        def cook():
+            net = self.mlp(self.data, cook={"cache": True})
+            return weakref.ref(net.params[0].get_value(borrow=True))
+        params = cook()
+        gc.collect()
+        self.assertTrue(params() is None)
+        self.assertTrue(len(function_cache._memory) > 0)
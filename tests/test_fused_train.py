@@ -0,0 +1,33 @@
+"""
+test_fused_train.py - Unit tests for the fused training function that runs through the mini
+batches of a cached batch in one call, defined in yann/network.py
+"""
+
+import numpy as np
+from tests.networks import NetworkTestCase
+
+
+class TestFusedTrain(NetworkTestCase):
+
+    def train(self, fused, dropout_rate):
+        net = self.mlp(self.dataset(), dropout_rate=dropout_rate, cook={"fused_train": fused})
+        net.train(epochs=(2, 1), learning_rates=(0.05, 0.01, 0.001), show_progress=False,
+                  verbose=0)
+        return net
+
+    def check_same(self, dropout_rate):
+        looped = self.train(False, dropout_rate)
+        fused = self.train(True, dropout_rate)
+        self.assertTrue(hasattr(fused, "batch_train"))
+        self.assertEqual(len(looped.cost), len(fused.cost))
+        self.assertTrue(np.allclose(looped.cost.all(), fused.cost.all()))
+        for a, b in zip(self.params(looped), self.params(fused)):
+            self.assertTrue(np.allclose(a, b))
+        return fused
+
+    def test_same_as_looped(self):
+        self.check_same(0)
+
+    def test_dropout_same_as_looped(self):
+        fused = self.check_same(0.5)
+        self.assertFalse(np.allclose(fused.cost.all(), self.train(True, 0).cost.all()))
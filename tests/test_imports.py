@@ -3,6 +3,8 @@ test_imports.py - Unit tests for YANN toolbox required imports
 """
 
 import imp
+import sys
+import subprocess
 import unittest
 
 
@@ -27,3 +29,30 @@ class TestImports(unittest.TestCase):
 
     def test_yann(self):
         self.assertTrue(imp.find_module('yann'))
+
+
+class TestLazyImports(unittest.TestCase):
+    """
+    Importing the toolbox must not load optional dependencies that only some features need.
+    Each module is imported in a fresh process, after theano.
+    """
+
+    optional = ['progressbar', 'networkx', 'matplotlib', 'scipy.io', 'skdata']
+
+    def _loaded(self, module):
+        script = ("import sys, theano\n"
+                  "before = set(name for name in sys.modules if sys.modules[name] is not None)\n"
+                  "import " + module + "\n"
+                  "print(' '.join(name for name in %r if sys.modules.get(name) is not None "
+                  "and name not in before))" % self.optional)
+        output = subprocess.check_output([sys.executable, '-c', script])
+        return output.strip().split('\n')[-1].split()
+
+    def test_network(self):
+        self.assertEqual(self._loaded('yann.network'), [])
+
+    def test_modules(self):
+        self.assertEqual(self._loaded('yann.modules.datastream, yann.modules.visualizer'), [])
+
+    def test_gan(self):
+        self.assertEqual(self._loaded('yann.special.gan'), [])
@@ -0,0 +1,52 @@
+"""
+test_metrics.py - Unit tests for the metric histories defined in
+yann/utils/metrics.py
+"""
+
+import os
+import tempfile
+import unittest
+import numpy as np
+from yann.utils.metrics import metric
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    Histories are checked against plain lists of the same values.
+    """
+
+    def setUp(self):
+        rng = np.random.RandomState(1234)
+        self.values = rng.uniform(-1, 1, size=(1000,)).tolist()
+
+    def test_append_and_extend(self):
+        history = metric(size=4)
+        for value in self.values[:300]:
+            history.append(value)
+        history.extend(self.values[300:])
+        self.assertEqual(len(history), len(self.values))
+        self.assertTrue(np.allclose(history.all(), self.values))
+        self.assertTrue(np.allclose(history[-10:], self.values[-10:]))
+        self.assertEqual(history[-1], self.values[-1])
+
+    def test_mean(self):
+        history = metric(size=4)
+        history.extend(self.values)
+        for last in [1, 7, 100, 1000, 5000]:
+            self.assertTrue(np.isclose(history.mean(last=last), np.mean(self.values[-last:])))
+
+    def test_spill(self):
+        spill = os.path.join(tempfile.mkdtemp(), 'spill.bin')
+        history = metric(size=4, limit=64, spill=spill)
+        history.extend(self.values)
+        self.assertTrue(history.count <= 64)
+        self.assertEqual(len(history), len(self.values))
+        self.assertTrue(np.allclose(history.all(), self.values))
+        self.assertTrue(np.isclose(history.mean(), np.mean(self.values)))
+        self.assertTrue(np.isclose(history.mean(last=500), np.mean(self.values[-500:])))
+
+    def test_drop(self):
+        history = metric(size=4, limit=64)
+        history.extend(self.values)
+        self.assertTrue(np.allclose(history[-32:], self.values[-32:]))
+        self.assertRaises(Exception, history.all)
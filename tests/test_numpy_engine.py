@@ -0,0 +1,103 @@
+"""
+test_numpy_engine.py - Unit tests for the numpy forward pass engine
+defined in yann/utils/numpy_engine.py
+"""
+
+import unittest
+import numpy as np
+import theano
+import theano.tensor as T
+from theano.tensor.nnet import conv2d
+from theano.tensor.signal.pool import pool_2d
+from theano.tensor.nnet.bn import batch_normalization_test
+import yann.core.activations as A
+import yann.utils.numpy_engine as E
+from yann.utils.export import export
+from tests.networks import NetworkTestCase
+
+
+class TestNumpyEngine(unittest.TestCase):
+    """
+    Every operation of the numpy engine is checked against the theano
+    operation the inference layers use, on random inputs.
+    """
+
+    def setUp(self):
+        rng = np.random.RandomState(1234)
+        self.images = rng.uniform(-1, 1, size=(3, 2, 9, 8)).astype(theano.config.floatX)
+        self.filters = rng.uniform(-1, 1, size=(4, 2, 3, 2)).astype(theano.config.floatX)
+        self.matrix = rng.uniform(-3, 3, size=(5, 6)).astype(theano.config.floatX)
+        self.theano_images = T.tensor4()
+        self.theano_matrix = T.matrix()
+
+    def _conv(self, border_mode, stride):
+        expected = conv2d(self.theano_images, self.filters, border_mode=border_mode,
+                          subsample=stride).eval({self.theano_images: self.images})
+        result = E.conv2d(self.images, self.filters, border_mode=border_mode, stride=stride)
+        self.assertEqual(result.shape, expected.shape)
+        self.assertTrue(np.allclose(result, expected))
+
+    def test_conv_valid(self):
+        self._conv('valid', (1, 1))
+
+    def test_conv_full(self):
+        self._conv('full', (1, 1))
+
+    def test_conv_stride(self):
+        self._conv('valid', (2, 3))
+
+    def test_pool(self):
+        for mode, theano_mode in [('max', 'max'), ('sum', 'sum'), ('mean', 'average_exc_pad')]:
+            expected = pool_2d(self.theano_images, ws=(2, 3), ignore_border=True,
+                               mode=theano_mode).eval({self.theano_images: self.images})
+            result = E.pool2d(self.images, (2, 3), mode=mode)
+            self.assertEqual(result.shape, expected.shape)
+            self.assertTrue(np.allclose(result, expected))
+
+    def test_batch_norm(self):
+        gamma = np.ones((1, 6), dtype=theano.config.floatX) * 1.5
+        beta = np.ones((1, 6), dtype=theano.config.floatX) * 0.2
+        mean = self.matrix.mean(axis=0, keepdims=True)
+        var = self.matrix.var(axis=0, keepdims=True)
+        expected = batch_normalization_test(self.theano_matrix, gamma, beta, mean,
+                                            var).eval({self.theano_matrix: self.matrix})
+        result = E.batch_norm(self.matrix.copy(), gamma, beta, mean, var)
+        self.assertTrue(np.allclose(result, expected))
+
+    def test_activations(self):
+        for activation, theano_activation in [('relu', A.ReLU),
+                                              ('abs', A.Abs),
+                                              ('sigmoid', A.Sigmoid),
+                                              ('tanh', A.Tanh),
+                                              ('squared', A.Squared),
+                                              ('softmax', A.Softmax)]:
+            expected = theano_activation(self.theano_matrix).eval(
+                                                        {self.theano_matrix: self.matrix})
+            result = E.activate(self.matrix.copy(), activation)
+            self.assertTrue(np.allclose(result, expected))
+
+    def test_maxout(self):
+        for maxout_type in ['maxout', 'meanout']:
+            expected, _ = A.Maxout(self.theano_matrix, maxout_size=3, input_size=(5, 6),
+                                   type=maxout_type)
+            expected = expected.eval({self.theano_matrix: self.matrix})
+            result = E.activate(self.matrix.copy(), ('maxout', maxout_type, 3))
+            self.assertEqual(result.shape, expected.shape)
+            self.assertTrue(np.allclose(result, expected))
+
+
+class TestNumpyNetwork(NetworkTestCase):
+    """
+    A network loaded into the numpy engine must predict what the cooked network predicts.
+    """
+
+    def test_matches_theano(self):
+        net = self.cnn(self.dataset(batches=(1, 1, 1)))
+        net.train(epochs=(1, 1), show_progress=False, verbose=0)
+        export(net, 'network.npz', verbose=0)
+        engine = E.load('network.npz', verbose=0)
+        data = np.random.RandomState(1).uniform(size=(23, 64)).astype(theano.config.floatX)
+        self.assertTrue(np.array_equal(engine.predict(data, chunk_size=10, verbose=0),
+                                       net.predict(data, verbose=0)))
+        self.assertTrue(np.allclose(engine.posterior(data, chunk_size=10, verbose=0),
+                                    net.posterior(data, chunk_size=7, verbose=0)))
@@ -0,0 +1,35 @@
+"""
+test_prefetch.py - Unit tests for the prefetching process of the datastream defined in
+yann/modules/datastream.py
+"""
+
+import multiprocessing
+import numpy as np
+from tests.networks import NetworkTestCase
+
+
+class TestPrefetch(NetworkTestCase):
+
+    def train(self, dataset, prefetch):
+        net = self.mlp(dataset, datastream={"prefetch": prefetch})
+        processes = []
+        start = net.cooked_datastream._start_prefetcher
+        def started(verbose=2):
+            start(verbose=verbose)
+            processes.append(net.cooked_datastream.prefetcher["process"])
+        net.cooked_datastream._start_prefetcher = started
+        net.train(epochs=(2, 1), learning_rates=(0.05, 0.01, 0.001),
+                  show_progress=False, verbose=0)
+        return net, processes
+
+    def test_same_costs_and_stopped(self):
+        dataset = self.dataset()
+        plain, _ = self.train(dataset, False)
+        prefetched, processes = self.train(dataset, True)
+        self.assertTrue(np.allclose(plain.cost.all(), prefetched.cost.all()))
+        for a, b in zip(self.params(plain), self.params(prefetched)):
+            self.assertTrue(np.allclose(a, b))
+        self.assertEqual(len(processes), 1)
+        self.assertFalse(processes[0].is_alive())
+        self.assertTrue(prefetched.cooked_datastream.prefetcher is None)
+        self.assertEqual(multiprocessing.active_children(), [])
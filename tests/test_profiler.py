@@ -0,0 +1,45 @@
+"""
+test_profiler.py - Unit tests for the profiler of training defined in yann/utils/profiler.py
+and the profile file the resultor in yann/modules/resultor.py writes
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from yann.utils.profiler import profiler
+from yann.modules.resultor import resultor
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_discard_epoch(self):
+        timer = profiler()
+        timer.begin('train')
+        time.sleep(0.05)
+        timer.end()
+        timer.discard_epoch()
+        timer.begin('train')
+        timer.end()
+        report = timer.end_epoch(epoch=0)
+        self.assertTrue(report['train'] < 0.05)
+        self.assertTrue(report['total'] < 0.05)
+        self.assertEqual(len(timer.epochs), 1)
+
+    def test_profile_file_created_lazily(self):
+        results = resultor({"root": self.root, "id": "results"}, verbose=0)
+        filename = os.path.join(self.root, results.profile_file)
+        self.assertFalse(os.path.exists(filename))
+        timer = profiler()
+        results.process_profile(timer.end_epoch(epoch=0), verbose=0)
+        results.process_profile(timer.end_epoch(epoch=1), verbose=0)
+        lines = open(filename).read().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith('epoch,'))
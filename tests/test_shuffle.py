@@ -0,0 +1,48 @@
+"""
+test_shuffle.py - Unit tests for shuffling the samples of a cached batch, defined in
+yann/modules/datastream.py
+"""
+
+import numpy as np
+from tests.networks import NetworkTestCase
+
+
+class TestShuffle(NetworkTestCase):
+
+    def setUp(self):
+        super(TestShuffle, self).setUp()
+        self.stream = self.mlp(self.dataset()).cooked_datastream
+
+    def batch(self):
+        return (self.stream.data_x.get_value(), self.stream.data_y_uncasted.get_value())
+
+    def check_pairs(self, before, after, size):
+        x, y = before
+        shuffled_x, shuffled_y = after
+        self.assertFalse(np.array_equal(x[:size], shuffled_x[:size]))
+        self.assertTrue(np.array_equal(x[size:], shuffled_x[size:]))
+        self.assertTrue(np.array_equal(y[size:], shuffled_y[size:]))
+        self.assertTrue(np.array_equal(np.sort(y[:size]), np.sort(shuffled_y[:size])))
+        for row in xrange(size):
+            original = np.where((x[:size] == shuffled_x[row]).all(axis=1))[0]
+            self.assertEqual(len(original), 1)
+            self.assertEqual(y[original[0]], shuffled_y[row])
+
+    def test_pairs_kept(self):
+        self.stream.set_data(type='train', batch=1, verbose=0)
+        before = self.batch()
+        self.stream.shuffle_data(rng=np.random.RandomState(1), verbose=0)
+        self.check_pairs(before, self.batch(), self.stream.data_cache_size)
+
+    def test_padding_not_shuffled(self):
+        load = self.stream.load_data
+        def partial(batch=0, type='train', verbose=2):
+            x, y = load(batch=batch, type=type, verbose=verbose)
+            return x[:17], y[:17]
+        self.stream.load_data = partial
+        self.stream.set_data(type='train', batch=1, verbose=0)
+        self.assertEqual(self.stream.current_size, 17)
+        before = self.batch()
+        self.assertTrue((before[0][17:] == 0).all())
+        self.stream.shuffle_data(rng=np.random.RandomState(1), verbose=0)
+        self.check_pairs(before, self.batch(), 17)
@@ -1,4 +1,7 @@
+import numpy
+import theano
 import theano.tensor as T
+from theano.sandbox.rng_mrg import MRG_RandomStreams as RandomStreams
 from math import floor
 
 #### Exponential linear unit
@@ -141,60 +144,80 @@ def Squared(x):
     return(x ** 2)
 
 ### maxouts
-def _max1d_stride (x,i,stride):
+def _maxout_groups (x, maxout_size, dimension):
     """
-    max units. These are used interally by the maxout activations.
-
-    Applies strided maximum to the input supplied on the second dimension.
+    Reshapes the input into groups of ``maxout_size`` consecutive channels. This is used
+    internally by the maxout activations.
 
     Args:
-        x: could be a ``theano.tensor`` or a ``theano.shared`` or ``numpy`` arrays or
-            ``python lists``. size of the argument must strictly be of two dimensions that
-            is windowed runnable through ``stride``.
-            Second dimension must be the channels to maxout from
-        i: is a range variable. It tells from which index the maxing must begin from
-        stride: strides of the maxouts (default is maxoutsize)
+        x: ``theano.tensor`` whose second dimension is the channels to maxout from.
+        maxout_size: number of channels in each group.
+        dimension: ``1`` if ``x`` is two dimensional, ``2`` if ``x`` is four dimensional.
 
     Returns:
-        same as input: returns the max of that range.
+        theano.tensor: a view of ``x`` of shape ``(batch, units, maxout_size, ...)``.
     """
-    return x[:,i::stride]
+    shape = (x.shape[0], x.shape[1] // maxout_size, maxout_size)
+    if dimension == 2:
+        shape = shape + (x.shape[2], x.shape[3])
+    return x.reshape(shape, ndim = len(shape))
 
-def _max2d_stride (x,i,stride):
+def _reduce_groups (groups, maxout_size, type):
     """
-    max units. These are used interally by the maxout activations.
-
-    Applies strided maximum to the input supplied on the second dimension.
-
-    Args:
-        x: could be a ``theano.tensor`` or a ``theano.shared`` or ``numpy`` arrays or
-            ``python lists``. size of the argument must strictly be of four dimensions that
-            is windowed runnable through ``stride``.
-            Second dimension must be the channels to maxout from
-
-        i: is a range variable. It tells from which index the maxing must begin from
-        stride: strides of the maxouts (default is maxoutsize)
-
-    Returns:
-        same as input: returns the max of that range.
+    Reduces the group axis of ``groups`` to its max or mean. The ``maxout_size`` slices of the
+    group axis are combined elementwise, which ``theano`` fuses into one loop. This is faster on
+    the CPU than a ``T.max`` or ``T.mean`` over a middle axis.
     """
-    return x[:,i::stride,:,:]
-
-
-def Maxout(x, maxout_size, input_size, type = 'maxout', dimension = 1):
+    output = groups[:, :, 0]
+    for i in xrange(1, maxout_size):
+        if type == 'maxout':
+            output = T.maximum(output, groups[:, :, i])
+        else:
+            output = output + groups[:, :, i]
+    if type == 'meanout':
+        output = output / numpy.asarray(maxout_size, dtype = groups.dtype)
+    return output
+
+def _maxout_op (x, maxout_size, type, dimension):
+    """
+    Returns an op that does maxout or meanout of ``x``. Its gradient is one elementwise
+    expression over the groups instead of ``maxout_size`` increments of strided slices.
+    """
+    if dimension == 1:
+        pattern = (0, 1, 'x')
+    else:
+        pattern = (0, 1, 'x', 2, 3)
+
+    def grad (inputs, output_grads):
+        input = inputs[0]
+        groups = _maxout_groups(input, maxout_size, dimension)
+        grad_output = output_grads[0].dimshuffle(*pattern)
+        if type == 'maxout':
+            output = _reduce_groups(groups, maxout_size, type).dimshuffle(*pattern)
+            grad_groups = T.eq(groups, output) * grad_output
+        else:
+            grad_groups = T.ones_like(groups) * (grad_output / maxout_size)
+        return [grad_groups.reshape(input.shape, ndim = input.ndim)]
+
+    input = x.type()
+    output = _reduce_groups(_maxout_groups(input, maxout_size, dimension), maxout_size, type)
+    return theano.OpFromGraph([input], [output], inline = True, grad_overrides = grad)
+
+def Maxout(x, maxout_size, input_size, type = 'maxout', dimension = 1, rng = None):
     """
     Function performs the maxout activation.
     You can import all these functions and supply the fuctions as arguments to functions
     that use ``activation`` variable as an input. Refer to the mnist example in the
-    modelzoo for how to do this.
+    modelzoo for how to do this. Every ``maxout_size`` consecutive channels are reduced to
+    one.
 
     Args:
 
         x: could be a ``theano.tensor`` or a ``theano.shared`` or ``numpy`` arrays or
-            ``python lists``. Size of the argument must strictly be windowed runnable
-            through ``stride``. Second dimension must be the channels to maxout from
+            ``python lists``. Second dimension must be the channels to maxout from and must be
+            a multiple of ``maxout_size``.
 
-        maxout_size: is the size of the window to stride through
+        maxout_size: is the number of channels reduced to one
 
         input_size: is number of nodes in the input
         dimension: If ``1`` perform MLP layer maxout, input must be two dimensional.
@@ -202,7 +225,11 @@ def Maxout(x, maxout_size, input_size, type = 'maxout', dimension = 1):
 
         type: If ``maxout`` perform, [1]
               If ``meanout`` or ``mixedout`` perform, meanout or mixed out respectively
-              from [2]
+              from [2]. ``mixedout`` mixes the max and the mean of each group with a random
+              weight drawn for every output.
+
+        rng: ``numpy.random`` style random number generator that seeds the random weights of
+             ``mixedout``. Default is ``numpy.random``.
 
     .. [#]  Yu, Dingjun, et al. "Mixed Pooling for Convolutional Neural Networks." Rough
             Sets and Knowledge Technology. Springer International Publishing,
@@ -219,48 +246,29 @@ def Maxout(x, maxout_size, input_size, type = 'maxout', dimension = 1):
                                 2. ``tuple``, Number of feature maps after maxout is applied
     """
     if dimension == 1:
-        maxing = _max1d_stride
         output_shape = (input_size[0], input_size[1]/maxout_size)
     elif dimension == 2:
-        maxing = _max2d_stride
         output_shape = (input_size[0], input_size[1]/maxout_size, input_size[2], input_size[3])
 
+    x = T.as_tensor_variable(x)
     if type == 'maxout':  # Do maxout network.
-        maxout_out = None
-        for i in xrange(maxout_size):
-            temp = maxing(x,i,maxout_size)
-            if maxout_out is None:
-                maxout_out = temp
-            else:
-                maxout_out = T.maximum(maxout_out, temp)
-        output = maxout_out
+        output = _maxout_op(x, maxout_size, 'maxout', dimension)(x)
 
     elif type == 'meanout':  # Do meanout network.
-        maxout_out = None
-        for i in xrange(maxout_size):
-            temp = maxing(x,i,maxout_size)
-            if maxout_out is None:
-                maxout_out = temp
-            else:
-                maxout_out = (maxout_out*(i+1)+temp)/(i+2)
-        output = maxout_out
+        output = _maxout_op(x, maxout_size, 'meanout', dimension)(x)
 
     elif type == 'mixedout': # Do mixout network.
-        maxout_out = None
-        maxout_mean = None
-        maxout_max  = None
-        for i in xrange(maxout_size):
-            temp = maxing(x,i,maxout_size)
-            if maxout_mean is None:
-                maxout_mean = temp
-                maxout_max = temp
-                maxout_out = temp
-            else:
-                maxout_mean = (maxout_out*(i+1)+temp)/(i+2)
-                maxout_max = T.maximum(maxout_out, temp)
-        lambd      = srng.uniform( maxout_mean.shape, low=0.0, high=1.0)
-        maxout_out = lambd * maxout_max + (1 - lambd) * maxout_mean
-        output = maxout_out
+        maxout_max = _maxout_op(x, maxout_size, 'maxout', dimension)(x)
+        maxout_mean = _maxout_op(x, maxout_size, 'meanout', dimension)(x)
+        if rng is None:
+            rng = numpy.random
+        lambd = RandomStreams(rng.randint(1, 2147462579)).uniform(
+                                                    size = maxout_max.shape, low = 0.0,
+                                                    high = 1.0, dtype = theano.config.floatX)
+        output = lambd * maxout_max + (1 - lambd) * maxout_mean
+
+    else:
+        raise Exception ("Maxout type " + str(type) + " is not supported")
 
     return (output, output_shape)
 
@@ -1,3 +1,6 @@
+from collections import OrderedDict
+import theano
+
 def copy_params (source, destination, borrow = True, verbose = 2):
     """
     Internal function that copies paramters maintaining theano shared nature.
@@ -8,6 +11,8 @@ def copy_params (source, destination, borrow = True, verbose = 2):
 
     Notes:
         Was using deep copy to do this. This seems faster. But can I use ``theano.clone`` ?
+        Every value goes through the host. To copy repeatedly between the same lists of
+        parameters, use :func:`copy_params_function` instead.
     """
     if verbose >=3:
         print("... Copying paramters")
@@ -18,3 +23,40 @@ def copy_params (source, destination, borrow = True, verbose = 2):
             print("... source shape: " + str(src.get_value(borrow = True).shape))
             print("... destination shape: " + str(dst.get_value(borrow = True).shape))
         dst.set_value ( src.get_value (borrow = borrow))
+
+def shared_copies (source, borrow = True):
+    """
+    Internal function that creates new shared variables with the values and types of the
+    source shared variables. Use these as the destination of :func:`copy_params_function`.
+
+    Args:
+        source: list of shared variables.
+        borrow: ``theano`` borrow.
+
+    Returns:
+        list: new shared variables.
+    """
+    return [ theano.shared( value = src.get_value(borrow = borrow),
+                            broadcastable = src.broadcastable ) for src in source ]
+
+def copy_params_function (source, destination, name = 'copy_params', verbose = 2):
+    """
+    Internal function that compiles a theano function which copies all of the source
+    parameters into the destination parameters in one call. The copies are updates of the
+    function, so the values stay on the device and never go through the host.
+
+    Args:
+        source: list of shared variables to copy from.
+        destination: list of shared variables to copy into, of the same types as source.
+        name: name of the theano function.
+
+    Returns:
+        theano.function: call without arguments to copy.
+    """
+    if verbose >=3:
+        print("... Compiling " + name + " function")
+
+    updates = OrderedDict()
+    for src, dst in zip(source, destination):
+        updates[dst] = src
+    return theano.function( inputs = [], updates = updates, name = name)
@@ -140,14 +140,14 @@ def _dropout(rng, params, dropout_rate, verbose = 2):
     dropout thanks to misha denil
     https://github.com/mdenil/dropout
     """
-    srng = RandomStreams(rng.randint(1,2147462468), use_cuda=None)
+    srng = RandomStreams(rng.randint(1,2147462468))
     # I have raised this issue with the theano guys, use_cuda = True is creating a duplicate
     # process in the GPU.
     mask = srng.binomial(n=1, p=1-dropout_rate, size=params.shape, dtype = theano.config.floatX )
     output = params * mask
     return output
 
-def _activate (x, activation, input_size, verbose = 2, **kwargs):
+def _activate (x, activation, input_size, rng = None, verbose = 2, **kwargs):
     """
     This function is used to produce activations for the outputs of any type of layer.
 
@@ -156,6 +156,8 @@ def _activate (x, activation, input_size, verbose = 2, **kwargs):
         x: input tensor.
         activation: Refer to the ``add_layer`` method.
         input_size: supply the size of the inputs.
+        rng: random number generator of the layer, seeds the random streams of activations
+            such as mixedout.
         verbose: typical toolbox verbose
         dimension: used only for maxout. Give the dimension on which to maxout.
 
@@ -176,7 +178,8 @@ def _activate (x, activation, input_size, verbose = 2, **kwargs):
                                             maxout_size = maxout_size,
                                             input_size = input_size,
                                             type = maxout_type,
-                                            dimension = kwargs["dimension"] )
+                                            dimension = kwargs["dimension"],
+                                            rng = rng )
         if activation[0] == 'relu':
             relu_leak = activation[1]
             out = activations.ReLU (x = x, alpha = relu_leak)
@@ -102,18 +102,6 @@ class conv_pool_layer_2d (layer):
                                     name ='filterbank' )
             self.b = theano.shared(value=numpy.zeros((nkerns,), dtype=theano.config.floatX),
                                      name = 'bias', borrow=borrow)
-            self.gamma = theano.shared(value=numpy.ones((1,channels,width,height),
-                                 dtype=theano.config.floatX), name = 'gamma', borrow = borrow)
-            self.beta = theano.shared(value=numpy.zeros((1,channels,width,height),
-                                 dtype=theano.config.floatX), name = 'beta', borrow=borrow)  
-            self.running_mean = theano.shared(
-                                value=numpy.zeros((1,channels,height,width), 
-                                dtype=theano.config.floatX), 
-                                name = 'population_mean', borrow = borrow)
-            self.running_var = theano.shared(
-                                value=numpy.ones((1,channels,height,width),
-                                dtype=theano.config.floatX),
-                                name = 'population_var', borrow=borrow)                                                                                               
         else:
             self.w = init_w
             self.b = init_b
@@ -151,6 +139,20 @@ class conv_pool_layer_2d (layer):
         else:
             pool_out = conv_out
             pool_out_shp = conv_out_shp
+
+        # batch norm is per activation, so its parameters are of the shape of the pooled output.
+        if batch_norm is True and input_params is None:
+            bn_shp = (1, pool_out_shp[1], pool_out_shp[2], pool_out_shp[3])
+            self.gamma = theano.shared(value=numpy.ones(bn_shp, dtype=theano.config.floatX),
+                                                            name = 'gamma', borrow = borrow)
+            self.beta = theano.shared(value=numpy.zeros(bn_shp, dtype=theano.config.floatX),
+                                                            name = 'beta', borrow=borrow)
+            self.running_mean = theano.shared(
+                                value=numpy.zeros(bn_shp, dtype=theano.config.floatX),
+                                name = 'population_mean', borrow = borrow)
+            self.running_var = theano.shared(
+                                value=numpy.ones(bn_shp, dtype=theano.config.floatX),
+                                name = 'population_var', borrow=borrow)
         """
         Ioffe, Sergey, and Christian Szegedy. "Batch normalization: Accelerating deep network
         training by reducing internal covariate shift." arXiv preprint arXiv:1502.03167 (2015). """
@@ -183,14 +185,20 @@ class conv_pool_layer_2d (layer):
         self.output, self.output_shape = _activate (x= batch_norm_out,
                                             activation = activation,
                                             input_size = batch_norm_out_shp,
+                                            rng = rng,
                                             verbose = verbose,
                                             dimension = 2)
 
-        self.inference, _ = _activate (x= batch_norm_inference,
+        # Without batch norm, inference is the same graph as the output.
+        if batch_norm is True:
+            self.inference, _ = _activate (x= batch_norm_inference,
                                             activation = activation,
                                             input_size = batch_norm_out_shp,
+                                            rng = rng,
                                             verbose = verbose,
                                             dimension = 2)
+        else:
+            self.inference = self.output
         # store parameters of this layer and do some book keeping.
         self.params = [self.w, self.b]
         self.active_params = [self.w, self.b]
@@ -213,6 +221,8 @@ class conv_pool_layer_2d (layer):
         self.filter_shape = filter_shape
         self.poolsize = poolsize
         self.stride = stride
+        self.pooltype = pooltype
+        self.border_mode = border_mode
         self.input_shape = input_shape
         self.num_neurons = nkerns
         self.activation = activation
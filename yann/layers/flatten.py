@@ -39,8 +39,10 @@ class unflatten_layer (layer):
                     id = -1,
                     verbose = 2):
         super(unflatten_layer,self).__init__(id = id, type = 'unflatten', verbose = verbose)
-        self.output = T.reshape(input, (input_shape[0], shape[2], shape[0], shape[1]))
+        batch = -1 if input_shape[0] is None else input_shape[0]
+        self.output = T.reshape(input, (batch, shape[2], shape[0], shape[1]))
         self.output_shape = (input_shape[0], shape[2], shape[0], shape[1])
+        self.shape = shape
         self.inference = self.output
 
 if __name__ == '__main__':
@@ -128,14 +128,20 @@ class dot_product_layer (layer):
         self.output, self.output_shape = _activate (x= batch_norm_out,
                                             activation = activation,
                                             input_size = batch_norm_shp,
+                                            rng = rng,
                                             verbose = verbose,
                                             dimension = 1)
 
-        self.inference, _ = _activate (x= batch_norm_out,
+        # Without batch norm, inference is the same graph as the output.
+        if batch_norm is True:
+            self.inference, _ = _activate (x= batch_norm_inference,
                                             activation = activation,
                                             input_size = batch_norm_shp,
+                                            rng = rng,
                                             verbose = verbose,
                                             dimension = 1)
+        else:
+            self.inference = self.output
 
         # parameters of the model
         if batch_norm is True:
@@ -15,7 +15,8 @@ class input_layer (layer):
         x: ``theano.tensor`` variable with rows are vectorized images.
         y: ``theano.tensor`` variable
         one_hot_y:``theano.tensor`` variable
-        mini_batch_size: Number of images in the data variable.
+        mini_batch_size: Number of images in the data variable. If ``None``, the layer takes
+                         any number of images.
         height: Height of each image.
         width: Width of each image.
         id: Supply a layer id
@@ -44,13 +45,15 @@ class input_layer (layer):
             print("... Creating the input layer")
 
         super(input_layer, self).__init__(id = id, type = 'input', verbose = verbose)
-        data_feeder = x.reshape((mini_batch_size, height, width, channels)).dimshuffle(0, 3, 1, 2)
+        batch = -1 if mini_batch_size is None else mini_batch_size
+        data_feeder = x.reshape((batch, height, width, channels)).dimshuffle(0, 3, 1, 2)
                                 # the dim shuffle makes it mini_batch_size, channels height width order
         mean_subtracted_data_feeder = data_feeder - data_feeder.mean()
 
         self.output = mean_subtracted_data_feeder if mean_subtract is True else data_feeder
         self.output_shape = (mini_batch_size, channels, height, width)
         self.inference = self.output
+        self.mean_subtract = mean_subtract
 
         if verbose >= 3:
             print("... Input layer is created with output shape " + str(self.output_shape))
@@ -26,6 +26,7 @@ class merge_layer (layer):
                     verbose = 2):
 
         super(merge_layer,self).__init__(id = id, type = 'merge', verbose = verbose)
+        self.merge_type = type
 
         if type == 'error':
             if verbose >=3:
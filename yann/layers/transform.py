@@ -44,6 +44,7 @@ import numpy
 import numpy.random as nprnd
 import theano
 import theano.tensor as T
+from theano.sandbox.rng_mrg import MRG_RandomStreams as RandomStreams
 
 class rotate_layer (layer):
     """
@@ -76,14 +77,18 @@ class rotate_layer (layer):
                 print("... Creating the rotate layer")
 
             if angle is None:
-                angle = nprnd.uniform(size = (input_shape[0],1), low = 0, high = 1)
+                if input_shape[0] is None:
+                    angle = RandomStreams(nprnd.randint(1, 2147462579)).uniform(
+                                                size = (input.shape[0],1), low = 0, high = 1)
+                else:
+                    angle = nprnd.uniform(size = (input_shape[0],1), low = 0, high = 1)
 
             theta = T.stack([T.cos(angle[:,0]*90).reshape([angle.shape[0],1]),
                             -T.sin(angle[:,0]*90).reshape([angle.shape[0],1]),
-                            T.zeros((input_shape[0],1),dtype='float32'),
+                            T.zeros((angle.shape[0],1),dtype='float32'),
                             T.sin(angle[:,0]*90).reshape([angle.shape[0],1]),
                             T.cos(angle[:,0]*90).reshape([angle.shape[0],1]),
-                            T.zeros((input_shape[0],1),dtype='float32')], axis=1)
+                            T.zeros((angle.shape[0],1),dtype='float32')], axis=1)
             theta = theta.reshape((-1, 6))
 
             self.output = self._transform_affine(theta, input)
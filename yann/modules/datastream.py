@@ -1,19 +1,115 @@
 import numpy
 import pickle as cPickle
+import multiprocessing
 
 import theano
 import theano.tensor as T
 
 from yann.utils.dataset import create_shared_memory_dataset
 from yann.utils.image import check_type
+from yann.utils.augmentation import augmenter
 from yann.modules.abstract import module
 
+def _read_batch(dataset, type, batch, memmap = None):
+    """
+    Reads one batch of a dataset from the disk, as is.
+
+    Args:
+        dataset: location of the dataset.
+        type: ``train``, ``test`` or ``valid``.
+        batch: Supply an integer
+        memmap: ``None`` for ``.pkl`` batches. For the memmap format, a dictionary with the
+            ``index``, ``dtype`` and ``features`` of the dataset.
+
+    Returns:
+        numpy.ndarray: ``data_x, data_y``. For the memmap format, these are copy-on-write
+            ``numpy.memmap`` views of the batch, nothing is read until they are used.
+    """
+    if memmap is None:
+        f = open(dataset + '/' + type + '/batch_' + str(batch) +'.pkl', 'rb')
+        data_x, data_y = cPickle.load(f)
+        f.close()
+    else:
+        start = memmap["index"][type][batch]
+        samples = memmap["index"][type][batch + 1] - start
+        itemsize = numpy.dtype(memmap["dtype"]).itemsize
+        data_x = numpy.memmap(dataset + '/' + type + '/data_x.bin', dtype = memmap["dtype"],
+                              mode = 'c', offset = start * memmap["features"] * itemsize,
+                              shape = (samples, memmap["features"]))
+        data_y = numpy.memmap(dataset + '/' + type + '/data_y.bin', dtype = memmap["dtype"],
+                              mode = 'c', offset = start * itemsize, shape = (samples,))
+    return data_x, data_y
+
+def _slot_arrays(slot, shapes):
+    """
+    Creates ``numpy`` views of one slot of prefetching buffers.
+
+    Args:
+        slot: A list of ``multiprocessing.RawArray`` or ``None``.
+        shapes: shapes of each of the arrays in the slot.
+
+    Returns:
+        list: ``[data_x, data_y, data_one_hot_y]`` views, ``None`` where there is no buffer.
+    """
+    arrays = []
+    for buffer, shape in zip(slot, shapes):
+        if buffer is None:
+            arrays.append(None)
+        else:
+            arrays.append(numpy.frombuffer(buffer,
+                                           dtype = theano.config.floatX).reshape(shape))
+    return arrays
+
+def _prefetch_worker(dataset, memmap, xy, slots, shapes, requests, replies, augmenter = None):
+    """
+    This runs in the prefetching process. For every ``(slot, type, batch, augment)`` request, it
+    reads the batch, augments it if asked to and writes it zero padded, along with
+    one-hot labels if needed, straight into the shared buffers of that slot. A ``None`` request
+    stops the process.
+
+    Args:
+        dataset: location of the dataset.
+        memmap: ``None`` or the layout of a memmap dataset, as in ``_read_batch``.
+        xy: ``True`` if the dataset has labels.
+        slots: list of slots of ``multiprocessing.RawArray`` buffers.
+        shapes: shapes of the arrays in each slot.
+        requests: ``multiprocessing.Queue`` to receive requests on.
+        replies: ``multiprocessing.Queue`` to reply on with
+            ``(slot, type, batch, augment, size, error)``, where ``size`` is the number of
+            samples read before padding.
+        augmenter: ``None`` or the ``augmenter`` of the datastream.
+    """
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        slot, type, batch, augment = request
+        try:
+            data_x, data_y = _read_batch(dataset, type, batch, memmap)
+            out_x, out_y, out_one_hot_y = _slot_arrays(slots[slot], shapes)
+            size = min(data_x.shape[0], out_x.shape[0])
+            if augmenter is not None and augment is True:
+                out_x[:size] = augmenter.apply(data_x[:size])
+            else:
+                out_x[:size] = data_x[:size]
+            out_x[size:] = 0
+            if xy is True:
+                out_y[:size] = data_y[:size]
+                out_y[size:] = 0
+            if out_one_hot_y is not None:
+                out_one_hot_y.fill(-1)
+                out_one_hot_y[numpy.arange(out_y.shape[0]), out_y.astype('int32')] = 1
+            replies.put((slot, type, batch, augment, size, None))
+        except Exception as error:
+            replies.put((slot, type, batch, augment, None, repr(error)))
+
 
 class datastream(module):
     """
     This module initializes the dataset to the network class and provides all dataset related
     functionalities. It also provides for dynamically loading and caching dataset batches.
-    :mod: ``add_layer`` will use this to initialize.
+    :mod: ``add_layer`` will use this to initialize. Datasets that were setup in the ``memmap``
+    format are memory mapped and batches are sliced out of them without being copied.
 
     Args:
         dataset_init_args: Is a dictionary of the form:
@@ -29,6 +125,18 @@ class datastream(module):
                                 ``n_classes`` if ``svm`` is ``True``, we need to know how
                                  many ``n_classes`` are present.
                             "id": id of the datastream
+                            "prefetch": ``True`` or ``False``
+                                ``prefetch`` if ``True``, a background process reads, pads and
+                                 one-hot encodes the next batch while the network is busy with
+                                 the current one. The process is stopped by ``close``, which
+                                 the network calls once training or testing is done. Default
+                                 is ``False``.
+                            "augment": ``None`` or a dictionary of ``augment_init_args``
+                                ``augment`` training batches set by the training loop are
+                                 randomly cropped, flipped, rotated and brightened. Refer to
+                                 :mod:`yann.utils.augmentation` for the options. Augmentation
+                                 runs in the prefetching process if ``prefetch`` is ``True``.
+                                 Default is ``None``.
                     }
 
         verbose: Similar to verbose throughout the toolbox.
@@ -72,6 +180,15 @@ class datastream(module):
         self.width               = data_params [ "width" ]
         self.channels            = data_params [ "channels" ]
         self.cache               = data_params [ "cache" ]
+        # datasets from before the memmap format have no format.
+        if "format" in data_params.keys() and data_params ["format"] == 'memmap':
+            self.memmap = {
+                        "index"     : data_params [ "index" ],
+                        "dtype"     : data_params [ "dtype" ],
+                        "features"  : self.height * self.width * self.channels
+                            }
+        else:
+            self.memmap = None
 
         self.current_type = 'train'
         if 'type' in dataset_init_args.keys():
@@ -94,6 +211,31 @@ class datastream(module):
             else:
                 self.n_classes = False
 
+        if 'prefetch' in dataset_init_args.keys():
+            self.prefetch = dataset_init_args['prefetch']
+        else:
+            self.prefetch = False
+        # The reader process is started only when the first batch is set.
+        self.prefetcher = None
+        # Order in which training batches are visited, ``None`` is in order. network.train
+        # sets this when shuffling so that the right batch is prefetched.
+        self.train_order = None
+        # Whether the training batches are being augmented, so that the right batch is
+        # prefetched.
+        self.train_augment = False
+        # Compiled only if samples are shuffled.
+        self.shuffler = None
+
+        if 'augment' in dataset_init_args.keys() and \
+                                            dataset_init_args['augment'] is not None:
+            self.augmenter = augmenter ( augment_init_args = dataset_init_args['augment'],
+                                         height = self.height,
+                                         width = self.width,
+                                         channels = self.channels,
+                                         verbose = verbose )
+        else:
+            self.augmenter = None
+
         self.initialize_dataset(verbose = verbose)
         self.batch = 0# initialize the batch to zero. Changing this will produce a new stream.
 
@@ -134,10 +276,7 @@ class datastream(module):
         if verbose >= 3:
             print("... loading " + type + " data batch " + str(batch))
 
-        f = open(self.dataset + '/' + type + '/batch_' + str(batch) +'.pkl', 'rb')
-
-        data_x, data_y = cPickle.load(f)
-        f.close()
+        data_x, data_y = _read_batch(self.dataset, type, batch, self.memmap)
 
         if verbose >= 3:
             print("... data is loaded")
@@ -149,21 +288,269 @@ class datastream(module):
         # I don't know why, but I am following their recommendations blindly.
         return data_x, data_y
 
-    def set_data(self, type = 'train', batch = 0, verbose = 2):
+    def _start_prefetcher(self, verbose = 2):
+        """
+        Starts the prefetching process. Two slots of shared buffers, each large enough for one
+        padded batch, are created. While ``theano`` uses the batch in one slot, the process fills
+        the other.
+
+        Args:
+            verbose: as usual
+        """
+        if verbose >= 3:
+            print("... Starting the prefetching process")
+
+        features = self.height * self.width * self.channels
+        shapes = [(self.data_cache_size, features), None, None]
+        if self.type == 'xy':
+            shapes[1] = (self.data_cache_size,)
+            if self.svm is True:
+                shapes[2] = (self.data_cache_size, self.n_classes)
+        typecode = 'f' if theano.config.floatX == 'float32' else 'd'
+        slots = []
+        for slot in range(2):
+            buffers = []
+            for shape in shapes:
+                if shape is None:
+                    buffers.append(None)
+                else:
+                    buffers.append(multiprocessing.RawArray(typecode, int(numpy.prod(shape))))
+            slots.append(buffers)
+
+        requests = multiprocessing.Queue()
+        replies = multiprocessing.Queue()
+        process = multiprocessing.Process(target = _prefetch_worker,
+                                          args = (self.dataset, self.memmap,
+                                                  self.type == 'xy', slots,
+                                                  shapes, requests, replies,
+                                                  self.augmenter))
+        process.daemon = True
+        process.start()
+        self.prefetcher = {
+                    "process"   : process,
+                    "requests"  : requests,
+                    "replies"   : replies,
+                    "slots"     : slots,
+                    "shapes"    : shapes,
+                    "pending"   : None,   # (slot, type, batch, augment) being read.
+                    "current"   : None,   # slot that theano is holding on to.
+                        }
+
+    def close(self, verbose = 2):
         """
-        This can work only after network is cooked.
+        Stops the prefetching process if it is running and lets go of its queues and buffers.
+        The batch that is set stays set. If another batch is set after this, a new process is
+        started.
+
+        Args:
+            verbose: as usual
+        """
+        if self.prefetcher is None:
+            return
+        if verbose >= 3:
+            print("... Stopping the prefetching process")
+        prefetcher = self.prefetcher
+        self.prefetcher = None
+        # The process finishes any batch it is reading before it sees this.
+        prefetcher["requests"].put(None)
+        prefetcher["process"].join()
+        prefetcher["requests"].close()
+        prefetcher["replies"].close()
+
+    def _next_batch(self, type = 'train', batch = 0):
+        """
+        Guesses which batch the network is going to ask for after ``(type, batch)``. The guess
+        follows the order in which ``network.train`` goes: all training batches, then all
+        validation batches and then back to training. Testing goes through once. Training
+        batches are visited in ``train_order`` if there is one.
+
+        Args:
+            type: ``train``, ``test`` or ``valid``.
+            batch: the batch that was just set.
+
+        Returns:
+            tuple: ``(type, batch)`` of the next batch or ``None`` if there isn't one.
+        """
+        order = self.train_order
+        if order is None:
+            order = range(self.batches2train)
+        if type == 'train':
+            position = order.index(batch) if batch in order else len(order)
+            if position + 1 < len(order):
+                return ('train', order[position + 1])
+            return ('valid', 0)
+        elif type == 'valid':
+            if batch + 1 < self.batches2validate:
+                return ('valid', batch + 1)
+            return ('train', order[0])
+        elif type == 'test':
+            if batch + 1 < self.batches2test:
+                return ('test', batch + 1)
+        return None
+
+    def _fetch(self, type = 'train', batch = 0, augment = False, verbose = 2):
+        """
+        Collects ``(type, batch)`` from the prefetching process if that is what it was reading,
+        augmented if ``augment`` is ``True``. Whatever the process was reading is waited upon,
+        so that its slot is free again.
+
+        Args:
+            type: ``train``, ``test`` or ``valid``.
+            batch: which batch is needed.
+            augment: ``True`` if the batch is to be augmented.
+            verbose: as usual
+
+        Returns:
+            list: ``[data_x, data_y, data_one_hot_y]`` views of the slot followed by the number
+                of samples before padding, or ``None`` if the batch was not prefetched.
+        """
+        prefetcher = self.prefetcher
+        if prefetcher["pending"] is None:
+            return None
+
+        slot, fetched_type, fetched_batch, fetched_augment, size, error = \
+                                                                    prefetcher["replies"].get()
+        prefetcher["pending"] = None
+        if error is not None:
+            if verbose >= 3:
+                print("... Prefetching failed with " + error)
+            return None
+        if not (fetched_type, fetched_batch, fetched_augment) == (type, batch, augment):
+            if verbose >= 3:
+                print("... Prefetched the wrong batch, loading again")
+            return None
+
+        if verbose >= 3:
+            print("... Using prefetched batch " + str(batch) + " of type " + type)
+        prefetcher["current"] = slot
+        return _slot_arrays(prefetcher["slots"][slot], prefetcher["shapes"]) + [size]
+
+    def _prefetch(self, type = 'train', batch = 0, augment = False, verbose = 2):
+        """
+        Asks the prefetching process to read ``(type, batch)`` into the slot that ``theano`` is
+        not using.
+
+        Args:
+            type: ``train``, ``test`` or ``valid``.
+            batch: which batch to read.
+            augment: ``True`` if the batch is to be augmented.
+            verbose: as usual
+        """
+        prefetcher = self.prefetcher
+        slot = 1 if prefetcher["current"] == 0 else 0
+        prefetcher["requests"].put((slot, type, batch, augment))
+        prefetcher["pending"] = (slot, type, batch, augment)
+        if verbose >= 3:
+            print("... Prefetching batch " + str(batch) + " of type " + type)
+
+    def set_data(self, type = 'train', batch = 0, augment = False, verbose = 2):
+        """
+        This can work only after network is cooked. If ``prefetch`` is ``True``, the batch is
+        taken from the prefetching process when it was guessed correctly and the process is
+        asked for the batch after this right away.
 
         Args:
             batch: which batch of data to load and set
+            augment: if ``True`` and the datastream has an ``augmenter``, the batch is
+                augmented. Only the training loop asks for this, so that training accuracy and
+                the other uses of training batches see them as they are.
             verbose: as usual
         """
         if verbose >=3 :
             print("... Setting batch " + str(batch) + " of data of type " + type)
 
+        if self.augmenter is None:
+            augment = False
+        if type == 'train':
+            self.train_augment = augment
+
+        if self.prefetch is True:
+            if self.prefetcher is None:
+                self._start_prefetcher(verbose = verbose)
+            prefetched = self._fetch(type = type, batch = batch, augment = augment,
+                                                                        verbose = verbose)
+            if prefetched is not None:
+                self._set_data(prefetched[0], prefetched[1], prefetched[2],
+                               size = prefetched[3], type = type)
+            else:
+                self._load_and_set(type = type, batch = batch, augment = augment,
+                                                                        verbose = verbose)
+                self.prefetcher["current"] = None
+            next_batch = self._next_batch(type = type, batch = batch)
+            if next_batch is not None:
+                self._prefetch(type = next_batch[0], batch = next_batch[1],
+                               augment = next_batch[0] == 'train' and self.train_augment,
+                               verbose = verbose)
+        else:
+            self._load_and_set(type = type, batch = batch, augment = augment, verbose = verbose)
+
+    def _set_data(self, data_x, data_y, data_one_hot_y = None, size = None, type = 'train'):
+        """
+        Assigns a ready batch to the shared variables.
+
+        Args:
+            data_x: images, already padded to ``data_cache_size``.
+            data_y: labels, already padded to ``data_cache_size``.
+            data_one_hot_y: one-hot labels if ``svm`` is ``True``.
+            size: number of samples before padding. Default is all of ``data_x``.
+            type: ``train``, ``test`` or ``valid``.
+        """
+        self.data_x.set_value (data_x, borrow = self.borrow )
+        if self.type == 'xy':
+            self.data_y_uncasted.set_value (data_y, borrow = self.borrow )
+
+        if self.svm is True and self.type == 'xy':
+            self.data_one_hot_y.set_value ( data_one_hot_y , borrow = self.borrow )
+
+        self.current_type = type
+        self.current_size = data_x.shape[0] if size is None else size
+
+    def shuffle_data(self, rng = numpy.random, verbose = 2):
+        """
+        Shuffles the samples of the batch that is set, so that mini batches are made of
+        different samples every time. Samples and their labels are gathered in a new order by a
+        ``theano`` function within the shared variables, so nothing is copied through python.
+        The zero padding of a batch smaller than ``data_cache_size`` stays at the end.
+
+        Args:
+            rng: a ``numpy.random`` style random number generator.
+            verbose: as usual
+        """
+        if self.shuffler is None:
+            if verbose >= 3:
+                print("... Compiling the sample shuffler")
+            permutation = T.lvector('permutation')
+            shared = [self.data_x, self.data_y_uncasted]
+            if self.svm is True and self.type == 'xy':
+                shared.append(self.data_one_hot_y)
+            self.shuffler = theano.function ( inputs = [permutation],
+                                              updates = [(variable, variable[permutation])
+                                                                    for variable in shared],
+                                              name = 'shuffle' )
+        if verbose >= 3:
+            print("... Shuffling the samples of the batch")
+        permutation = numpy.arange(self.data_cache_size)
+        permutation[:self.current_size] = rng.permutation(self.current_size)
+        self.shuffler(permutation)
+
+    def _load_and_set(self, type = 'train', batch = 0, augment = False, verbose = 2):
+        """
+        Loads a batch on this process, pads it and sets it. This is what ``set_data`` does when
+        not prefetching.
+
+        Args:
+            type: ``train``, ``test`` or ``valid``.
+            batch: which batch of data to load and set
+            augment: ``True`` if the batch is to be augmented.
+            verbose: as usual
+        """
         data_x, data_y = self.load_data (batch = batch, type = type, verbose = verbose )
+        if self.augmenter is not None and augment is True:
+            data_x = check_type (self.augmenter.apply(data_x), theano.config.floatX)
         # Doing this just so that I can use set_value instead of set_sub_tensor.
         # Also, I see some elegance in zeroing out stuff.
 
+        size = min(data_x.shape[0], self.data_cache_size)
         if data_x.shape[0] < self.data_cache_size:
             # This will probably used by non-cached datasets heavily.
             data_size_needed = (self.data_cache_size - data_x.shape[0], self.height *
@@ -187,15 +574,11 @@ class datastream(module):
             data_x = data_x[:self.data_cache_size,]
             data_y = data_y[:self.data_cache_size,]
 
-        self.data_x.set_value (data_x, borrow = self.borrow )
-        if self.type == 'xy':
-            self.data_y_uncasted.set_value (data_y, borrow = self.borrow )
-
+        data_one_hot_y = None
         if self.svm is True and self.type == 'xy':
             data_one_hot_y = self.one_hot_labels( data_y, verbose = verbose )
-            self.data_one_hot_y.set_value ( data_one_hot_y , borrow = self.borrow )
 
-        self.current_type = type
+        self._set_data(data_x, data_y, data_one_hot_y, size = size, type = type)
 
     def one_hot_labels(self, y, verbose = 1):
         """
@@ -227,7 +610,7 @@ class datastream(module):
 
         # found this technique online somewhere, forgot where couldn't cite.
         y1 = -1 * numpy.ones((y.shape[0], self.n_classes))
-        y1[numpy.arange(y.shape[0]), y] = 1
+        y1[numpy.arange(y.shape[0]), numpy.asarray(y, dtype = 'int32')] = 1
         y1 = check_type(y1, theano.config.floatX)
         return y1
 
@@ -251,6 +634,7 @@ class datastream(module):
 
         data_x, data_y = self.load_data(type = 'train', batch = 0, verbose = verbose)
         self.data_cache_size = data_x.shape[0]
+        self.current_size = self.data_cache_size
 
         if self.svm is False:
             self.data_x, self.data_y_uncasted = create_shared_memory_dataset(
@@ -126,30 +126,47 @@ class optimizer (module):
             verbose: Just as always
 
         Notes:
-            Once this is setup, ``optimizer.gradients`` are available
+            Once this is setup, ``optimizer.gradients`` are available. The gradients of all the
+            parameters are estimated together in one backward pass over the objective.
         """
         if verbose >= 3:
             print("... Estimating gradients")
 
-        self.gradients = []
-<<<<<<< HEAD
-        for param in params:
-            if verbose >= 3:
+        # parameters that the objective doesn't depend on have no gradient. Find them in the
+        # graph before asking for any.
+        connected = set(theano.gof.graph.ancestors([objective]))
+        disconnected = [param for param in params if not param in connected]
+        if len(disconnected) > 0:
+            raise Exception("Cannot learn a layer that is disconnected with objective. " +
+                    "Try cooking again by making the particular layer learnable as False. " +
+                    "Disconnected parameters: " + ", ".join([str(param) for param in disconnected]))
+
+        if verbose >= 3:
+            for param in params:
                 print(".. Estimating gradient of parameter "),
                 print(param)
-=======
-        for param in params:  
-            if verbose >=3 :           
-                print "... Estimating gradient of parameter ", 
-                print param 
->>>>>>> upstream/dev
-            try:
-                gradient = T.grad(objective, param)
-                self.gradients.append(gradient)
-            except:
-                print(param)
-                raise Exception("Cannot learn a layer that is disconnected with objective. " +
-                        "Try cooking again by making the particular layer learnable as False")
+        self.gradients = T.grad(objective, list(params))
+
+    def _state (self, param, kind, verbose = 1):
+        """
+        Internal function that allocates one buffer of optimizer state, of the shape of
+        ``param``, and counts its size in ``state_bytes``.
+
+        Args:
+            param: the parameter the buffer is for.
+            kind: what the buffer holds, one of the keys of ``state_buffers``.
+            verbose: Just as always
+
+        Returns:
+            theano.compile.sharedvalue.SharedVariable: the buffer, filled with zeros.
+        """
+        if verbose >= 3:
+            print(".. Allocating " + kind + " of parameter "),
+            print(param)
+        value = numpy.zeros(param.get_value(borrow=True).shape, dtype=theano.config.floatX)
+        self.state_buffers[kind] = self.state_buffers[kind] + 1
+        self.state_bytes = self.state_bytes + value.nbytes
+        return theano.shared(value, borrow=True)
 
     def create_updates(self, params, verbose = 1):
         """
@@ -164,73 +181,60 @@ class optimizer (module):
             params: Supply learnable active parameters of a network.
             objective: supply a theano graph connecting the params to a loss
             verbose: Just as always
+
+        Notes:
+            Only the state that the optimizer and the momentum need is allocated: a velocity per
+            parameter for polyak and nesterov momentum, one accumulator per parameter for
+            adagrad and rmsprop and two for adam. Once this is setup,
+            ``optimizer.state_buffers`` has the number of buffers of each kind and
+            ``optimizer.state_bytes`` the memory they take.
         """
+        if self.optimizer_type == 'adam':
+            if not self.momentum_type == '_adam':
+                if verbose >= 3 and not self.momentum_type == 'false':
+                    print("... ADAM doesn't need explicit momentum. Momentum is removed.")
+                self.momentum_type = '_adam'
+        elif not self.momentum_type in ['false', 'polyak', 'nesterov']:
+            if verbose >= 3:
+                print("... Unrecognized mometum type, switching to no momentum.")
+            self.momentum_type = 'false'
 
-        # accumulate velocities for momentum
+        # allocate the internal parameters of this optimizer and momentum only.
         if verbose >= 3:
             print("... creating internal parameters for all the optimizations")
+        self.state_buffers = OrderedDict([('velocity', 0), ('accumulator', 0)])
+        self.state_bytes = 0
         velocities = []
-        for param in params:
-<<<<<<< HEAD
-<<<<<<< HEAD
-<<<<<<< HEAD
-            if verbose >=3 :
-                print ".. Estimating velocity  of parameter ",
-                print param
-=======
-            if verbose >= 3:
-                print(".. Estimating velocity  of parameter "),
-                print(param)
->>>>>>> Adjust print for python3 during quick-start walkthrough
-=======
-            if verbose >= 3:
-                print(".. Estimating velocity  of parameter "),
-                print(param)
->>>>>>> 715176cc4e41c2ffd1935989a188ed95707f4db0
-=======
-            if verbose >=3 :           
-                print "... Estimating velocity  of parameter ",
-                print param 
->>>>>>> upstream/dev
-            velocity = theano.shared(numpy.zeros(param.get_value(borrow=True).shape,
-                                                 dtype=theano.config.floatX))
-            velocities.append(velocity)
-
-        # these are used for second order optimizers.
         accumulator_1 = []
         accumulator_2 = []
         for param in params:
-<<<<<<< HEAD
-<<<<<<< HEAD
-<<<<<<< HEAD
-            if verbose >=3 :
-                print ".. Accumulating gradinent of parameter " ,
-                print param
-=======
-            if verbose >= 3:
-                print(".. Accumulating gradinent of parameter "),
-                print(param)
->>>>>>> Adjust print for python3 during quick-start walkthrough
-=======
-            if verbose >= 3:
-                print(".. Accumulating gradinent of parameter "),
-                print(param)
->>>>>>> 715176cc4e41c2ffd1935989a188ed95707f4db0
-=======
-            if verbose >=3 :           
-                print "... Accumulating gradinent of parameter " , 
-                print param 
->>>>>>> upstream/dev
-            eps = numpy.zeros_like(param.get_value(borrow=True), dtype=theano.config.floatX)
-            accumulator_1.append(theano.shared(eps, borrow=True))
-            accumulator_2.append(theano.shared(eps, borrow=True))
+            if self.momentum_type in ['polyak', 'nesterov']:
+                velocities.append(self._state(param, 'velocity', verbose = verbose))
+            else:
+                velocities.append(None)
+            # these are used for second order optimizers.
+            if self.optimizer_type in ['adagrad', 'rmsprop', 'adam']:
+                accumulator_1.append(self._state(param, 'accumulator', verbose = verbose))
+            else:
+                accumulator_1.append(None)
+            if self.optimizer_type == 'adam':
+                accumulator_2.append(self._state(param, 'accumulator', verbose = verbose))
+            else:
+                accumulator_2.append(None)
 
         # these are used for adam.
-        timestep = theano.shared(numpy.asarray(0., dtype=theano.config.floatX))
-        delta_t = timestep + 1
-        b1 = 0.9                       # for ADAM
-        b2 = 0.999                     # for ADAM
-        a = T.sqrt(1 - b2 ** delta_t) / (1 - b1 ** delta_t)     # for ADAM
+        if self.optimizer_type == 'adam':
+            timestep = theano.shared(numpy.asarray(0., dtype=theano.config.floatX))
+            self.state_bytes = self.state_bytes + timestep.get_value(borrow=True).nbytes
+            delta_t = timestep + 1
+            b1 = 0.9                       # for ADAM
+            b2 = 0.999                     # for ADAM
+            a = T.sqrt(1 - b2 ** delta_t) / (1 - b1 ** delta_t)     # for ADAM
+
+        if verbose >= 2:
+            print(".. Optimizer state is " + str(self.state_buffers['velocity']) +
+                  " velocities and " + str(self.state_buffers['accumulator']) +
+                  " accumulators, " + str(self.state_bytes) + " bytes")
 
         # to avoid division by zero
         fudge_factor = 1e-7
@@ -245,29 +249,10 @@ class optimizer (module):
             print("... Applying " + self.momentum_type)
         self.updates = OrderedDict()
         for velocity, gradient, acc_1, acc_2, param in zip(velocities, self.gradients,
-<<<<<<< HEAD
-<<<<<<< HEAD
-                                                        accumulator_1, accumulator_2, params):
-<<<<<<< HEAD
-            if verbose >=3 :
-                print ".. Backprop of parameter ",
-                print param
-=======
-=======
->>>>>>> 715176cc4e41c2ffd1935989a188ed95707f4db0
                                                            accumulator_1, accumulator_2, params):
             if verbose >= 3:
                 print(".. Backprop of parameter "),
                 print(param)
-<<<<<<< HEAD
->>>>>>> Adjust print for python3 during quick-start walkthrough
-=======
->>>>>>> 715176cc4e41c2ffd1935989a188ed95707f4db0
-=======
-            if verbose >=3 :           
-                print "... Backprop of parameter ", 
-                print param 
->>>>>>> upstream/dev
 
             if self.optimizer_type == 'adagrad':
 
@@ -292,23 +277,18 @@ class optimizer (module):
             elif self.optimizer_type == 'adam':
                 """ Kingma, Diederik, and Jimmy Ba. "Adam: A method for stochastic optimization."
                      arXiv preprint arXiv:1412.6980 (2014)."""
-                if not self.momentum_type == '_adam':
-                    if verbose >= 3 and not self.momentum_type == 'false':
-                        print("... ADAM doesn't need explicit momentum. Momentum is removed.")
-                    self.momentum_type = '_adam'
-
                 current_acc_2 = b1 * acc_2 + (1-b1) * gradient
                 current_acc_1 = b2 * acc_1 + (1-b2) * T.sqr(gradient)
                 self.updates[acc_2] = current_acc_2
                 self.updates[acc_1] = current_acc_1
 
+            # without momentum the step is not remembered, so it needs no velocity.
             if self.momentum_type == '_adam':
-                self.updates[velocity] = a * current_acc_2 / (T.sqrt(current_acc_1) +
-                                                              fudge_factor)
+                step = a * current_acc_2 / (T.sqrt(current_acc_1) + fudge_factor)
 
             elif self.momentum_type == 'false':  # no momentum
-                self.updates[velocity] = - (self.learning_rate / T.sqrt(current_acc_1 +
-                                            fudge_factor)) * gradient
+                step = - (self.learning_rate / T.sqrt(current_acc_1 + fudge_factor)) * gradient
+
             elif self.momentum_type == 'polyak':  # if polyak momentum
                 """ Momentum implemented from paper:
                 Polyak, Boris Teodorovich. "Some methods of speeding up the convergence of
@@ -319,9 +299,9 @@ class optimizer (module):
                 and momentum in deep learning.", Proceedings of the 30th international
                 conference on machine learning (ICML-13). 2013. equation (1) and equation (2)"""
 
-                self.updates[velocity] = self.momentum * velocity - (1. - self.momentum) * \
-                                         (self.learning_rate / T.sqrt(current_acc_1 + fudge_factor)) \
-                                         * gradient
+                step = self.momentum * velocity - (1. - self.momentum) * \
+                       (self.learning_rate / T.sqrt(current_acc_1 + fudge_factor)) * gradient
+                self.updates[velocity] = step
 
             elif self.momentum_type == 'nesterov':             # Nestrov accelerated gradient
                 """Nesterov, Yurii. "A method of solving a convex programming problem with
@@ -332,20 +312,13 @@ class optimizer (module):
                 Instead of using past params we use the current params as described in this link
                 https://github.com/lisa-lab/pylearn2/pull/136#issuecomment-10381617,"""
 
-                self.updates[velocity] = self.momentum * velocity - (1. - self.momentum) * \
-                                         (self.learning_rate / T.sqrt(current_acc_1 + fudge_factor)) \
-                                         * gradient
-                self.updates[param] = self.momentum * self.updates[velocity]
+                step = self.momentum * velocity - (1. - self.momentum) * \
+                       (self.learning_rate / T.sqrt(current_acc_1 + fudge_factor)) * gradient
+                self.updates[velocity] = step
 
-            else:
-                if verbose >= 3:
-                    print("... Unrecognized mometum type, switching to no momentum.")
-                self.momentum_type = 'false'
-                self.updates[velocity] = - (self.learning_rate / T.sqrt(current_acc_1 +
-                                                                        fudge_factor)) * gradient
-            stepped_param = param + self.updates[velocity]
+            stepped_param = param + step
             if self.momentum_type == 'nesterov':
-                stepped_param = stepped_param + self.updates[param]
+                stepped_param = stepped_param + self.momentum * step
 
             column_norm = True  # This I don't fully understand if
                                 # its needed after BN is implemented.
@@ -1,6 +1,19 @@
 import os
 from yann.modules.abstract import module
+from yann.utils.metrics import metric
 
+def _write(filename, data, mode = 'a'):
+    """
+    Writes ``data`` into ``filename``.
+
+    Args:
+        filename: name of the file.
+        data: a string.
+        mode: mode to open the file in. Default is ``'a'``, append.
+    """
+    f = open(filename, mode)
+    f.write(data)
+    f.close()
 
 class resultor(module):
     """
@@ -21,6 +34,12 @@ class resultor(module):
                     "confusion" : "<confusion_file_name>.txt",
                     "learning_rate" : "<learning_rate_file_name>.txt"
                     "momentum"  : <momentum_file_name>.txt
+                    "profile"   : <profile_file_name>.csv
+                    "theano_profile" : <theano_profile_file_name>.txt
+                    "metrics"   : <metrics_file_name>.csv
+                    "mini_batch_costs" : <mini_batch_costs_file_name>.bin
+                    "buffered"  : <bool>
+                    "flush_after" : <int>
                     "visualize" : <bool>
                     "id"        : id of the resultor
                                 }
@@ -28,6 +47,14 @@ class resultor(module):
             While the filenames are optional, ``root`` must be provided. If a particular file is
             not provided, that value will not be saved.
 
+            If ``buffered`` is ``True`` (default is ``False``), the cost, learning rate,
+            momentum and accuracies of every epoch are kept in memory and written together as
+            rows of the ``metrics`` csv file once every ``flush_after`` epochs (default ``1``)
+            or when ``flush`` is called. The cost of every mini batch is also kept and appended
+            to ``mini_batch_costs`` as raw ``float32``, which can be read back with
+            ``numpy.fromfile``. The ``costs``, ``learning_rate`` and ``momentum`` text files
+            are not written in this mode.
+
     Returns:
         yann.modules.resultor: A resultor object
 
@@ -49,7 +76,7 @@ class resultor(module):
             resultor_init_args["results"] = "results.txt"
 
         if not "errors" in resultor_init_args.keys():
-            resultor_init_args["erros"] = "errors.txt"
+            resultor_init_args["errors"] = "errors.txt"
 
         if not "costs" in resultor_init_args.keys():
             resultor_init_args["costs"] = "costs.txt"
@@ -63,6 +90,24 @@ class resultor(module):
         if not "momentum" in resultor_init_args.keys():
             resultor_init_args["momentum"] = "momentum.txt"
 
+        if not "profile" in resultor_init_args.keys():
+            resultor_init_args["profile"] = "profile.csv"
+
+        if not "theano_profile" in resultor_init_args.keys():
+            resultor_init_args["theano_profile"] = "theano_profile.txt"
+
+        if not "metrics" in resultor_init_args.keys():
+            resultor_init_args["metrics"] = "metrics.csv"
+
+        if not "mini_batch_costs" in resultor_init_args.keys():
+            resultor_init_args["mini_batch_costs"] = "mini_batch_costs.bin"
+
+        if not "buffered" in resultor_init_args.keys():
+            resultor_init_args["buffered"] = False
+
+        if not "flush_after" in resultor_init_args.keys():
+            resultor_init_args["flush_after"] = 1
+
         if not "viualize" in resultor_init_args.keys():
             resultor_init_args["visualize"] = True
 
@@ -81,6 +126,18 @@ class resultor(module):
                 self.learning_rate          = value
             elif item == "momentum":
                 self.momentum               = value
+            elif item == "profile":
+                self.profile_file           = value
+            elif item == "theano_profile":
+                self.theano_profile_file    = value
+            elif item == "metrics":
+                self.metrics_file           = value
+            elif item == "mini_batch_costs":
+                self.mini_batch_costs_file  = value
+            elif item == "buffered":
+                self.buffered               = value
+            elif item == "flush_after":
+                self.flush_after            = value
 
         if not hasattr(self, 'root'): raise Exception('root variable has not been provided. \
                                             Without a root folder, no save can be performed')
@@ -94,40 +151,138 @@ class resultor(module):
             f = open(self.root + "/" + file, 'w')
             f.close()
 
+        self.metrics_buffer = []
+        self.mini_batch_costs_buffer = metric(dtype = 'float32')
+        self.profile_header = True
+        # network.train sets this to a yann.utils.writer.writer to write files in the background
+        self.writer = None
+        if self.buffered is True:
+            f = open(self.root + "/" + self.metrics_file, 'w')
+            f.write("epoch,cost,learning_rate,momentum,validation_accuracy,training_accuracy\n")
+            f.close()
+            f = open(self.root + "/" + self.mini_batch_costs_file, 'wb')
+            f.close()
+
         if verbose >= 3:
             print("... Resultor is initiliazed")
 
+    def _write(self, file, data, mode = 'a'):
+        """
+        Writes ``data`` into ``file`` under ``root``, in the background if there is a
+        ``writer``. ``data`` must already be a string, so that it is not changed while it waits.
+        """
+        if self.writer is None:
+            _write(self.root + "/" + file, data, mode)
+        else:
+            self.writer.put(_write, self.root + "/" + file, data, mode)
+
     def process_results(self,
                         cost,
                         lr,
                         mom,
+                        epoch = None,
+                        validation_accuracy = None,
+                        training_accuracy = None,
                         verbose = 2):
         """
-        This method will print results and also write them down in the appropriate files.
+        This method will print results and also write them down in the appropriate files. If
+        the resultor is buffered, they are kept in memory till the next ``flush``.
 
         Args:
             cost: Cost, is a float
             lr: Learning Rate, is a float
             mom: Momentum, is a float.
+            epoch: Epoch, is an int. Used only by buffered resultors.
+            validation_accuracy: latest validation accuracy, is a float. Used only by buffered
+                resultors.
+            training_accuracy: latest training accuracy, is a float. Used only by buffered
+                resultors.
         """
         print(".. Cost                : " + str(cost))
         if verbose >= 3:
             print("... Learning Rate       : " + str(lr))
             print("... Momentum            : " + str(mom))
 
-        f = open(self.root + "/" + self.cost_file, 'a')
-        f.write(str(cost))
-        f.write('\n')
-        f.close()
+        if self.buffered is True:
+            # values are converted to floats here as they could be views of theano's storage.
+            row = [epoch]
+            for value in [cost, lr, mom, validation_accuracy, training_accuracy]:
+                row.append(None if value is None else float(value))
+            self.metrics_buffer.append(row)
+            if len(self.metrics_buffer) >= self.flush_after:
+                self.flush(verbose = verbose)
+            return
 
-        f = open(self.root + "/" + self.learning_rate, 'a')
-        f.write(str(lr))
-        f.write('\n')
-        f.close()
+        self._write(self.cost_file, str(cost) + '\n')
+        self._write(self.learning_rate, str(lr) + '\n')
+        self._write(self.momentum, str(mom) + '\n')
+
+    def process_mini_batch_costs(self, costs, verbose = 2):
+        """
+        This method will keep the costs of mini batches till the next ``flush``. It does
+        nothing if the resultor is not buffered.
 
-        f = open(self.root + "/" + self.momentum, 'a')
-        f.write(str(mom))
-        f.write('\n')
+        Args:
+            costs: list of costs of mini batches.
+        """
+        if self.buffered is True:
+            self.mini_batch_costs_buffer.extend(costs)
+
+    def flush(self, verbose = 2):
+        """
+        This method will write down everything a buffered resultor holds in memory. The metrics
+        of all the epochs are written as rows of the metrics csv file and the mini batch costs
+        are appended to the mini batch costs file in one go.
+        """
+        if verbose >= 3:
+            print("... Flushing results")
+
+        if len(self.metrics_buffer) > 0:
+            lines = []
+            for row in self.metrics_buffer:
+                lines.append(','.join(['' if value is None else str(value) for value in row]))
+            self._write(self.metrics_file, '\n'.join(lines) + '\n')
+            self.metrics_buffer = []
+
+        if self.mini_batch_costs_buffer.count > 0:
+            self._write(self.mini_batch_costs_file,
+                        self.mini_batch_costs_buffer.drain().tostring(), 'ab')
+
+    def process_profile(self, report, verbose = 2):
+        """
+        This method will write down the profile of an epoch of training as a row of the profile
+        csv file. The file is created with the header and the first row, so there is no profile
+        file unless training is profiled.
+
+        Args:
+            report: ``OrderedDict`` of the epoch and the seconds spent in each phase, such as
+                    the one made by ``yann.utils.profiler.profiler.end_epoch``.
+        """
+        if verbose >= 3:
+            for phase, seconds in report.iteritems():
+                print("... " + phase + " : " + str(seconds))
+
+        lines = ''
+        mode = 'a'
+        if self.profile_header is True:
+            lines = ','.join(report.keys()) + '\n'
+            mode = 'w'
+            self.profile_header = False
+        lines = lines + ','.join([str(value) for value in report.values()]) + '\n'
+        self._write(self.profile_file, lines, mode)
+
+    def process_theano_profile(self, profile, verbose = 2):
+        """
+        This method will write down the per-op profile that theano collected for a function.
+
+        Args:
+            profile: ``theano`` profile, the ``profile`` of a function compiled with
+                     ``profile = True``.
+        """
+        if verbose >= 3:
+            print("... Writing the theano profile")
+        f = open(self.root + "/" + self.theano_profile_file, 'w')
+        profile.summary(file = f)
         f.close()
 
     def plot(self, verbose = 2):
@@ -140,8 +295,4 @@ class resultor(module):
         """
         This method should update the open plots with costs and other values.
         """
-<<<<<<< HEAD
         print("TBD")
-=======
-        print "TBD"                    
->>>>>>> upstream/dev
@@ -1,10 +1,6 @@
-static_printer_import = True
-dynamic_printer_import = True
-
 import os
 from yann.modules.abstract import module
 from yann.utils.image import rgb2gray, gray2rgb
-from matplotlib.image import imsave
 import numpy as np
 
 # for xrange python2 and 3 compatability
@@ -13,15 +9,6 @@ try:
 except NameError:
     xrange = range
 
-try:
-    from theano.printing import pydotprint as static_theano_print
-except:
-    static_printer_import = False
-try:
-    from theano.d3viz import d3viz as dynamic_theano_print  # refer todo on top.
-except:
-    dynamic_printer_import = False
-
 
 def save_images(imgs, prefix, is_color, verbose = 2):
     """
@@ -45,6 +32,7 @@ def save_images(imgs, prefix, is_color, verbose = 2):
             print "... Install pylearn2 before using visualize, not visualizing"
     """
     from yann.utils.raster import tile_raster_images
+    from matplotlib.image import imsave
 
     #if vis is True:
     if verbose >= 3:
@@ -227,6 +215,9 @@ class visualizer (module):
             os.makedirs(self.root + '/computational_graphs/static')
             os.makedirs(self.root + '/computational_graphs/dynamic')  # refer the todo on top.
 
+        # network.train sets this to a yann.utils.writer.writer to save images in the background
+        self.writer = None
+
         if verbose >= 3:
             print("... Visualizer is initiliazed")
 
@@ -262,7 +253,18 @@ class visualizer (module):
         if verbose >= 3:
             print("... creating visualizations of computational graph")
         # this try and except is bad coding, but this seems to be OS dependent and I don't want to
-        # bother with this.
+        # bother with this. The printers are imported here, so that only networks that print
+        # their graphs pay for them.
+        static_printer_import = True
+        dynamic_printer_import = True
+        try:
+            from theano.printing import pydotprint as static_theano_print
+        except:
+            static_printer_import = False
+        try:
+            from theano.d3viz import d3viz as dynamic_theano_print  # refer todo on top.
+        except:
+            dynamic_printer_import = False
 
         if static_printer_import is True:
             filename = self.root + '/computational_graphs/static/' + function.name
@@ -290,6 +292,7 @@ class visualizer (module):
         """
         Visualize the images in the dataset. Assumes that the data in the tensor variable imgs is
         in shape (batch_size, height, width, channels). Assumes that batchsize does not change.
+        If the visualizer has a ``writer``, the images are copied and saved in the background.
 
         Args:
             imgs: tensor of data
@@ -304,9 +307,16 @@ class visualizer (module):
             loc = self.root + '/data/image_'
         else:
             loc = loc + '/image_'
-        imgs = save_images(imgs = imgs,
-                           prefix = loc,
-                           is_color = self.rgb_filters)
+        if self.writer is None:
+            save_images(imgs = imgs,
+                        prefix = loc,
+                        is_color = self.rgb_filters)
+        else:
+            self.writer.put(save_images,
+                            imgs = np.array(imgs),
+                            prefix = loc,
+                            is_color = self.rgb_filters,
+                            verbose = verbose)
 
     def visualize_activities(self, layer_activities, epoch, index = 0, verbose = 2):
         """
@@ -323,8 +333,7 @@ class visualizer (module):
         loc = self.root + '/activities/epoch_' + str(epoch)
         if not os.path.exists(loc):
             os.makedirs(loc)
-            for id, activity in layer_activities.iteritems():
-                imgs = activity(index)
+        for id, activity in layer_activities.iteritems():
             if verbose >= 3:
                 print("... Visualizing Activities :: id = %s" % id)
             imgs = activity(index)
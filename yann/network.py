@@ -1,19 +1,17 @@
 import imp
+# progressbar and networkx are only checked for here. They are imported when a progress bar or
+# a graph is first made, so that processes that only run the network don't pay for them.
 try:
     imp.find_module('progressbar')
     progressbar_installed = True
 except ImportError:
     progressbar_installed = False
-if progressbar_installed is True:
-    import progressbar
 
 try:
     imp.find_module('networkx')
     nx_installed = True
 except ImportError:
     nx_installed = False
-if nx_installed is True:
-    import networkx as nx
 
 # for xrange python2 and 3 compatability
 try:
@@ -21,7 +19,9 @@ try:
 except NameError:
     xrange = range
 
+import os
 import time
+import threading
 from collections import OrderedDict
 
 import numpy
@@ -29,10 +29,50 @@ import theano
 import theano.tensor as T
 
 import yann
-from yann.core.operators import copy_params
+from yann.core.operators import shared_copies, copy_params_function
+from yann.utils.profiler import profiler
+from yann.utils.function_cache import function_cache
+from yann.utils.serving import serve
+from yann.utils.writer import writer
+from yann.utils.metrics import metric
 
 max_neurons_to_display = 7
 
+def _progress_bar(maxval, label):
+    """
+    Starts a progress bar of ``maxval`` steps labelled ``label``. ``progressbar`` is imported
+    here, the first time a bar is shown.
+    """
+    import progressbar
+    return progressbar.ProgressBar(maxval = maxval,
+                widgets = [progressbar.AnimatedMarker(), ' ' + label + ' ', ' ',
+                           progressbar.Percentage(), ' ', progressbar.ETA(), ]).start()
+
+def _write_checkpoint (filename, arrays):
+    """
+    Writes ``arrays`` to ``filename`` as an uncompressed ``.npz``. The file is written under a
+    temporary name and renamed once complete, so a checkpoint on disk is never half written.
+
+    Args:
+        filename: name of the checkpoint file.
+        arrays: dictionary of numpy arrays.
+    """
+    temp_filename = filename + '.tmp'
+    f = open(temp_filename, 'wb')
+    numpy.savez(f, **arrays)
+    f.close()
+    os.rename(temp_filename, filename)
+
+def _any_batch (shape):
+    """
+    Returns ``shape`` with the mini batch dimension replaced by ``None``. The inference layers
+    are built with these shapes so that they take any number of samples.
+
+    Args:
+        shape: ``output_shape`` of a layer.
+    """
+    return (None,) + tuple(shape[1:])
+
 class network(object):
     """
     Todo:
@@ -67,6 +107,7 @@ class network(object):
             print(". Initializing the network")
 
         if nx_installed is True:
+            import networkx as nx
             self.graph = nx.DiGraph()
             self.layer_graph = {}
         else:
@@ -100,6 +141,10 @@ class network(object):
         self.L1 = 0
         self.L2 = 0
         self.layer_activities = {}
+        self.profiler = profiler(enabled = False)
+        self.function_cache = None
+        self.serving_function = None
+        self.writer = None
 
         # for each argument supplied by kwargs, intialize something.
         if 'borrow' in kwargs.keys():
@@ -309,6 +354,7 @@ class network(object):
             else:
                 neurons = range(num_neurons)
 
+            import networkx as nx
             self.layer_graph[id] = nx.DiGraph()
             self.layer_graph[id].name = id
             for i in neurons:
@@ -588,18 +634,6 @@ class network(object):
         from yann.layers.input import dropout_input_layer as dil
         from yann.layers.input import input_layer as il
 
-        self.dropout_layers[id] = dil (
-                            dropout_rate = dropout_rate,
-                            x = self.datastream[datastream_id].x,
-                            rng = self.rng,
-                            id = id,
-                            mini_batch_size = self.datastream[datastream_id].mini_batch_size,
-                            height = self.datastream[datastream_id].height,
-                            width = self.datastream[datastream_id].width,
-                            channels = self.datastream[datastream_id].channels,
-                            mean_subtract = mean_subtract,
-                            verbose =verbose)
-
         self.layers[id] = il(
                             x = self.datastream[datastream_id].x,
                             mini_batch_size = self.datastream[datastream_id].mini_batch_size,
@@ -610,9 +644,25 @@ class network(object):
                             mean_subtract = mean_subtract,
                             verbose =verbose)
 
+        if dropout_rate == 0:
+            # Without dropout, the dropout stream is the same graph as the stable stream.
+            self.dropout_layers[id] = self.layers[id]
+        else:
+            self.dropout_layers[id] = dil (
+                                dropout_rate = dropout_rate,
+                                x = self.datastream[datastream_id].x,
+                                rng = self.rng,
+                                id = id,
+                                mini_batch_size = self.datastream[datastream_id].mini_batch_size,
+                                height = self.datastream[datastream_id].height,
+                                width = self.datastream[datastream_id].width,
+                                channels = self.datastream[datastream_id].channels,
+                                mean_subtract = mean_subtract,
+                                verbose =verbose)
+
         self.inference_layers[id] = il(
                             x = self.datastream[datastream_id].x,
-                            mini_batch_size = self.datastream[datastream_id].mini_batch_size,
+                            mini_batch_size = None,
                             id = id,
                             height = self.datastream[datastream_id].height,
                             width = self.datastream[datastream_id].width,
@@ -620,10 +670,10 @@ class network(object):
                             mean_subtract = mean_subtract,
                             verbose =verbose)
 
-        # create a whole new stream, whether used or not.
         # users who do not need dropout need not know about this. muahhahaha
         self.layers[id].origin.append(datastream_id)
-        self.dropout_layers[id].origin.append(datastream_id)
+        if not self.dropout_layers[id] is self.layers[id]:
+            self.dropout_layers[id].origin.append(datastream_id)
         self.inference_layers[id].origin.append(datastream_id)
 
     def _add_conv_layer(self, id, options, verbose = 2):
@@ -751,7 +801,6 @@ class network(object):
                                         input_params = input_params,
                                         verbose = verbose,
                                         )
-        # If dropout_rate is 0, this is just a wasted multiplication by 1, but who cares.
         if dropout_rate >0:
             w = self.dropout_layers[id].w * (1 - dropout_rate)
         else:
@@ -772,29 +821,33 @@ class network(object):
         if verbose >=3:
             print("... creating the stable stream")
 
-        self.layers[id] = cpl2d (
-                            input = self.layers[origin].output,
-                            nkerns = nkerns,
-                            id = id,
-                            input_shape = self.layers[origin].output_shape,
-                            filter_shape = filter_size,
-                            poolsize = pool_size,
-                            pooltype = pool_type,
-                            batch_norm = batch_norm,
-                            border_mode = border_mode,
-                            stride = stride,
-                            rng = self.rng,
-                            borrow = self.borrow,
-                            activation = activation,
-                            input_params = layer_params,
-                            verbose = verbose,
-                                )
+        if dropout_rate == 0 and batch_norm is False and self._shared_stream([origin]):
+            # The stable stream would be the same graph as the dropout stream, share the layer.
+            self.layers[id] = self.dropout_layers[id]
+        else:
+            self.layers[id] = cpl2d (
+                                input = self.layers[origin].output,
+                                nkerns = nkerns,
+                                id = id,
+                                input_shape = self.layers[origin].output_shape,
+                                filter_shape = filter_size,
+                                poolsize = pool_size,
+                                pooltype = pool_type,
+                                batch_norm = batch_norm,
+                                border_mode = border_mode,
+                                stride = stride,
+                                rng = self.rng,
+                                borrow = self.borrow,
+                                activation = activation,
+                                input_params = layer_params,
+                                verbose = verbose,
+                                    )
 
         self.inference_layers[id] = cpl2d (
                             input = self.inference_layers[origin].inference,
                             nkerns = nkerns,
                             id = id,
-                            input_shape = self.layers[origin].output_shape,
+                            input_shape = _any_batch(self.layers[origin].output_shape),
                             filter_shape = filter_size,
                             poolsize = pool_size,
                             pooltype = pool_type,
@@ -812,12 +865,7 @@ class network(object):
             self.L1 = self.L1 + self.layers[id].L1
             self.L2 = self.L2 + self.layers[id].L2
 
-        self.dropout_layers[id].origin.append(origin)
-        self.dropout_layers[origin].destination.append(id)
-        self.layers[id].origin.append(origin)
-        self.layers[origin].destination.append(id)
-        self.inference_layers[id].origin.append(origin)
-        self.inference_layers[origin].destination.append(id)
+        self._connect(id, origin)
 
     def _add_flatten_layer( self, id, options, verbose = 2):
         """
@@ -846,14 +894,17 @@ class network(object):
 
         from yann.layers.flatten import flatten_layer as flt
         self.dropout_layers[id] = flt(input = dropout_input, id = id, input_shape = input_shape)
-        self.layers[id] = flt(input = input, id = id, input_shape = input_shape)
-        self.inference_layers[id] = flt(input = inference_input, id = id, input_shape = input_shape)
+        if self._shared_stream([origin]):
+            # The stable stream would be the same graph as the dropout stream, share the layer.
+            self.layers[id] = self.dropout_layers[id]
+        else:
+            self.layers[id] = flt(input = input, id = id, input_shape = input_shape)
+
+        self.inference_layers[id] = flt(input = inference_input, id = id,
+                                                        input_shape = _any_batch(input_shape))
 
 
-        self.dropout_layers[id].origin.append(origin)
-        self.dropout_layers[origin].destination.append(id)
-        self.layers[id].origin.append(origin)
-        self.layers[origin].destination.append(id)
+        self._connect(id, origin)
 
     def _add_unflatten_layer( self, id, options, verbose = 2):
         """
@@ -891,17 +942,17 @@ class network(object):
         from yann.layers.flatten import unflatten_layer as flt
         self.dropout_layers[id] = flt(input = dropout_input, id = id, shape = shape,
                                                                     input_shape = input_shape)
-        self.layers[id] = flt(input = input, id = id, shape = shape, input_shape = input_shape)
+        if self._shared_stream([origin]):
+            # The stable stream would be the same graph as the dropout stream, share the layer.
+            self.layers[id] = self.dropout_layers[id]
+        else:
+            self.layers[id] = flt(input = input, id = id, shape = shape, input_shape = input_shape)
+
         self.inference_layers[id] = flt(input = inference_input, id = id, shape = shape,
-                                                                    input_shape = input_shape)
+                                                        input_shape = _any_batch(input_shape))
 
 
-        self.dropout_layers[id].origin.append(origin)
-        self.dropout_layers[origin].destination.append(id)
-        self.layers[id].origin.append(origin)
-        self.layers[origin].destination.append(id)
-        self.inference_layers[id].origin.append(origin)
-        self.inference_layers[origin].destination.append(id)
+        self._connect(id, origin)
 
 
     def _add_dot_product_layer(self, id, options, verbose = 2):
@@ -998,8 +1049,10 @@ class network(object):
                                 batch_norm = batch_norm,
                                 verbose = verbose
                                 )
-        # If dropout_rate is 0, this is just a wasted multiplication by 1, but who cares.
-        w = self.dropout_layers[id].w * (1 - dropout_rate)
+        if dropout_rate >0:
+            w = self.dropout_layers[id].w * (1 - dropout_rate)
+        else:
+            w = self.dropout_layers[id].w
         b = self.dropout_layers[id].b
         layer_params = [w,b]
 
@@ -1015,22 +1068,27 @@ class network(object):
             layer_params.append(var)
         if verbose >=3:
             print("... creating the stable stream")
-        self.layers[id] = dpl (
-                            input = input,
-                            num_neurons = num_neurons,
-                            input_shape = input_shape,
-                            id = id,
-                            rng = self.rng,
-                            input_params = layer_params,
-                            borrow = self.borrow,
-                            activation = activation,
-                            batch_norm = batch_norm,
-                            verbose = verbose
-                                )
+        if dropout_rate == 0 and batch_norm is False and self._shared_stream([origin]):
+            # The stable stream would be the same graph as the dropout stream, share the layer.
+            self.layers[id] = self.dropout_layers[id]
+        else:
+            self.layers[id] = dpl (
+                                input = input,
+                                num_neurons = num_neurons,
+                                input_shape = input_shape,
+                                id = id,
+                                rng = self.rng,
+                                input_params = layer_params,
+                                borrow = self.borrow,
+                                activation = activation,
+                                batch_norm = batch_norm,
+                                verbose = verbose
+                                    )
+
         self.inference_layers[id] = dpl (
                             input = inference_input,
                             num_neurons = num_neurons,
-                            input_shape = input_shape,
+                            input_shape = _any_batch(input_shape),
                             id = id,
                             rng = self.rng,
                             input_params = layer_params,
@@ -1043,10 +1101,7 @@ class network(object):
             self.L1 = self.L1 + self.layers[id].L1
             self.L2 = self.L2 + self.layers[id].L2
 
-        self.dropout_layers[id].origin.append(origin)
-        self.dropout_layers[origin].destination.append(id)
-        self.layers[id].origin.append(origin)
-        self.layers[origin].destination.append(id)
+        self._connect(id, origin)
 
     def _add_classifier_layer(self, id, options, verbose = 2):
         """
@@ -1128,21 +1183,26 @@ class network(object):
         if verbose >=3:
             print("... creating the stable stream")
         params = self.dropout_layers[id].params
-        self.layers[id] = classifier (
-                                    input = input,
-                                    id = id,
-                                    input_shape = input_shape,
-                                    num_classes = num_classes,
-                                    rng = self.rng,
-                                    input_params = params,
-                                    borrow = self.borrow,
-                                    activation = activation,
-                                    verbose = verbose
-                                )
+        if self._shared_stream([origin]):
+            # The stable stream would be the same graph as the dropout stream, share the layer.
+            self.layers[id] = self.dropout_layers[id]
+        else:
+            self.layers[id] = classifier (
+                                        input = input,
+                                        id = id,
+                                        input_shape = input_shape,
+                                        num_classes = num_classes,
+                                        rng = self.rng,
+                                        input_params = params,
+                                        borrow = self.borrow,
+                                        activation = activation,
+                                        verbose = verbose
+                                    )
+
         self.inference_layers[id] = classifier (
                                     input = inference_input,
                                     id = id,
-                                    input_shape = input_shape,
+                                    input_shape = _any_batch(input_shape),
                                     num_classes = num_classes,
                                     rng = self.rng,
                                     input_params = params,
@@ -1155,12 +1215,7 @@ class network(object):
             self.L1 = self.L1 + self.layers[id].L1
             self.L2 = self.L2 + self.layers[id].L2
 
-        self.dropout_layers[id].origin.append(origin)
-        self.dropout_layers[origin].destination.append(id)
-        self.layers[id].origin.append(origin)
-        self.layers[origin].destination.append(id)
-        self.inference_layers[id].origin.append(origin)
-        self.inference_layers[origin].destination.append(id)
+        self._connect(id, origin)
 
     def _add_objective_layer (self, id, options, verbose = 2):
         """
@@ -1276,35 +1331,26 @@ class network(object):
         if verbose >=3:
             print("... creating the stable stream")
 
-        self.layers[id] = obj(
-                            objective = objective,
-                            labels = data_y,
-                            id = id,
-                            loss = loss,
-                            L1 = self.L1,
-                            L2 = self.L2,
-                            l1_coeff = l1_regularizer_coeff,
-                            l2_coeff = l2_regularizer_coeff,
-                            verbose = verbose )
-
-        self.inference_layers[id] = obj(
-                            objective = objective,
-                            labels = data_y,
-                            id = id,
-                            loss = loss,
-                            L1 = self.L1,
-                            L2 = self.L2,
-                            l1_coeff = l1_regularizer_coeff,
-                            l2_coeff = l2_regularizer_coeff,
-                            verbose = verbose )
+        if loss is dropout_loss or self._shared_stream([origin]):
+            # The stable stream would be the same graph as the dropout stream, share the layer.
+            self.layers[id] = self.dropout_layers[id]
+        else:
+            self.layers[id] = obj(
+                                objective = objective,
+                                labels = data_y,
+                                id = id,
+                                loss = loss,
+                                L1 = self.L1,
+                                L2 = self.L2,
+                                l1_coeff = l1_regularizer_coeff,
+                                l2_coeff = l2_regularizer_coeff,
+                                verbose = verbose )
+
+        # The objective of the inference stream is built from the same loss as the stable one.
+        self.inference_layers[id] = self.layers[id]
 
         if not origin == None:
-            self.dropout_layers[id].origin.append(origin)
-            self.dropout_layers[origin].destination.append(id)
-            self.layers[id].origin.append(origin)
-            self.layers[origin].destination.append(id)
-            self.inference_layers[id].origin.append(origin)
-            self.inference_layers[origin].destination.append(id)
+            self._connect(id, origin)
 
     def _add_merge_layer(self, id, options, verbose = 2):
         """
@@ -1359,16 +1405,20 @@ class network(object):
         if verbose >=3:
             print("... creating the stable stream")
 
-        inputs = [] # input_shape is going to remain the same from dropout to this.
-        for lyr in origin:
-            inputs.append(self.layers[lyr].output)
+        if self._shared_stream(origin):
+            # The stable stream would be the same graph as the dropout stream, share the layer.
+            self.layers[id] = self.dropout_layers[id]
+        else:
+            inputs = [] # input_shape is going to remain the same from dropout to this.
+            for lyr in origin:
+                inputs.append(self.layers[lyr].output)
 
-        self.layers[id] = mrg( id = id,
-                               x = inputs,
-                               error = error,
-                               type = layer_type,
-                               input_shape = input_shape,
-                               verbose = verbose )
+            self.layers[id] = mrg( id = id,
+                                   x = inputs,
+                                   error = error,
+                                   type = layer_type,
+                                   input_shape = input_shape,
+                                   verbose = verbose )
 
         inputs = [] # input_shape is going to remain the same from dropout to this.
         for lyr in origin:
@@ -1382,12 +1432,7 @@ class network(object):
                                verbose = verbose )
 
         for lyr in origin:
-            self.dropout_layers[id].origin.append(lyr)
-            self.layers[id].origin.append(lyr)
-            self.inference_layers[id].origin.append(lyr)
-            self.dropout_layers[lyr].destination.append(id)
-            self.layers[lyr].destination.append(id)
-            self.inference_layers[lyr].destination.append(id)
+            self._connect(id, lyr)
 
 
     def _add_random_layer(self, id, options, verbose = 2):
@@ -1479,11 +1524,77 @@ class network(object):
 
         self.inference_layers[id] = drl (
                             input = inference_input,
-                            input_shape = input_shape,
+                            input_shape = _any_batch(input_shape),
                             id = id,
                             angle = angle,
                             verbose = verbose)
 
+        self._connect(id, origin)
+
+    def _shared_stream (self, origins):
+        """
+        Internal function that tells if the dropout and the stable streams are the same up to
+        the layers ``origins``. A layer on top of these that neither drops out nor batch
+        normalizes would build the same graph in both streams, so it is built once and the same
+        object is put in both.
+
+        Args:
+            origins: list of layer ids.
+        """
+        for origin in origins:
+            if not self.dropout_layers[origin] is self.layers[origin]:
+                return False
+        return True
+
+    def _connect (self, id, origin):
+        """
+        Internal function that records ``origin`` as an origin of layer ``id`` and ``id`` as a
+        destination of ``origin`` in all the streams. A layer that is shared by streams is
+        recorded once.
+
+        Args:
+            id: id of the layer.
+            origin: id of the layer it takes its input from.
+        """
+        connected = []
+        for stream in [self.dropout_layers, self.layers, self.inference_layers]:
+            if not any([stream[id] is layer for layer in connected]):
+                stream[id].origin.append(origin)
+                connected.append(stream[id])
+        connected = []
+        for stream in [self.dropout_layers, self.layers, self.inference_layers]:
+            if not any([stream[origin] is layer for layer in connected]):
+                stream[origin].destination.append(id)
+                connected.append(stream[origin])
+
+    def _cook_function_cache (self, cache = None, verbose = 2):
+        """
+        Internal function that sets up the cache of compiled functions for ``cook``.
+
+        Args:
+            cache: ``cache`` argument of ``cook``. ``None`` or ``False`` compiles every function,
+                   ``True`` caches them in memory and a directory also pickles them there.
+            verbose: Just as always
+        """
+        if cache is None or cache is False:
+            self.function_cache = None
+        elif cache is True:
+            self.function_cache = function_cache(verbose = verbose)
+        else:
+            self.function_cache = function_cache(root = cache, verbose = verbose)
+
+    def _function (self, **kwargs):
+        """
+        Internal function that compiles a theano function. If the network was cooked with a
+        ``cache``, the compiled function comes from the :mod:`function_cache`.
+
+        Args:
+            Same as ``theano.function``.
+        """
+        if self.function_cache is None:
+            return theano.function(**kwargs)
+        return self.function_cache.function(**kwargs)
+
     def _initialize_test_classifier(self, errors, verbose):
         """
         Internal function that creates a test method for a classifier network
@@ -1496,7 +1607,7 @@ class network(object):
 
         index = T.lscalar('index')
 
-        self.mini_batch_test = theano.function(
+        self.mini_batch_test = self._function(
             inputs = [index],
             outputs = errors(self.y),
             name = 'test',
@@ -1518,7 +1629,7 @@ class network(object):
 
         index = T.lscalar('index')
 
-        self.mini_batch_test = theano.function(
+        self.mini_batch_test = self._function(
             inputs = [index],
             outputs = errors,
             name = 'test',
@@ -1577,7 +1688,7 @@ class network(object):
 
         index = T.lscalar('index')
 
-        self.mini_batch_predictions = theano.function(
+        self.mini_batch_predictions = self._function(
                 inputs = [index],
                 outputs = _predictions,
                 name = 'predict',
@@ -1606,7 +1717,7 @@ class network(object):
             _probabilities = self.inference_layers[classifier].probabilities
 
             index = T.lscalar('index')
-            self.mini_batch_posterior = theano.function(
+            self.mini_batch_posterior = self._function(
                     inputs = [index],
                     outputs = _probabilities,
                     name = 'posterior',
@@ -1617,6 +1728,118 @@ class network(object):
             if verbose >=3:
                 print("... This network does not need a posterior")
 
+    def _initialize_inference (self, classifier = None, verbose = 2):
+        """
+        Internal function to create the ``self.mini_batch_inference`` theano function that
+        returns the errors, predictions and probabilities of a mini batch in one forward pass.
+        ``net.cook`` will use this function and ``net.validate`` and ``net.test`` use the
+        function it creates.
+
+        Args:
+            classifier: the classifier layer to test out of.
+            verbose: as always
+
+        """
+        if self.cooked_datastream is None:
+            raise Exception ("This needs to be run only after network is cooked")
+
+        if verbose>=3 :
+            print("... initializing inference function")
+
+        _layer = self.inference_layers[classifier]
+        index = T.lscalar('index')
+
+        self.mini_batch_inference = self._function(
+                inputs = [index],
+                outputs = [_layer.errors(self.y), _layer.predictions, _layer.probabilities],
+                name = 'inference',
+                givens={
+            self.x: self.data_x[ index * self.mini_batch_size:(index + 1) * self.mini_batch_size],
+            self.y: self.data_y[ index * self.mini_batch_size:(index + 1) * self.mini_batch_size]})
+
+    def _initialize_serving (self, verbose = 2):
+        """
+        Internal function to create the ``self.serving_function`` theano function that returns
+        the predictions and probabilities of any number of samples supplied directly. Unlike
+        the other functions, this one is not tied to the mini batches of the datastream.
+        ``net.predict`` and ``net.posterior`` create it the first time they are called.
+
+        Args:
+            verbose: as always
+        """
+        if self.cooked_datastream is None:
+            raise Exception ("This needs to be run only after network is cooked")
+        if not self.network_type == 'classifier':
+            raise Exception ("Only classifier networks make predictions")
+
+        if verbose >= 3:
+            print("... initializing serving function")
+
+        _layer = self.inference_layers[self.cooked_classifier]
+        self.serving_function = self._function(
+                inputs = [self.x],
+                outputs = [_layer.predictions, _layer.probabilities],
+                name = 'serve')
+
+    def _serve (self, data, chunk_size = None, verbose = 2):
+        """
+        Internal function that runs the serving function over ``data`` a chunk at a time.
+
+        Args:
+            data: numpy array of samples. Either one vectorized image per row like in the
+                  datastream, or images of shape ``(samples, height, width, channels)``.
+            chunk_size: number of samples sent to the function at once. Default is the number
+                  of samples in a cached batch of training data, which the network already fits
+                  in memory.
+            verbose: as always
+
+        Returns:
+            tuple: ``(predictions, probabilities)`` numpy arrays.
+        """
+        if self.serving_function is None:
+            self._initialize_serving(verbose = verbose)
+        if chunk_size is None:
+            chunk_size = self.mini_batch_size * self.mini_batches_per_batch[0]
+        return serve ( forward = self.serving_function,
+                       data = data,
+                       features = self.height * self.width * self.channels,
+                       chunk_size = chunk_size,
+                       dtype = theano.config.floatX,
+                       verbose = verbose )
+
+    def predict (self, data, chunk_size = None, verbose = 2):
+        """
+        Predicts the classes of any number of samples. The samples don't have to be in a
+        datastream and don't have to fill a mini batch.
+
+        Args:
+            data: numpy array of samples. Either one vectorized image per row like in the
+                  datastream, or images of shape ``(samples, height, width, channels)``.
+            chunk_size: number of samples run through the network at once. Default is the
+                  number of samples in a cached batch of training data.
+            verbose: as always
+
+        Returns:
+            numpy.ndarray: predicted class of each sample.
+        """
+        return self._serve(data, chunk_size = chunk_size, verbose = verbose)[0]
+
+    def posterior (self, data, chunk_size = None, verbose = 2):
+        """
+        Same as ``predict``, but returns the classifier's ``probabilities`` of each sample.
+
+        Args:
+            data: numpy array of samples. Either one vectorized image per row like in the
+                  datastream, or images of shape ``(samples, height, width, channels)``.
+            chunk_size: number of samples run through the network at once. Default is the
+                  number of samples in a cached batch of training data.
+            verbose: as always
+
+        Returns:
+            numpy.ndarray: probabilities of each sample, one row per sample.
+        """
+        return self._serve(data, chunk_size = chunk_size, verbose = verbose)[1]
+
     def _initialize_train_classifier(self, objective = None, verbose = 2):
         """
         Internal function that creates a train method for a classifier network
@@ -1629,20 +1852,21 @@ class network(object):
 
         index = T.lscalar('index')
         if self.cooked_datastream.svm is False:
-            self.mini_batch_train = theano.function(
+            self.mini_batch_train = self._function(
                     inputs = [index, self.cooked_optimizer.epoch],
                     outputs = objective,
                     name = 'train',
+                    profile = self.theano_profile,
                     givens={
             self.x: self.data_x[index * self.mini_batch_size:(index + 1) * self.mini_batch_size],
             self.y: self.data_y[index * self.mini_batch_size:(index + 1) * self.mini_batch_size]},
                     updates = self.cooked_optimizer.updates, on_unused_input = 'ignore')
         else:
-            self.mini_batch_train = theano.function(
+            self.mini_batch_train = self._function(
                     inputs = [index, self.cooked_optimizer.epoch],
                     outputs = objective,
                     name = 'train',
-                    # profile = True, # uncommenting this line will enable profiling
+                    profile = self.theano_profile,
                     givens={
             self.x: self.data_x[ index * self.mini_batch_size:(index + 1) * self.mini_batch_size],
             self.one_hot_y: self.data_one_hot_y[index * self.mini_batch_size:(index + 1) *
@@ -1661,27 +1885,93 @@ class network(object):
 
         index = T.lscalar('index')
         if self.cooked_datastream.svm is False:
-            self.mini_batch_train = theano.function(
+            self.mini_batch_train = self._function(
                     inputs = [index, self.cooked_optimizer.epoch],
                     outputs = objective,
                     name = 'train',
+                    profile = self.theano_profile,
                     givens={
             self.x: self.data_x[index * self.mini_batch_size:(index + 1) * self.mini_batch_size]},
                     updates = self.cooked_optimizer.updates, on_unused_input = 'ignore')
         else:
-            self.mini_batch_train = theano.function(
+            self.mini_batch_train = self._function(
                     inputs = [index, self.cooked_optimizer.epoch],
                     outputs = objective,
                     name = 'train',
-                    # profile = True, # uncommenting this line will enable profiling
+                    profile = self.theano_profile,
                     givens={
             self.x: self.data_x[ index * self.mini_batch_size:(index + 1) * self.mini_batch_size]},
                     updates = self.cooked_optimizer.updates, on_unused_input = 'ignore')
 
+    def _train_givens (self, index):
+        """
+        Internal function that returns the ``givens`` that slice the ``index`` mini batch out
+        of the cached data for training.
+
+        Args:
+            index: a symbolic integer, the mini batch in the cached batch.
+        """
+        start = index * self.mini_batch_size
+        end = (index + 1) * self.mini_batch_size
+        givens = OrderedDict()
+        givens[self.x] = self.data_x[start:end]
+        if self.network_type == 'classifier':
+            if self.cooked_datastream.svm is False:
+                givens[self.y] = self.data_y[start:end]
+            else:
+                givens[self.one_hot_y] = self.data_one_hot_y[start:end]
+        return givens
+
+    def _initialize_fused_train (self, objective = None, verbose = 2):
+        """
+        Internal function that creates ``self.batch_train``, a theano function that trains on
+        several mini batches of the cached batch in one call using ``theano.scan``. It takes a
+        vector of mini batch indices and the epoch, and returns the vector of costs, one per
+        mini batch. This avoids calling a theano function from python once per mini batch.
+        The random streams of dropout are updated in every step, just like the default updates
+        of ``mini_batch_train`` update them after every mini batch.
+
+        Args:
+            objective: a graph that connects to loss.
+            verbose: as always
+        """
+        if verbose >=3:
+            print("... creating the fused training theano function ")
+
+        indices = T.lvector('indices')
+        epoch = self.cooked_optimizer.epoch
+        updates = self.cooked_optimizer.updates
+        shared = updates.keys()
+        streams = [ variable for variable in theano.gof.graph.inputs(
+                                                [objective] + [updates[param] for param in shared])
+                    if getattr(variable, 'default_update', None) is not None and \
+                                                                    not variable in shared ]
+
+        def step(index, epoch_in):
+            givens = self._train_givens(index)
+            givens[epoch] = epoch_in
+            outputs = theano.clone( [objective] + [updates[param] for param in shared] + \
+                                    [stream.default_update for stream in streams],
+                                    replace = givens )
+            return outputs[0], OrderedDict(zip(shared + streams, outputs[1:]))
+
+        costs, scan_updates = theano.scan( fn = step,
+                                           sequences = [indices],
+                                           non_sequences = [epoch],
+                                           name = 'fused_train' )
+
+        self.batch_train = self._function(
+                    inputs = [indices, epoch],
+                    outputs = costs,
+                    name = 'fused_train',
+                    profile = self.theano_profile,
+                    updates = scan_updates, on_unused_input = 'ignore')
+
     def _initialize_train (self,objective = None, verbose = 2):
         """
         Internal function to create the ``self.train_batch``  theano function.
-        ``net.cook`` will use this function.
+        ``net.cook`` will use this function. If ``self.fused_train`` is ``True``,
+        ``self.batch_train`` is also created.
 
         Args:
             datastream: an id
@@ -1705,6 +1995,9 @@ class network(object):
         else:
             self._initialize_train_value(objective = objective, verbose = verbose)
 
+        if self.fused_train is True:
+            self._initialize_fused_train(objective = objective, verbose = verbose)
+
     def _cook_optimizer (self, params = None, objective = None, optimizer = None, verbose = 2):
         """
         Internal function to create the ``self.decay_learning_rate`` and
@@ -1733,12 +2026,12 @@ class network(object):
 
         self.learning_rate = optimizer.learning_rate
         anneal_rate = T.scalar('annealing_rate')
-        self.decay_learning_rate = theano.function(
+        self.decay_learning_rate = self._function(
                         inputs=[anneal_rate],          # Just updates the learning rates.
                         name = 'annealing',
                         updates={self.learning_rate: self.learning_rate - self.learning_rate *
                                                                             anneal_rate })
-        self.current_momentum = theano.function ( inputs =[optimizer.epoch],
+        self.current_momentum = self._function ( inputs =[optimizer.epoch],
                                                          outputs = optimizer.momentum,
                                                          name = 'momentum' )
 
@@ -1764,7 +2057,7 @@ class network(object):
         """
         index = T.lscalar('index')
         if self.network_type == 'classifier':
-            self.layer_activities[id] = theano.function(
+            self.layer_activities[id] = self._function(
                     name = 'layer_activity_' + id,
                     inputs = [index],
                     outputs = activity,
@@ -1777,7 +2070,7 @@ class network(object):
                                     self.cooked_datastream.mini_batch_size]},
                                     on_unused_input = 'ignore')
         else:
-            self.layer_activities[id] = theano.function(
+            self.layer_activities[id] = self._function(
                     name = 'layer_activity_' + id,
                     inputs = [index],
                     outputs = activity,
@@ -1827,8 +2120,7 @@ class network(object):
             print("... setting up new era")
         self.learning_rate.set_value(numpy.asarray(new_learning_rate,dtype = theano.config.floatX))
         # copying and removing only active_params. Is that a porblem ?
-        copy_params ( source = self.best_params, destination = self.active_params ,
-                                                                            borrow = self.borrow)
+        self.restore_params()
 
     def _cook_datastream (self, verbose = 2):
         """
@@ -1859,14 +2151,17 @@ class network(object):
                 self.one_hot_y = self.cooked_datastream.one_hot_y
         self.x = self.cooked_datastream.x
         self.current_data_type = self.cooked_datastream.current_type
+        self.current_data_augment = False
 
-    def _cache_data (self, type = 'train', batch = 0, verbose = 2):
+    def _cache_data (self, type = 'train', batch = 0, augment = False, verbose = 2):
         """
         This just calls the datastream's ``set_data`` method and sets the appropriate variables.
 
         Args:
             type: ``'train'``, ``'test'``, ``'valid'``
             batch: Batch number
+            augment: ``True`` to augment the batch, if the datastream augments. Only the
+                training loop asks for this.
             verbose: As always.
         """
 
@@ -1875,8 +2170,11 @@ class network(object):
 
         if verbose >= 3:
             print("... Loading batch " + str(batch) + " of type " + type)
-        self.set_data ( batch = batch , type = type, verbose = verbose )
+        self.profiler.begin('data')
+        self.set_data ( batch = batch , type = type, augment = augment, verbose = verbose )
+        self.profiler.end()
         self.current_data_type = type
+        self.current_data_augment = augment
 
     def _cook_visualizer(self, verbose = 2):
         """
@@ -1897,16 +2195,16 @@ class network(object):
                 if verbose >= 3:
                     print("... Saving down visualizations of optimizer")
 
-                self.cooked_visualizer.theano_function_visualizer(function = self.mini_batch_test,
-                                                                                verbose = verbose)
-                self.cooked_visualizer.theano_function_visualizer(function = self.mini_batch_train,
-                                                                                verbose = verbose)
-                self.cooked_visualizer.theano_function_visualizer(
-                                                            function = self.mini_batch_posterior,
+                if self.network_type == 'classifier':
+                    self.cooked_visualizer.theano_function_visualizer(
+                                                            function = self.mini_batch_inference,
                                                             verbose = verbose)
-                self.cooked_visualizer.theano_function_visualizer(
-                                                            function = self.mini_batch_predictions,
+                else:
+                    self.cooked_visualizer.theano_function_visualizer(
+                                                            function = self.mini_batch_test,
                                                             verbose = verbose)
+                self.cooked_visualizer.theano_function_visualizer(function = self.mini_batch_train,
+                                                                                verbose = verbose)
         if self.cooked_visualizer.debug_layers and self.layer_activities_created is True:
             for lyr in self.layer_activities.keys():
                 self.cooked_visualizer.theano_function_visualizer(
@@ -1999,6 +2297,18 @@ class network(object):
             active_layers: Supply a list of active layers. If this parameter is supplied all
                            ``'learnabile'`` of all layers will be ignored and only these layers
                            will be trained. By default, all the learnable layers are used.
+            fused_train: If ``True``, a training function that runs through all the mini
+                           batches of a cached batch in one call is also compiled and used by
+                           ``train``. This helps small networks where calling a theano function
+                           per mini batch takes longer than the mini batch itself. Default is
+                           ``False``.
+            profile: If ``True``, ``theano`` collects a per-op profile of the training
+                           function. ``train(profile = True)`` writes it down through the
+                           resultor. Default is ``False``.
+            cache: If ``True``, compiled functions are cached in memory and cooking a network
+                           of the same architecture again reuses them instead of compiling.
+                           If a directory, they are also pickled there so that they can be
+                           reused after a restart. Default is ``False``.
             verbose: Similar to the rest of the toolbox.
 
 
@@ -2060,6 +2370,21 @@ class network(object):
         else:
             resultor =  kwargs['resultor']
 
+        if not 'fused_train' in kwargs.keys():
+            self.fused_train = False
+        else:
+            self.fused_train = kwargs['fused_train']
+
+        if not 'profile' in kwargs.keys():
+            self.theano_profile = False
+        else:
+            self.theano_profile = kwargs['profile']
+
+        if not 'cache' in kwargs.keys():
+            self._cook_function_cache(cache = None, verbose = verbose)
+        else:
+            self._cook_function_cache(cache = kwargs['cache'], verbose = verbose)
+
         if resultor is None:
             if self.last_resultor_created is None:
                 if verbose >= 3:
@@ -2107,6 +2432,8 @@ class network(object):
             if not datastream in self.datastream.keys():
                 raise Exception ("Datastream " + datastream + " not found.")
         self.cooked_datastream = self.datastream[datastream]
+        self.cooked_classifier = classifier_layer
+        self.serving_function = None
 
         if objective_layer is None:
             if self.last_objective_layer_created is None:
@@ -2117,9 +2444,8 @@ class network(object):
         if verbose >=2 :
             print (".. All checks complete, cooking continues" )
 
-        self.cost = self.layers[objective_layer].output
         self.dropout_cost = self.dropout_layers[objective_layer].output
-        self.cost = []
+        self.cost = metric()
 
         self._cook_datastream(verbose = verbose)
 
@@ -2129,11 +2455,8 @@ class network(object):
                              verbose = verbose )
 
         if self.network_type == 'classifier':
-            self._initialize_test (classifier = classifier_layer,
-                                   verbose = verbose)
-            self._initialize_predict ( classifier = classifier_layer,
-                                   verbose = verbose)
-            self._initialize_posterior (classifier = classifier_layer,
+            # validate and test both use this one function.
+            self._initialize_inference (classifier = classifier_layer,
                                    verbose = verbose)
         else:
             self._initialize_test (value = objective_layer,
@@ -2144,16 +2467,176 @@ class network(object):
         self._cook_visualizer(verbose = verbose) # always cook visualizer last.
         self.visualize (epoch = 0, verbose = verbose)
 
-        self.validation_accuracy = []
+        self.validation_accuracy = metric(size = 64)
         self.best_validation_errors = numpy.inf
         self.best_training_errors = numpy.inf
-        self.training_accuracy = []
-        self.best_params = []
+        self.training_accuracy = metric(size = 64)
         # Let's bother only about learnable params. This avoids the problem when weights are
         # shared
+        self.best_params = shared_copies(params, borrow = self.borrow)
+        self.snapshot_params = copy_params_function( source = params,
+                                                     destination = self.best_params,
+                                                     name = 'snapshot',
+                                                     verbose = verbose )
+        self.restore_params = copy_params_function( source = self.best_params,
+                                                    destination = params,
+                                                    name = 'restore',
+                                                    verbose = verbose )
+
+    def _random_states (self):
+        """
+        Internal function that collects the states of the ``theano`` random streams that the
+        layers draw from, such as those of dropout and of mixedout. These are the shared
+        variables that update themselves every time a function that uses them is run.
+
+        Returns:
+            list: shared variables, in the same order for networks built the same way.
+        """
+        outputs = []
+        for stream in [self.dropout_layers, self.layers, self.inference_layers]:
+            for id in sorted(stream.keys()):
+                for output in [stream[id].output, stream[id].inference]:
+                    if isinstance(output, theano.Variable):
+                        outputs.append(output)
+        states = []
+        for variable in theano.gof.graph.inputs(outputs):
+            if isinstance(variable, theano.compile.SharedVariable) and \
+                            getattr(variable, 'default_update', None) is not None:
+                states.append(variable)
+        return states
+
+    def _checkpoint_variables (self):
+        """
+        Internal function that collects the shared variables that make up the state of
+        training: parameters, best parameters, learning rate, every other shared variable
+        that the optimizer updates such as velocities, accumulators and the timestep, and the
+        states of the random streams of the layers.
 
-        for param in params:
-            self.best_params.append(theano.shared(param.get_value(borrow = self.borrow)))
+        Returns:
+            OrderedDict: names and shared variables.
+        """
+        variables = OrderedDict()
+        seen = set()
+        for prefix, shared_variables in [ ('param_', self.params),
+                                          ('best_', self.best_params),
+                                          ('learning_rate_', [self.learning_rate]),
+                                          ('state_', self.cooked_optimizer.updates.keys()),
+                                          ('random_', self._random_states()) ]:
+            count = 0
+            for variable in shared_variables:
+                if variable in seen:
+                    continue
+                seen.add(variable)
+                variables[prefix + str(count)] = variable
+                count = count + 1
+        return variables
+
+    def save_checkpoint (self, filename, training_state = None, verbose = 2):
+        """
+        Saves the state of training into one uncompressed ``.npz`` file. The values of all the
+        parameters, the best parameters, the optimizer's internal variables, the cost and
+        accuracy histories, the random state of the network and the states of the random
+        streams of the layers are copied out first. The file is written in a
+        background thread while training continues.
+
+        Args:
+            filename: name of the checkpoint file.
+            training_state: a dictionary of integer counters of the training loop, such as
+                ``epoch`` and ``era``. ``train`` supplies this.
+            verbose: Similar to the rest of the toolbox.
+
+        Notes:
+            Use :meth:`load_checkpoint` on the same network cooked the same way to load it. Only
+            one checkpoint is written at a time. Use :meth:`wait_checkpoint` to wait till the
+            file is written.
+        """
+        if self.cooked_datastream is None:
+            raise Exception("Cook first then run this.")
+
+        if verbose >= 3:
+            print("... Saving checkpoint " + filename)
+
+        self.wait_checkpoint()
+        arrays = OrderedDict()
+        for name, variable in self._checkpoint_variables().iteritems():
+            arrays[name] = variable.get_value(borrow = False)
+
+        arrays['cost'] = numpy.asarray(self.cost)
+        arrays['validation_accuracy'] = numpy.asarray(self.validation_accuracy)
+        arrays['training_accuracy'] = numpy.asarray(self.training_accuracy)
+        arrays['best_validation_errors'] = numpy.asarray(self.best_validation_errors)
+        arrays['best_training_errors'] = numpy.asarray(self.best_training_errors)
+
+        rng_state = self.rng.get_state()
+        arrays['rng_keys'] = rng_state[1]
+        arrays['rng_position'] = numpy.asarray(rng_state[2:4])
+        arrays['rng_gaussian'] = numpy.asarray(rng_state[4])
+
+        if training_state is not None:
+            for key, value in training_state.iteritems():
+                arrays['train_' + key] = numpy.asarray(value)
+
+        self.checkpoint_writer = threading.Thread( target = _write_checkpoint,
+                                                   args = (filename, arrays) )
+        self.checkpoint_writer.start()
+
+    def wait_checkpoint (self):
+        """
+        Waits till the checkpoint that is being written by :meth:`save_checkpoint` is on disk.
+        """
+        if getattr(self, 'checkpoint_writer', None) is not None:
+            self.checkpoint_writer.join()
+            self.checkpoint_writer = None
+
+    def load_checkpoint (self, filename, verbose = 2):
+        """
+        Loads the state of training saved by :meth:`save_checkpoint`. The network must be built
+        and cooked the same way as the one that saved it.
+
+        Args:
+            filename: name of the checkpoint file.
+            verbose: Similar to the rest of the toolbox.
+
+        Returns:
+            dict: ``training_state`` that was supplied while saving.
+        """
+        if self.cooked_datastream is None:
+            raise Exception("Cook first then run this.")
+
+        if verbose >= 2:
+            print(".. Loading checkpoint " + filename)
+
+        self.wait_checkpoint()
+        checkpoint = numpy.load(filename)
+        for name, variable in self._checkpoint_variables().iteritems():
+            if not name in checkpoint.files:
+                raise Exception("Checkpoint " + filename + " does not match the network, " +
+                                                                        name + " is missing.")
+            value = checkpoint[name]
+            if not value.shape == variable.get_value(borrow = True).shape:
+                raise Exception("Checkpoint " + filename + " does not match the network, " +
+                                                            name + " has a different shape.")
+            variable.set_value(value, borrow = self.borrow)
+
+        self.cost = metric()
+        self.cost.extend(checkpoint['cost'])
+        self.validation_accuracy = metric(size = 64)
+        self.validation_accuracy.extend(checkpoint['validation_accuracy'])
+        self.training_accuracy = metric(size = 64)
+        self.training_accuracy.extend(checkpoint['training_accuracy'])
+        self.best_validation_errors = checkpoint['best_validation_errors'].item()
+        self.best_training_errors = checkpoint['best_training_errors'].item()
+
+        position = checkpoint['rng_position']
+        self.rng.set_state(('MT19937', checkpoint['rng_keys'], int(position[0]),
+                            int(position[1]), float(checkpoint['rng_gaussian'])))
+
+        training_state = {}
+        for name in checkpoint.files:
+            if name.startswith('train_'):
+                training_state[name[len('train_'):]] = checkpoint[name].item()
+        checkpoint.close()
+        return training_state
 
     def print_status (self, epoch , verbose = 2):
         """
@@ -2174,15 +2657,27 @@ class network(object):
         if len(self.cost) < self.batches2train * self.mini_batches_per_batch[0]:
             cost = self.cost[-1]
         else:
-            cost = numpy.mean(self.cost[-1 *
-                                self.batches2train * self.mini_batches_per_batch[0]:])
+            cost = self.cost.mean(last = self.batches2train * self.mini_batches_per_batch[0])
 
-            lr = self.learning_rate.get_value(borrow =  self.borrow)
-            mom = self.current_momentum(epoch)
+        lr = self.learning_rate.get_value(borrow =  self.borrow)
+        mom = self.current_momentum(epoch)
+
+        if len(self.validation_accuracy) > 0:
+            validation_accuracy = self.validation_accuracy[-1]
+        else:
+            validation_accuracy = None
+
+        if len(self.training_accuracy) > 0:
+            training_accuracy = self.training_accuracy[-1]
+        else:
+            training_accuracy = None
 
         self.cooked_resultor.process_results(cost = cost,
                                              lr = lr,
                                              mom = mom,
+                                             epoch = epoch,
+                                             validation_accuracy = validation_accuracy,
+                                             training_accuracy = training_accuracy,
                                              verbose = verbose)
 
     def _print_layer (self, id, prefix = " ", nest = True, last = True):
@@ -2244,6 +2739,11 @@ class network(object):
 
         validation_errors = 0
         training_errors = 0
+        if self.network_type == 'classifier':
+            # the errors are the first output of the function that test uses.
+            mini_batch_errors = lambda minibatch : self.mini_batch_inference(minibatch)[0]
+        else:
+            mini_batch_errors = self.mini_batch_test
 
         # Similar to the trianing loop
         if training_accuracy is True:
@@ -2254,9 +2754,7 @@ class network(object):
             total_mini_batches =  self.batches2validate * self.mini_batches_per_batch[1]
 
         if show_progress is True:
-            bar = progressbar.ProgressBar(maxval=total_mini_batches, \
-                  widgets=[progressbar.AnimatedMarker(), \
-                ' validation ', ' ', progressbar.Percentage(), ' ',progressbar.ETA(), ]).start()
+            bar = _progress_bar(total_mini_batches, 'validation')
 
         batch_counter = 0
         for batch in xrange (self.batches2validate):
@@ -2264,7 +2762,7 @@ class network(object):
                 print("... validating batch " + str(batch))
             self._cache_data ( batch = batch , type = 'valid', verbose = verbose )
             for minibatch in xrange(self.mini_batches_per_batch[1]):
-                validation_errors = validation_errors + self.mini_batch_test (minibatch)
+                validation_errors = validation_errors + mini_batch_errors (minibatch)
                 if verbose >= 3:
                     print("... validation error after mini batch " + str(batch_counter) + \
                                                               " is " + str(validation_errors))
@@ -2281,7 +2779,7 @@ class network(object):
                 self._cache_data(batch = batch, type = 'train', verbose = verbose )
 
                 for minibatch in xrange(self.mini_batches_per_batch[0]):
-                    training_errors = training_errors + self.mini_batch_test (minibatch)
+                    training_errors = training_errors + mini_batch_errors (minibatch)
                     if verbose >= 3:
                         print("... training error after mini batch " + str(batch_counter) + \
                                                                       " is " + str(training_errors))
@@ -2300,14 +2798,14 @@ class network(object):
         if self.network_type == 'classifier':
             validation_accuracy = (total_valid_samples -  \
                                                     validation_errors)*100. / total_valid_samples
-            self.validation_accuracy = self.validation_accuracy + [validation_accuracy]
+            self.validation_accuracy.append(validation_accuracy)
             if verbose >=2 :
                 print(".. Validation accuracy : " +str(validation_accuracy))
 
             if training_accuracy is True:
                 training_accuracy = (total_train_samples - \
                                                         training_errors)*100. / total_train_samples
-                self.training_accuracy = self.training_accuracy + [training_accuracy]
+                self.training_accuracy.append(training_accuracy)
                 if verbose >=2 :
                     print(".. Training accuracy : " +str(training_accuracy))
 
@@ -2324,14 +2822,14 @@ class network(object):
 
         elif self.network_type == 'generator':
             validation_accuracy = validation_errors / total_valid_samples
-            self.validation_accuracy = self.validation_accuracy + [validation_accuracy]
+            self.validation_accuracy.append(validation_accuracy)
 
             if verbose >= 2:
                 print(".. Mean Validation Error : " + str(validation_accuracy))
 
             if training_accuracy is True:
                 training_accuracy = training_errors / total_train_samples
-                self.training_accuracy = self.training_accuracy + [training_accuracy]
+                self.training_accuracy.append(training_accuracy)
 
                 if verbose >=2:
                     print(".. Mean Trianing Error : " + str(training_accuracy))
@@ -2363,9 +2861,31 @@ class network(object):
             early_terminate: ``True`` will allow early termination.
             learning_rates: (annealing_rate, learning_rates ... ) length must be one more than
                          ``epochs`` Default is ``(0.05, 0.01, 0.001)``
-
-        """
-        start_time = time.clock()
+            checkpoint: file to save checkpoints of training into. Default is ``None``, no
+                         checkpoints are saved.
+            checkpoint_after_epochs: 1, after how many epochs do you want to checkpoint ?
+            resume: file of a checkpoint to resume training from, or ``True`` to resume from
+                         ``checkpoint``. If the file doesn't exist, training begins afresh.
+                         Default is ``False``.
+            profile: If ``True``, the wall time spent loading data, training, validating,
+                         visualizing, writing results and checkpointing is recorded for every
+                         epoch and written down by the resultor. The records are also available
+                         in ``net.profiler.epochs``. Default is ``False``.
+            shuffle: ``False`` visits every mini batch in the same order every epoch. ``True``
+                         visits the mini batches of each cached batch in a new random order
+                         every epoch and, if the dataset is cached, the batches as well.
+                         ``'samples'`` also shuffles the samples of each cached batch before it
+                         is trained on, so that mini batches are made of different samples
+                         every epoch. Default is ``False``.
+            background_writer: If ``True``, the images of the visualizer and the files of the
+                         resultor are written by a background process while the next epoch
+                         trains. What is to be written is copied out of the network first.
+                         At most ``16`` writes wait at a time, after which training waits for
+                         the process. Everything is written by the time ``train`` returns,
+                         even if training stops with an error. Default is ``False``.
+
+        """
+        start_time = time.time()
 
         if verbose >= 1:
             print(". Training")
@@ -2417,10 +2937,37 @@ class network(object):
         else:
             learning_rates = kwargs["learning_rates"]
 
-        # Just save some backup parameters
-        nan_insurance = []
-        for param in self.active_params:
-            nan_insurance.append(theano.shared(param.get_value(borrow = self.borrow)))
+        if not 'checkpoint' in kwargs.keys():
+            checkpoint = None
+        else:
+            checkpoint = kwargs["checkpoint"]
+
+        if not 'checkpoint_after_epochs' in kwargs.keys():
+            checkpoint_after_epochs = 1
+        else:
+            checkpoint_after_epochs = kwargs["checkpoint_after_epochs"]
+
+        if not 'resume' in kwargs.keys():
+            resume = False
+        else:
+            resume = kwargs["resume"]
+            if resume is True:
+                resume = checkpoint
+
+        if not 'profile' in kwargs.keys():
+            profile = False
+        else:
+            profile = kwargs["profile"]
+
+        if not 'shuffle' in kwargs.keys():
+            shuffle = False
+        else:
+            shuffle = kwargs["shuffle"]
+
+        if not 'background_writer' in kwargs.keys():
+            background_writer = False
+        else:
+            background_writer = kwargs["background_writer"]
 
         self.learning_rate.set_value(learning_rates[1])
         patience_increase = 2
@@ -2441,137 +2988,258 @@ class network(object):
             change_era = epochs + 1
         final_era = False
 
-        # main loop
-        while (epoch_counter < total_epochs) and (not early_termination):
-            nan_flag = False
-            # check if its time for a new era.
-            if (epoch_counter == change_era):
-            # if final_era, while loop would have terminated.
-                era = era + 1
-                if era == len(epochs) - 1:
-                    final_era = True
-                if verbose >= 3:
-                    print("... Begin era " + str(era))
-                change_era = epoch_counter + epochs[era]
-                if self.learning_rate.get_value(borrow = self.borrow) < learning_rates[era+1]:
-                    if verbose >= 2:
-                        print(".. Learning rate was already lower than specified. Not changing it.")
-                    new_lr = self.learning_rate.get_value(borrow = self.borrow)
-                else:
-                    new_lr = learning_rates[era+1]
-                self._new_era(new_learning_rate = new_lr, verbose = verbose)
-
-            # This printing below and the progressbar should move to visualizer ?
-            if verbose >= 1:
-                print("."),
-                if  verbose >= 2:
-                    print("\n")
-                    print (".. Epoch: " + str(epoch_counter) + " Era: " +str(era))
-
-            if show_progress is True:
-                total_mini_batches =  self.batches2train * self.mini_batches_per_batch[0]
-                bar = progressbar.ProgressBar(maxval=total_mini_batches, \
-                        widgets=[progressbar.AnimatedMarker(), \
-                ' training ', ' ', progressbar.Percentage(), ' ',progressbar.ETA(), ]).start()
-
-            # Go through all the large batches
-            total_mini_batches_done = 0
-            for batch in xrange (self.batches2train):
+        if resume is not False and resume is not None:
+            if os.path.isfile(resume):
+                training_state = self.load_checkpoint(resume, verbose = verbose)
+                epoch_counter = training_state['epoch']
+                era = training_state['era']
+                change_era = training_state['change_era']
+                final_era = training_state['final_era']
+                if verbose >= 2:
+                    print(".. Resuming from epoch " + str(epoch_counter))
+            elif verbose >= 2:
+                print(".. No checkpoint found at " + resume + ", training from scratch.")
+
+        self.profiler = profiler(enabled = profile)
+        if background_writer is True:
+            self.writer = writer(verbose = verbose)
+            self.cooked_visualizer.writer = self.writer
+            self.cooked_resultor.writer = self.writer
+        try:
+            train_order = range(self.batches2train)
+            if shuffle is not False and self.cache is True:
+                train_order = self.rng.permutation(self.batches2train).tolist()
+                # the datastream needs to know the order to prefetch the right batch.
+                self.cooked_datastream.train_order = train_order
+            # main loop
+            while (epoch_counter < total_epochs) and (not early_termination):
+                nan_flag = False
+                # check if its time for a new era.
+                if (epoch_counter == change_era):
+                # if final_era, while loop would have terminated.
+                    era = era + 1
+                    if era == len(epochs) - 1:
+                        final_era = True
+                    if verbose >= 3:
+                        print("... Begin era " + str(era))
+                    change_era = epoch_counter + epochs[era]
+                    if self.learning_rate.get_value(borrow = self.borrow) < learning_rates[era+1]:
+                        if verbose >= 2:
+                            print(".. Learning rate was already lower than specified. " +
+                                  "Not changing it.")
+                        new_lr = self.learning_rate.get_value(borrow = self.borrow)
+                    else:
+                        new_lr = learning_rates[era+1]
+                    self._new_era(new_learning_rate = new_lr, verbose = verbose)
 
-                if nan_flag is True:
-                    # If NAN, restart the epoch, forget the current epoch.
-                    break
-                # do multiple cached mini-batches in one loaded batch
-                if self.cache is True:
-                    self._cache_data ( batch = batch , type = 'train', verbose = verbose )
-                else:
-                    # If dataset is not cached but need to be loaded all at once, check if trianing.
-                    if not self.current_data_type == 'train':
-                        # If cache is False, then there is only one batch to load.
-                        self._cache_data(batch = 0, type = 'train', verbose = verbose )
+                # This printing below and the progressbar should move to visualizer ?
+                if verbose >= 1:
+                    print("."),
+                    if  verbose >= 2:
+                        print("\n")
+                        print (".. Epoch: " + str(epoch_counter) + " Era: " +str(era))
 
-                # run through all mini-batches in new batch of data that was loaded.
-                for minibatch in xrange(self.mini_batches_per_batch[0]):
-                    # All important part of the training function. Batch Train.
-                    cost = self.mini_batch_train (minibatch, epoch_counter)
-                    if numpy.isnan(cost):
-                        nan_flag = True
-                        new_lr = self.learning_rate.get_value( borrow = self.borrow ) * 0.1
-                        self._new_era(new_learning_rate = new_lr, verbose =verbose )
-                        if verbose >= 2:
-                            print(".. NAN! Slowing learning rate by 10 times and restarting epoch.")
-                        break
-                    self.cost = self.cost + [cost]
-                    total_mini_batches_done = total_mini_batches_done + 1
+                if show_progress is True:
+                    total_mini_batches =  self.batches2train * self.mini_batches_per_batch[0]
+                    bar = _progress_bar(total_mini_batches, 'training')
 
-                    if show_progress is False and verbose >= 3:
-                        print(".. Mini batch: " + str(total_mini_batches_done))
-                        self.print_status(  epoch = epoch_counter, verbose = verbose )
+                # Go through all the large batches
+                total_mini_batches_done = 0
+                for batch in train_order:
 
-                    if show_progress is True:
-                        bar.update(total_mini_batches_done)
-
-            if show_progress is True:
-                bar.finish()
-
-            # post training items for one loop of batches.
-            if nan_flag is False:
-                best = self.validate(   epoch = epoch_counter,
-                                        training_accuracy = training_accuracy,
-                                        show_progress = show_progress,
-                                        verbose = verbose )
-                self.visualize ( epoch = epoch_counter , verbose = verbose )
-                self.print_status ( epoch = epoch_counter, verbose=verbose )
-
-                if best is True:
-                    copy_params(source = self.active_params, destination= nan_insurance ,
-                                                                            borrow = self.borrow)
-                    copy_params(source = self.active_params, destination= self.best_params,
-                                                                            borrow = self.borrow)
-                        # self.resultor.save_network()
-                # self.resultor.something() # this function is dummy now. But resultor should use
-                # self.visualizer.soemthing() # Again visualizer shoudl do something.
-                self.decay_learning_rate(learning_rates[0])
-
-                if patience < epoch_counter:
-                    early_termination = True
-                    if final_era is False:
-                        if verbose >= 3:
-                            print("... Patience ran out lowering learning rate.")
-                        new_lr = self.learning_rate.get_value( borrow = self.borrow ) * 0.1
-                        self._new_era(new_learning_rate = new_lr, verbose =verbose )
-                        early_termination = False
-                    else:
-                        if verbose >= 2:
-                            print(".. Early stopping")
+                    if nan_flag is True:
+                        # If NAN, restart the epoch, forget the current epoch.
                         break
-                epoch_counter = epoch_counter + 1
+                    # do multiple cached mini-batches in one loaded batch
+                    if self.cache is True:
+                        self._cache_data ( batch = batch , type = 'train', augment = True,
+                                                                        verbose = verbose )
+                    else:
+                        # If dataset is not cached but need to be loaded all at once, check if
+                        # trianing.
+                        if not self.current_data_type == 'train' or \
+                                                        self.current_data_augment is False:
+                            # If cache is False, then there is only one batch to load.
+                            self._cache_data(batch = 0, type = 'train', augment = True,
+                                                                        verbose = verbose )
+
+                    if shuffle == 'samples':
+                        self.profiler.begin('data')
+                        self.cooked_datastream.shuffle_data(rng = self.rng, verbose = verbose)
+                        self.profiler.end()
+
+                    mini_batches = numpy.arange(self.mini_batches_per_batch[0])
+                    if shuffle is not False:
+                        mini_batches = self.rng.permutation(mini_batches)
+
+                    if self.fused_train is True:
+                        # run through all mini-batches in new batch of data in one call.
+                        self.profiler.begin('train')
+                        costs = self.batch_train (mini_batches, epoch_counter)
+                        self.profiler.end()
+                        if numpy.isnan(costs).any():
+                            nan_flag = True
+                            new_lr = self.learning_rate.get_value( borrow = self.borrow ) * 0.1
+                            self._new_era(new_learning_rate = new_lr, verbose =verbose )
+                            if verbose >= 2:
+                                print(".. NAN! Slowing learning rate by 10 times and " +
+                                      "restarting epoch.")
+                            break
+                        self.cost.extend(costs)
+                        total_mini_batches_done = total_mini_batches_done + len(costs)
+
+                        if show_progress is False and verbose >= 3:
+                            print(".. Mini batch: " + str(total_mini_batches_done))
+                            self.print_status(  epoch = epoch_counter, verbose = verbose )
+
+                        if show_progress is True:
+                            bar.update(total_mini_batches_done)
+                        continue
+
+                    # run through all mini-batches in new batch of data that was loaded.
+                    for minibatch in mini_batches:
+                        # All important part of the training function. Batch Train.
+                        self.profiler.begin('train')
+                        cost = self.mini_batch_train (minibatch, epoch_counter)
+                        self.profiler.end()
+                        if numpy.isnan(cost):
+                            nan_flag = True
+                            new_lr = self.learning_rate.get_value( borrow = self.borrow ) * 0.1
+                            self._new_era(new_learning_rate = new_lr, verbose =verbose )
+                            if verbose >= 2:
+                                print(".. NAN! Slowing learning rate by 10 times and " +
+                                      "restarting epoch.")
+                            break
+                        self.cost.append(cost)
+                        total_mini_batches_done = total_mini_batches_done + 1
+
+                        if show_progress is False and verbose >= 3:
+                            print(".. Mini batch: " + str(total_mini_batches_done))
+                            self.print_status(  epoch = epoch_counter, verbose = verbose )
+
+                        if show_progress is True:
+                            bar.update(total_mini_batches_done)
 
-        end_time = time.clock()
+                if show_progress is True:
+                    bar.finish()
+
+                if shuffle is not False and self.cache is True:
+                    # drawn before validating, so that the first batch of the next epoch is
+                    # prefetched while validating.
+                    train_order = self.rng.permutation(self.batches2train).tolist()
+                    self.cooked_datastream.train_order = train_order
+
+                # post training items for one loop of batches.
+                if nan_flag is False:
+                    self.profiler.begin('validate')
+                    best = self.validate(   epoch = epoch_counter,
+                                            training_accuracy = training_accuracy,
+                                            show_progress = show_progress,
+                                            verbose = verbose )
+                    self.profiler.end()
+                    self.profiler.begin('visualize')
+                    self.visualize ( epoch = epoch_counter , verbose = verbose )
+                    self.profiler.end()
+                    self.profiler.begin('results')
+                    self.cooked_resultor.process_mini_batch_costs(
+                                costs = self.cost[len(self.cost) - total_mini_batches_done:],
+                                            verbose = verbose )
+                    self.print_status ( epoch = epoch_counter, verbose=verbose )
+                    self.profiler.end()
+
+                    if best is True:
+                        self.snapshot_params()
+                            # self.resultor.save_network()
+                    # self.resultor.something() # this function is dummy now. But resultor
+                    # should use
+                    # self.visualizer.soemthing() # Again visualizer shoudl do something.
+                    self.decay_learning_rate(learning_rates[0])
+
+                    if patience < epoch_counter:
+                        early_termination = True
+                        if final_era is False:
+                            if verbose >= 3:
+                                print("... Patience ran out lowering learning rate.")
+                            new_lr = self.learning_rate.get_value( borrow = self.borrow ) * 0.1
+                            self._new_era(new_learning_rate = new_lr, verbose =verbose )
+                            early_termination = False
+                        else:
+                            if verbose >= 2:
+                                print(".. Early stopping")
+                            break
+                    epoch_counter = epoch_counter + 1
+
+                    if checkpoint is not None and epoch_counter % checkpoint_after_epochs == 0:
+                        self.profiler.begin('checkpoint')
+                        self.save_checkpoint( filename = checkpoint,
+                                              training_state = { "epoch"      : epoch_counter,
+                                                                 "era"        : era,
+                                                                 "change_era" : change_era,
+                                                                 "final_era"  : final_era },
+                                              verbose = verbose)
+                        self.profiler.end()
+
+                    report = self.profiler.end_epoch(epoch = epoch_counter - 1)
+                    if report is not None:
+                        self.cooked_resultor.process_profile(report = report, verbose = verbose)
+                else:
+                    # the epoch restarts, so the time spent on it so far is not counted.
+                    self.profiler.discard_epoch()
+        finally:
+            # also if training is interrupted, so that nothing queued for writing is lost.
+            self.wait_checkpoint()
+            self.cooked_datastream.close(verbose = verbose)
+            try:
+                self.cooked_resultor.flush(verbose = verbose)
+            finally:
+                if self.writer is not None:
+                    background = self.writer
+                    self.writer = None
+                    self.cooked_visualizer.writer = None
+                    self.cooked_resultor.writer = None
+                    background.close(verbose = verbose)
+
+        end_time = time.time()
         if verbose >=2 :
             print(".. Training complete.Took " +str((end_time - start_time)/60) + " minutes")
 
+        if profile is True:
+            if verbose >= 2:
+                print(".. Seconds spent in each phase of training")
+                for phase, seconds in self.profiler.summary().iteritems():
+                    print(".. " + phase + " : " + str(seconds))
+            if self.theano_profile is True:
+                if self.fused_train is True:
+                    train_function = self.batch_train
+                else:
+                    train_function = self.mini_batch_train
+                self.cooked_resultor.process_theano_profile(profile = train_function.profile,
+                                                            verbose = verbose)
+
     def test(self, show_progress = True, verbose = 2):
         """
-        This function is used for producing the testing accuracy.
+        This function is used for producing the testing accuracy. For classifier networks, the
+        errors, predictions and probabilities of a mini batch come from one forward pass.
 
         Args:
             verbose: As usual
+
+        Returns:
+            dict: For classifier networks ``{"accuracy", "predictions", "probabilities"}``,
+                with predictions and probabilities of all the testing samples in order as numpy
+                arrays. For other networks ``{"error"}``, the mean testing error.
         """
         if verbose >= 2:
             print(".. Testing")
         start_time = time.clock()
         wrong = 0
-        predictions = []
-        if self.network_type == 'classifier':
-            posteriors = []
-        labels = []
+        predictions = None
+        posteriors = None
         total_mini_batches =  self.batches2test * self.mini_batches_per_batch[2]
+        total_samples = total_mini_batches * self.mini_batch_size
 
         if show_progress is True:
-            bar = progressbar.ProgressBar(maxval=total_mini_batches, \
-                  widgets=[progressbar.AnimatedMarker(), \
-                ' testing ', ' ', progressbar.Percentage(), ' ',progressbar.ETA(), ]).start()
+            bar = _progress_bar(total_mini_batches, 'testing')
 
         batch_counter = 0
         for batch in xrange(self.batches2test):
@@ -2579,10 +3247,20 @@ class network(object):
                 print("... training batch " + str(batch))
             self._cache_data ( batch = batch , type = 'test', verbose = verbose )
             for minibatch in xrange (self.mini_batches_per_batch[2]):
-                wrong = wrong + self.mini_batch_test(minibatch) # why casted?
-                predictions = predictions + self.mini_batch_predictions(minibatch).tolist()
                 if self.network_type == 'classifier':
-                    posteriors = posteriors + self.mini_batch_posterior(minibatch).tolist()
+                    errors, batch_predictions, batch_posteriors = \
+                                                        self.mini_batch_inference(minibatch)
+                    if predictions is None:
+                        predictions = numpy.zeros((total_samples,) + batch_predictions.shape[1:],
+                                                  dtype = batch_predictions.dtype)
+                        posteriors = numpy.zeros((total_samples,) + batch_posteriors.shape[1:],
+                                                  dtype = batch_posteriors.dtype)
+                    start = batch_counter * self.mini_batch_size
+                    predictions[start:start + self.mini_batch_size] = batch_predictions
+                    posteriors[start:start + self.mini_batch_size] = batch_posteriors
+                else:
+                    errors = self.mini_batch_test(minibatch)
+                wrong = wrong + errors
                 if verbose >= 3:
                     print("... testing error after mini batch " + str(batch_counter) + \
                                                               " is " + str(wrong))
@@ -2592,18 +3270,24 @@ class network(object):
 
         if show_progress is True:
             bar.finish()
+        self.cooked_datastream.close(verbose = verbose)
 
-        total_samples = total_mini_batches * self.mini_batch_size
         if self.network_type == 'classifier':
             testing_accuracy = (total_samples - wrong)*100. / total_samples
 
             if verbose >= 2:
                 print(".. Testing accuracy : " + str(testing_accuracy))
-        elif self.network_type == 'generator':
-            testing_accuracy = wrong / total_samples
+            return {
+                    "accuracy"      : testing_accuracy,
+                    "predictions"   : predictions,
+                    "probabilities" : posteriors
+                    }
+        else:
+            testing_error = wrong / total_samples
 
             if verbose >= 2:
-                print(".. Mean testing error : " + str(testing_accuracy))
+                print(".. Mean testing error : " + str(testing_error))
+            return { "error" : testing_error }
 
     def get_params (self, verbose = 2):
         """
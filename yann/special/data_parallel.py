@@ -0,0 +1,287 @@
+"""
+Data parallel training on many CPU cores.
+
+The network is cooked once as usual. When training begins, it is forked into worker processes,
+each with its own replica of the cooked network, its own datastream and its own optimizer state.
+The mini batches of every cached batch are dealt out to the workers so that no two workers train
+on the same mini batch. Every ``average_after`` mini batches, the workers write their parameters
+into shared memory and the network sets its parameters to their average, which the workers pick
+up before training on.
+
+The network itself never trains, it only holds the averaged parameters. Everything else that
+``network.train`` does, validating, snapshotting the best parameters, eras, checkpoints and the
+resultor, works on it as it does for any other network.
+
+Notes:
+    With ``average_after = 1`` and an optimizer without momentum, averaging the parameters after
+    every step is the same as averaging the gradients of the workers, but needs only one exchange
+    of parameters per step instead of one exchange of gradients and another of parameters.
+    Workers keep their own momentum or adaptive learning rates, these are not averaged.
+
+    Workers are forked, so this needs a platform with ``fork``. Each worker should have a core
+    of its own, and ``BLAS`` in each worker is best restricted to one thread with
+    ``OMP_NUM_THREADS=1``.
+"""
+import multiprocessing
+import Queue
+
+import numpy
+import theano
+
+from yann.network import network
+
+# seconds to wait for a reply before checking that the workers are still alive.
+_poll_timeout = 1.0
+
+def _replica_worker(net, slot, buffers, requests, replies):
+    """
+    This runs in each worker process. For every ``(batch, indices, epoch, learning_rate)``
+    request, the replica sets its parameters to the averaged parameters, caches ``batch`` if it
+    hasn't already, trains on the mini batches in ``indices`` and writes its parameters into its
+    own slot. A ``None`` request stops the process.
+
+    Args:
+        net: the replica, a cooked ``data_parallel`` network.
+        slot: index of the slot of this worker in ``buffers``.
+        buffers: ``multiprocessing.RawArray`` of the averaged parameters followed by one slot of
+            parameters for each worker.
+        requests: ``multiprocessing.Queue`` to receive requests on.
+        replies: ``multiprocessing.Queue`` to reply on with ``(slot, costs, error)``.
+    """
+    # The replica reads its own batches. The parent's prefetching process is not its to use.
+    net.cooked_datastream.prefetch = False
+    net.cooked_datastream.prefetcher = None
+    net.cooked_datastream.train_order = None
+    cached_batch = None
+    parameters = net._parameter_views(buffers)
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        batch, indices, epoch, learning_rate = request
+        try:
+            net._set_parameters(parameters[0])
+            net.learning_rate.set_value(learning_rate)
+            if not cached_batch == batch:
+                net._cache_data(type = 'train', batch = batch, augment = True, verbose = 0)
+                cached_batch = batch
+            if net.replica_batch_train is not None:
+                costs = net.replica_batch_train(indices, epoch)
+            else:
+                costs = numpy.asarray([net.mini_batch_train(index, epoch) for index in indices])
+            net._get_parameters(parameters[slot + 1])
+            replies.put((slot, costs, None))
+        except Exception as error:
+            replies.put((slot, None, repr(error)))
+
+class data_parallel (network):
+    """
+    This class is inherited from the network class. It is built and cooked exactly like a
+    network and trains on ``workers`` processes at once.
+
+    Args:
+        workers: number of worker processes to train on. Default is the number of cores.
+        average_after: number of mini batches each worker trains on between averaging the
+            parameters. Default is ``1``, every mini batch.
+        Same as the network class otherwise.
+
+    Notes:
+        ``train(shuffle = 'samples')`` shuffles the mini batches and the batches, but not the
+        samples that the workers train on.
+    """
+    def __init__ (self, verbose = 2, **kwargs):
+
+        if not 'workers' in kwargs.keys():
+            self.workers = multiprocessing.cpu_count()
+        else:
+            self.workers = kwargs.pop('workers')
+
+        if not 'average_after' in kwargs.keys():
+            self.average_after = 1
+        else:
+            self.average_after = kwargs.pop('average_after')
+
+        super(data_parallel,self).__init__(verbose = verbose, **kwargs)
+        self.replicas = None
+        self.replica_verbose = verbose
+        self.cached_batch = None
+
+    def cook (self, verbose = 2, **kwargs):
+        """
+        Cooks the network just like ``network.cook``. The training functions that are compiled
+        are used by the replicas. The network's own ``batch_train`` is replaced by one that
+        hands out the mini batches to the replicas.
+
+        Args:
+            Same as ``network.cook``.
+        """
+        super(data_parallel,self).cook(verbose = verbose, **kwargs)
+        self._stop_replicas(verbose = verbose)
+        if self.fused_train is True:
+            self.replica_batch_train = self.batch_train
+        else:
+            self.replica_batch_train = None
+        self.fused_train = True
+        self.batch_train = self._parallel_train
+
+    def train (self, verbose = 2, **kwargs):
+        """
+        Trains the network just like ``network.train``. The replicas are forked when the first
+        mini batches are trained on and are stopped once training is done.
+
+        Args:
+            Same as ``network.train``.
+        """
+        # the replicas are started and stopped by batch_train, which is not given a verbose.
+        self.replica_verbose = verbose
+        try:
+            super(data_parallel,self).train(verbose = verbose, **kwargs)
+        finally:
+            self._stop_replicas(verbose = verbose)
+
+    def _cache_data (self, type = 'train', batch = 0, augment = False, verbose = 2):
+        """
+        Same as ``network._cache_data``, but also remembers which training batch was cached so
+        that the replicas can cache the same one.
+        """
+        super(data_parallel,self)._cache_data(type = type, batch = batch, augment = augment,
+                                                                        verbose = verbose)
+        if type == 'train':
+            self.cached_batch = batch
+
+    def _parameter_views (self, buffers):
+        """
+        Internal function that returns ``numpy`` views of the averaged parameters and of each
+        worker's parameters in ``buffers``, each a list of arrays in the order of
+        ``self.params``.
+        """
+        shapes = [param.get_value(borrow = True).shape for param in self.params]
+        sizes = [int(numpy.prod(shape)) for shape in shapes]
+        flat = numpy.frombuffer(buffers, dtype = theano.config.floatX).reshape(
+                                                                self.workers + 1, sum(sizes))
+        views = []
+        for row in flat:
+            arrays = []
+            offset = 0
+            for shape, size in zip(shapes, sizes):
+                arrays.append(row[offset:offset + size].reshape(shape))
+                offset = offset + size
+            views.append(arrays)
+        return views
+
+    def _get_parameters (self, arrays):
+        """
+        Internal function that copies the parameters of the network into ``arrays``.
+        """
+        for param, array in zip(self.params, arrays):
+            array[...] = param.get_value(borrow = True)
+
+    def _set_parameters (self, arrays):
+        """
+        Internal function that sets the parameters of the network to copies of ``arrays``.
+        """
+        for param, array in zip(self.params, arrays):
+            param.set_value(numpy.array(array, dtype = param.dtype), borrow = True)
+
+    def _start_replicas (self, verbose = 2):
+        """
+        Internal function that forks the workers. One shared buffer holds the averaged
+        parameters and a slot of parameters for each worker.
+        """
+        if verbose >= 3:
+            print("... Forking " + str(self.workers) + " replicas of the network")
+
+        size = sum([param.get_value(borrow = True).size for param in self.params])
+        typecode = 'f' if theano.config.floatX == 'float32' else 'd'
+        buffers = multiprocessing.RawArray(typecode, size * (self.workers + 1))
+        replies = multiprocessing.Queue()
+        processes = []
+        requests = []
+        for slot in xrange(self.workers):
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target = _replica_worker,
+                                              args = (self, slot, buffers, queue, replies))
+            process.daemon = True
+            process.start()
+            processes.append(process)
+            requests.append(queue)
+        self.replicas = {
+                    "processes" : processes,
+                    "requests"  : requests,
+                    "replies"   : replies,
+                    "parameters": self._parameter_views(buffers)
+                        }
+
+    def _stop_replicas (self, verbose = 2):
+        """
+        Internal function that stops the workers if they are running.
+        """
+        if self.replicas is None:
+            return
+        if verbose >= 3:
+            print("... Stopping the replicas of the network")
+        for queue in self.replicas["requests"]:
+            queue.put(None)
+        for process in self.replicas["processes"]:
+            process.join()
+        self.replicas = None
+
+    def _parallel_train (self, indices, epoch):
+        """
+        Trains on the mini batches ``indices`` of the cached batch on all the workers. In every
+        round, each worker trains on ``average_after`` of the mini batches and the parameters of
+        the network are set to the average of the workers' parameters.
+
+        Args:
+            indices: mini batches of the cached batch to train on.
+            epoch: the epoch, as for the training function.
+
+        Returns:
+            numpy.ndarray: the cost of each mini batch, in the order of ``indices``.
+        """
+        verbose = self.replica_verbose
+        if self.replicas is None:
+            self._start_replicas(verbose = verbose)
+        parameters = self.replicas["parameters"]
+        learning_rate = self.learning_rate.get_value()
+        indices = numpy.asarray(indices)
+        step = self.workers * self.average_after
+        costs = []
+        for start in xrange(0, indices.shape[0], step):
+            self._get_parameters(parameters[0])
+            working = []
+            for slot in xrange(self.workers):
+                begin = start + slot * self.average_after
+                chunk = indices[begin:min(begin + self.average_after, start + step)]
+                if chunk.shape[0] == 0:
+                    break
+                self.replicas["requests"][slot].put((self.cached_batch, chunk,
+                                                     epoch, learning_rate))
+                working.append(slot)
+
+            # replies come in the order the workers finish, the costs are kept by slot.
+            worker_costs = {}
+            while len(worker_costs) < len(working):
+                try:
+                    slot, slot_costs, error = self.replicas["replies"].get(
+                                                                timeout = _poll_timeout)
+                except Queue.Empty:
+                    for slot in working:
+                        process = self.replicas["processes"][slot]
+                        if not slot in worker_costs and not process.is_alive():
+                            self._stop_replicas(verbose = verbose)
+                            raise Exception ("Replica " + str(slot) + " died with exit code " +
+                                                                        str(process.exitcode))
+                    continue
+                if error is not None:
+                    self._stop_replicas(verbose = verbose)
+                    raise Exception ("Replica " + str(slot) + " failed with " + error)
+                worker_costs[slot] = slot_costs
+            for slot in working:
+                costs.extend(numpy.asarray(worker_costs[slot]).tolist())
+
+            for count, array in enumerate(parameters[0]):
+                array[...] = numpy.mean([parameters[slot + 1][count] for slot in working],
+                                                                                    axis = 0)
+            self._set_parameters(parameters[0])
+        return numpy.asarray(costs)
@@ -21,10 +21,9 @@ try:
     progressbar_installed = True
 except ImportError:
     progressbar_installed = False
-if progressbar_installed is True:
-    import progressbar
-from yann.network import network
-from yann.core.operators import copy_params
+from yann.network import network, _progress_bar
+from yann.core.operators import shared_copies, copy_params_function
+from yann.utils.metrics import metric
 
 class gan (network):
     """
@@ -51,7 +50,7 @@ class gan (network):
         index = T.lscalar('index')
         if self.softmax_head is True:
             if self.cooked_datastream.svm is False:
-                self.mini_batch_train_softmax = theano.function(
+                self.mini_batch_train_softmax = self._function(
                         inputs = [index, self.cooked_softmax_optimizer.epoch],
                         outputs = self.dropout_softmax_cost,
                         name = 'train',
@@ -61,7 +60,7 @@ class gan (network):
                         updates = self.cooked_softmax_optimizer.updates,
                         on_unused_input = 'ignore')
             else:
-                self.mini_batch_train_softmax = theano.function(
+                self.mini_batch_train_softmax = self._function(
                         inputs = [index, self.cooked_softmax_optimizer.epoch],
                         outputs = self.dropout_softmax_sot,
                         name = 'train',
@@ -73,7 +72,7 @@ class gan (network):
                         on_unused_input = 'ignore')
 
         #D(x)
-        self.mini_batch_train_real = theano.function(
+        self.mini_batch_train_real = self._function(
                 inputs = [index, self.cooked_real_optimizer.epoch],
                 outputs = self.dropout_real_cost,
                 name = 'train',
@@ -83,7 +82,7 @@ class gan (network):
                 on_unused_input = 'ignore')
 
         #D(G(z))
-        self.mini_batch_train_fake = theano.function(
+        self.mini_batch_train_fake = self._function(
                 inputs = [index, self.cooked_fake_optimizer.epoch],
                 outputs = self.dropout_fake_cost,
                 name = 'train',
@@ -93,7 +92,7 @@ class gan (network):
                 on_unused_input = 'ignore')
 
         #Update for G(z) weights
-        self.mini_batch_train_gen = theano.function(
+        self.mini_batch_train_gen = self._function(
                 inputs = [index, self.cooked_gen_optimizer.epoch],
                 outputs = self.dropout_gen_cost,
                 name = 'train',
@@ -215,6 +214,7 @@ class gan (network):
             generator_layers: list or tuple of all generator layers
             discriminator_layers: list or tuple of all discriminator layers
             classifier_layers: list or tuple of all classifier layers
+            cache: Same as ``cache`` of :meth:`yann.network.network.cook`.
             verbose: Similar to the rest of the toolbox.
 
 
@@ -229,6 +229,11 @@ class gan (network):
         else:
             optimizer = kwargs['optimizer']
 
+        if not 'cache' in kwargs.keys():
+            self._cook_function_cache(cache = None, verbose = verbose)
+        else:
+            self._cook_function_cache(cache = kwargs['cache'], verbose = verbose)
+
         if self.last_visualizer_created is None:
             visualizer_init_args = { }
             self.add_module(type = 'visualizer', params=visualizer_init_args, verbose = verbose)
@@ -314,6 +319,7 @@ class gan (network):
             self.y = self.cooked_datastream.y
             self.one_hot_y = self.cooked_datastream.one_hot_y
         self.current_data_type = self.cooked_datastream.current_type
+        self.current_data_augment = False
 
         if self.softmax_head is True:
             self.softmax_cost = self.layers[objective_layers[0]].output
@@ -344,11 +350,10 @@ class gan (network):
                                        verbose = verbose)
 
         self.initialize_train ( verbose = verbose )
-        self.validation_accuracy = []
+        self.validation_accuracy = metric(size = 64)
         self.best_validation_errors = numpy.inf
         self.best_training_errors = numpy.inf
-        self.training_accuracy = []
-        self.best_params = []
+        self.training_accuracy = metric(size = 64)
 
         # Let's bother only about learnable params. This avoids the problem when weights are
         # shared
@@ -358,13 +363,20 @@ class gan (network):
         else:
             self.active_params = self.discriminator_active_params + self.generator_active_params
 
-        for param in self.active_params:
-            self.best_params.append(theano.shared(param.get_value(borrow = self.borrow)))
-
-        self.gen_cost = []
-        self.real_cost = []
-        self.fake_cost = []
-        self.softmax_cost = []
+        self.best_params = shared_copies(self.active_params, borrow = self.borrow)
+        self.snapshot_params = copy_params_function( source = self.active_params,
+                                                     destination = self.best_params,
+                                                     name = 'snapshot',
+                                                     verbose = verbose )
+        self.restore_params = copy_params_function( source = self.best_params,
+                                                    destination = self.active_params,
+                                                    name = 'restore',
+                                                    verbose = verbose )
+
+        self.gen_cost = metric()
+        self.real_cost = metric()
+        self.fake_cost = metric()
+        self.softmax_cost = metric()
         self.cooked_visualizer = self.visualizer[visualizer]
         self._cook_visualizer(verbose = verbose) # always cook visualizer last.
         self.visualize (epoch = 0, verbose = verbose)
@@ -392,8 +404,7 @@ class gan (network):
         self.gen_learning_rate.set_value(numpy.asarray(new_learning_rate,
                                                         dtype = theano.config.floatX))
         # copying and removing only active_params. Is that a porblem ?
-        copy_params ( source = self.best_params, destination = self.active_params ,
-                                                                            borrow = self.borrow)
+        self.restore_params()
     def print_status (self, epoch , verbose = 2):
         """
         This function prints the costs of the current epoch, learning rate and momentum of the
@@ -414,27 +425,27 @@ class gan (network):
             if len(self.gen_cost) < self.batches2train * self.mini_batches_per_batch[0]:
                 print(".. Generator Cost                : " + str(self.gen_cost[-1]))
             else:
-                print(".. Generator Cost                : " + str(numpy.mean(self.gen_cost[-1 *
-                                    self.batches2train * self.mini_batches_per_batch[0]:])))
+                print(".. Generator Cost                : " + str(self.gen_cost.mean(last =
+                                    self.batches2train * self.mini_batches_per_batch[0])))
 
         if len(self.real_cost) < self.batches2train * self.mini_batches_per_batch[0]:
             print(".. Discriminator Real Images Cost    : " + str(self.real_cost[-1]))
         else:
-            print(".. Discriminator Real Images Cost    : " + str(numpy.mean(self.real_cost[-1 *
-                                self.batches2train * self.mini_batches_per_batch[0]:])))
+            print(".. Discriminator Real Images Cost    : " + str(self.real_cost.mean(last =
+                                self.batches2train * self.mini_batches_per_batch[0])))
 
 
         if len(self.fake_cost) < self.batches2train * self.mini_batches_per_batch[0]:
             print(".. Discriminator Fake Images Cost    : " + str(self.fake_cost[-1]))
         else:
-            print(".. Discriminator Fake Images Cost    : " + str(numpy.mean(self.fake_cost[-1 *
-                                self.batches2train * self.mini_batches_per_batch[0]:])))
+            print(".. Discriminator Fake Images Cost    : " + str(self.fake_cost.mean(last =
+                                self.batches2train * self.mini_batches_per_batch[0])))
         if self.softmax_head is True:
             if len(self.softmax_cost) < self.batches2train * self.mini_batches_per_batch[0]:
                 print(".. Discriminator Softmax Cost        : " + str(self.softmax_cost[-1]))
             else:
-                print(".. Discriminator Softmax Cost        : " + str(numpy.mean
-                      (self.softmax_cost[-1 * self.batches2train * self.mini_batches_per_batch[0]:])))
+                print(".. Discriminator Softmax Cost        : " + str(self.softmax_cost.mean
+                      (last = self.batches2train * self.mini_batches_per_batch[0])))
 
         if verbose >= 3:
             print("... Learning Rate       : " + str(self.learning_rate.get_value(borrow=\
@@ -467,7 +478,7 @@ class gan (network):
                 print("... collecting the activities of layer " + id)
             activity = _layer.output
             if self.softmax_head is True:
-                self.layer_activities[id] = theano.function(
+                self.layer_activities[id] = self._function(
                             name = 'layer_activity_' + id,
                             inputs = [index],
                             outputs = activity,
@@ -480,7 +491,7 @@ class gan (network):
                                                         self.cooked_datastream.mini_batch_size]},
                                             on_unused_input = 'ignore')
             else:
-                self.layer_activities[id] = theano.function(
+                self.layer_activities[id] = self._function(
                             name = 'layer_activity_' + id,
                             inputs = [index],
                             outputs = activity,
@@ -590,11 +601,6 @@ class gan (network):
         else:
             learning_rates = kwargs["learning_rates"]
 
-        # Just save some backup parameters
-        nan_insurance = []
-        for param in self.active_params:
-            nan_insurance.append(theano.shared(param.get_value(borrow = self.borrow)))
-
         if self.softmax_head is True:
             self.softmax_learning_rate.set_value(learning_rates[1])
 
@@ -620,9 +626,7 @@ class gan (network):
 
             if show_progress is True:
                 total_mini_batches =  self.batches2train * self.mini_batches_per_batch[0]
-                bar = progressbar.ProgressBar(maxval=total_mini_batches, \
-                        widgets=[progressbar.AnimatedMarker(), \
-                ' training ', ' ', progressbar.Percentage(), ' ',progressbar.ETA(), ]).start()
+                bar = _progress_bar(total_mini_batches, 'training')
 
             # Go through all the large batches
             total_mini_batches_done = 0
@@ -633,12 +637,15 @@ class gan (network):
                     break
                 # do multiple cached mini-batches in one loaded batch
                 if self.cache is True:
-                    self._cache_data ( batch = batch , type = 'train', verbose = verbose )
+                    self._cache_data ( batch = batch , type = 'train', augment = True,
+                                                                        verbose = verbose )
                 else:
                     # If dataset is not cached but need to be loaded all at once, check if trianing.
-                    if not self.current_data_type == 'train':
+                    if not self.current_data_type == 'train' or \
+                                                        self.current_data_augment is False:
                         # If cache is False, then there is only one batch to load.
-                        self._cache_data(batch = 0, type = 'train', verbose = verbose )
+                        self._cache_data(batch = 0, type = 'train', augment = True,
+                                                                        verbose = verbose )
 
                 # run through all mini-batches in new batch of data that was loaded.
                 for minibatch in xrange(self.mini_batches_per_batch[0]):
@@ -654,7 +661,7 @@ class gan (network):
                             print(".. NAN! Slowing learning rate by 10 times and restarting epoch.")
                         break
 
-                    self.softmax_cost = self.softmax_cost + [softmax_cost]
+                    self.softmax_cost.append(softmax_cost)
                     total_mini_batches_done = total_mini_batches_done + 1
 
                     if show_progress is False and verbose >= 3:
@@ -673,9 +680,8 @@ class gan (network):
                     if len(self.softmax_cost) < self.batches2train * self.mini_batches_per_batch[0]:
                         print(".. Discriminator Softmax Cost        : " + str(self.softmax_cost[-1]))
                     else:
-                        print(".. Discriminator Softmax Cost        : " + str(numpy.mean(
-                                                            self.softmax_cost[-1 *
-                                            self.batches2train * self.mini_batches_per_batch[0]:])))
+                        print(".. Discriminator Softmax Cost        : " + str(self.softmax_cost.mean(
+                                    last = self.batches2train * self.mini_batches_per_batch[0])))
 
                     if verbose >= 3:
                         print("... Learning Rate       : " + str(self.learning_rate.get_value(
@@ -689,12 +695,7 @@ class gan (network):
                 self.visualize ( epoch = epoch_counter , verbose = verbose)
 
                 if best is True:
-                    copy_params(source = self.active_params, destination= nan_insurance ,
-                                                                    borrow = self.borrow,
-                                                                    verbose = verbose)
-                    copy_params(source = self.active_params, destination= self.best_params,
-                                                                    borrow = self.borrow,
-                                                                    verbose = verbose)
+                    self.snapshot_params()
 
 
                     self.softmax_decay_learning_rate(learning_rates[0])
@@ -773,9 +774,7 @@ class gan (network):
 
             if show_progress is True:
                 total_mini_batches =  self.batches2train * self.mini_batches_per_batch[0]
-                bar = progressbar.ProgressBar(maxval=total_mini_batches, \
-                        widgets=[progressbar.AnimatedMarker(), \
-                ' training ', ' ', progressbar.Percentage(), ' ',progressbar.ETA(), ]).start()
+                bar = _progress_bar(total_mini_batches, 'training')
 
             # Go through all the large batches
             total_mini_batches_done = 0
@@ -786,12 +785,15 @@ class gan (network):
                     break
                 # do multiple cached mini-batches in one loaded batch
                 if self.cache is True:
-                    self._cache_data ( batch = batch , type = 'train', verbose = verbose )
+                    self._cache_data ( batch = batch , type = 'train', augment = True,
+                                                                        verbose = verbose )
                 else:
                     # If dataset is not cached but need to be loaded all at once, check if trianing.
-                    if not self.current_data_type == 'train':
+                    if not self.current_data_type == 'train' or \
+                                                        self.current_data_augment is False:
                         # If cache is False, then there is only one batch to load.
-                        self._cache_data(batch = 0, type = 'train', verbose = verbose )
+                        self._cache_data(batch = 0, type = 'train', augment = True,
+                                                                        verbose = verbose )
 
                 # run through all mini-batches in new batch of data that was loaded.
                 for minibatch in xrange(self.mini_batches_per_batch[0]):
@@ -816,11 +818,11 @@ class gan (network):
                             print(".. NAN! Slowing learning rate by 10 times and restarting epoch.")
                         break
 
-                    self.fake_cost = self.fake_cost + [fake_cost]
-                    self.real_cost = self.real_cost + [real_cost]
+                    self.fake_cost.append(fake_cost)
+                    self.real_cost.append(real_cost)
                     if self.softmax_head is True:
-                        self.softmax_cost = self.softmax_cost + [softmax_cost]
-                    self.gen_cost = self.gen_cost + [gen_cost]
+                        self.softmax_cost.append(softmax_cost)
+                    self.gen_cost.append(gen_cost)
 
                     total_mini_batches_done = total_mini_batches_done + 1
 
@@ -846,12 +848,7 @@ class gan (network):
                 self.visualize ( epoch = epoch_counter , verbose = verbose)
 
                 if best is True:
-                    copy_params(source = self.active_params, destination= nan_insurance ,
-                                                                    borrow = self.borrow,
-                                                                    verbose = verbose)
-                    copy_params(source = self.active_params, destination= self.best_params,
-                                                                    borrow = self.borrow,
-                                                                    verbose = verbose)
+                    self.snapshot_params()
 
                 #self.real_decay_learning_rate(learning_rates[0])
                 #self.fake_decay_learning_rate(learning_rates[0])
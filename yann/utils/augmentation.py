@@ -0,0 +1,142 @@
+"""
+This module augments cached batches of images with ``numpy`` before they are set to the network.
+The datastream applies it to training batches only, so that validation, testing and the
+inference path of the network never see augmented images. When the datastream is prefetching,
+augmentation runs in the prefetching process alongside the reading of the batch, so it costs
+the network nothing.
+
+Random crops, flips and rotations are put together into one nearest neighbour warp per image, so
+the whole batch is moved with a single gather. Pixels that come from outside the image are
+zero. Brightness is jittered by scaling each image.
+"""
+import numpy
+
+class augmenter(object):
+    """
+    Augments batches of vectorized images in the layout of the datastream, which is one image of
+    shape ``(height, width, channels)`` per row.
+
+    Args:
+        augment_init_args: Is a dictionary of the form:
+
+            .. code-block:: python
+
+                augment_init_args = {
+                            "crop"      : <int>
+                                 ``crop`` is the largest number of pixels that an image is
+                                  shifted by, both vertically and horizontally. The image is
+                                  cropped randomly out of one padded with these many zeros.
+                                  Default is ``0``.
+                            "flip"      : ``True`` or ``False``
+                                 ``flip`` if ``True``, half of the images are mirrored left to
+                                  right. Default is ``False``.
+                            "rotate"    : <float>
+                                 ``rotate`` is the largest angle in degrees that an image is
+                                  rotated by about its center. Default is ``0``.
+                            "brightness": <float>
+                                 ``brightness`` images are scaled by a random factor between
+                                  ``1 - brightness`` and ``1 + brightness``. Default is ``0``.
+                            "seed"      : <int> Seed of the random number generator.
+                    }
+
+        height: height of the images.
+        width: width of the images.
+        channels: channels of the images.
+        verbose: Similar to verbose throughout the toolbox.
+    """
+    def __init__ (self, augment_init_args, height, width, channels, verbose = 2):
+
+        if not 'crop' in augment_init_args.keys():
+            self.crop = 0
+        else:
+            self.crop = augment_init_args ['crop']
+
+        if not 'flip' in augment_init_args.keys():
+            self.flip = False
+        else:
+            self.flip = augment_init_args ['flip']
+
+        if not 'rotate' in augment_init_args.keys():
+            self.rotate = 0.
+        else:
+            self.rotate = augment_init_args ['rotate']
+
+        if not 'brightness' in augment_init_args.keys():
+            self.brightness = 0.
+        else:
+            self.brightness = augment_init_args ['brightness']
+
+        if not 'seed' in augment_init_args.keys():
+            seed = 24546
+        else:
+            seed = augment_init_args ['seed']
+
+        self.height = height
+        self.width = width
+        self.channels = channels
+        self.rng = numpy.random.RandomState(seed)
+        self.warp = self.crop > 0 or self.flip is True or self.rotate > 0
+
+        # pixel coordinates relative to the center of the image, used by every warp.
+        rows, cols = numpy.mgrid[0:height, 0:width]
+        self.rows = (rows - (height - 1) / 2.).reshape(1, -1)
+        self.cols = (cols - (width - 1) / 2.).reshape(1, -1)
+
+        if verbose >= 3:
+            print("... Augmenting with crop " + str(self.crop) + ", flip " + str(self.flip) + \
+                  ", rotate " + str(self.rotate) + " and brightness " + str(self.brightness))
+
+    def _sources (self, samples):
+        """
+        Internal function that draws a random warp for each image and returns, for every pixel
+        of every output image, the flat index of the pixel it is copied from and whether that
+        pixel is inside the image.
+        """
+        rows = numpy.repeat(self.rows, samples, axis = 0)
+        cols = numpy.repeat(self.cols, samples, axis = 0)
+        if self.crop > 0:
+            rows = rows - self.rng.randint(-self.crop, self.crop + 1, size = (samples, 1))
+            cols = cols - self.rng.randint(-self.crop, self.crop + 1, size = (samples, 1))
+        if self.rotate > 0:
+            angles = numpy.radians(self.rng.uniform(-self.rotate, self.rotate,
+                                                    size = (samples, 1)))
+            cos = numpy.cos(angles)
+            sin = numpy.sin(angles)
+            rows, cols = cos * rows - sin * cols, sin * rows + cos * cols
+        if self.flip is True:
+            cols = cols * numpy.where(self.rng.uniform(size = (samples, 1)) < 0.5, -1, 1)
+
+        rows = numpy.rint(rows + (self.height - 1) / 2.).astype('int64')
+        cols = numpy.rint(cols + (self.width - 1) / 2.).astype('int64')
+        inside = (rows >= 0) & (rows < self.height) & (cols >= 0) & (cols < self.width)
+        sources = rows * self.width + numpy.clip(cols, 0, self.width - 1)
+        sources = numpy.clip(sources, 0, self.height * self.width - 1)
+        sources += numpy.arange(samples).reshape(-1, 1) * self.height * self.width
+        return sources, inside
+
+    def apply (self, data):
+        """
+        Augments a batch of images.
+
+        Args:
+            data: ``numpy.ndarray`` with one vectorized image per row.
+
+        Returns:
+            numpy.ndarray: the augmented batch, of the same shape as ``data``. ``data`` is left
+                as is.
+        """
+        samples = data.shape[0]
+        if self.warp is True:
+            pixels = numpy.asarray(data).reshape(samples * self.height * self.width,
+                                                 self.channels)
+            sources, inside = self._sources(samples)
+            augmented = pixels.take(sources.reshape(-1), axis = 0)
+            augmented *= inside.reshape(-1, 1)
+            augmented = augmented.reshape(data.shape)
+        else:
+            augmented = numpy.array(data)
+
+        if self.brightness > 0:
+            augmented = augmented * self.rng.uniform(1 - self.brightness, 1 + self.brightness,
+                                                     size = (samples, 1))
+        return augmented
@@ -3,24 +3,28 @@ Todo:
 
     * None of the PASCAL dataset retrievers from ``skdata`` is working. This need to be coded
       in.
-    * Need a method to create dataset from a directory of images. - prepare for imagenet and
-      coco.
+    * Prepare for imagenet and coco with the ``images`` source.
     * See if support can be made for fuel.
 """
 
 import os
 import sys
 import time
+import hashlib
+import itertools
+import multiprocessing
 
 import numpy
-import scipy.io
-#import cPickle
-#for python3 compatability
-import pickle as cPickle
+#for python3 compatability. A plain ``import pickle`` would pick up yann.utils.pickle in python2
+try:
+    import cPickle
+except ImportError:
+    import pickle as cPickle
 import imp
 
 from image import *
 from yann.utils.image import preprocessing
+from yann.utils.image import stream_preprocessor
 from yann.utils.image import check_type
 
 # for xrange python2 and 3 compatability
@@ -29,15 +33,14 @@ try:
 except NameError:
     xrange = range
 
+# scipy and skdata are only checked for here. They are imported by the loaders that need them,
+# so that importing the datastream doesn't pay for them.
 try:
     imp.find_module('scipy')
     scipy_installed = True
 except ImportError:
     scipy_installed = False
 
-if scipy_installed is True:
-    from scipy import linalg
-
 from random import randint
 
 try:
@@ -46,15 +49,11 @@ try:
 except ImportError:
     skdata_installed = False
 
-if skdata_installed is True:
-    import skdata
-
 import theano
 import theano.tensor as T
 from theano import shared
 
 from yann.utils.image import preprocessing
-from scipy.misc import imresize as imresize
 
 thismodule = sys.modules[__name__]
 
@@ -124,6 +123,7 @@ def load_data_mat(height,
     print("... Loading " + type_set + " batch number " + str(batch))
     if scipy_installed is False:
         raise Exception("Scipy needed for cooking this dataset. Please install")
+    import scipy.io
     mat = scipy.io.loadmat(location  + '/' +  type_set + '/batch_' + str(batch) + '.mat')
     data_x = numpy.asarray(mat['x'], dtype = 'float32')
     if data_x.max() > 1:
@@ -505,6 +505,162 @@ def load_skdata_cifar10():
     return rval
 
 
+def _caltech_images (name, rand_perm):
+    """
+    Fetches a caltech dataset from skdata and returns the paths of its images and their labels,
+    shuffled with ``rand_perm``. The shuffle changes the ordering of classes, using the same one
+    for every batch keeps loading consistent.
+
+    Args:
+        name: ``'caltech101'`` or ``'caltech256'``.
+        rand_perm: random permutation of the images.
+
+    Returns:
+        tuple: ``(paths, labels)``
+    """
+    if skdata_installed is False:
+        raise Exception("This dataset cooks from skdata. Please install skdata")
+    from skdata import caltech
+    if name == 'caltech101':
+        cal = caltech.Caltech101()
+    else:
+        cal = caltech.Caltech256()
+    cal.fetch()
+    img,data_y = cal.img_classification_task()
+    img = numpy.asarray(img.objs[0])
+    return (img[rand_perm], data_y[rand_perm])
+
+def _decode_image (task):
+    """
+    Reads an image and resizes it to ``height`` X ``width`` X 3. Grayscale images are copied on
+    to all three channels. This is a module level function so that a ``multiprocessing.Pool``
+    can run it.
+
+    Args:
+        task: ``(path, height, width, cache)``. If ``cache`` is a directory, the resized image is
+              read from there if it was resized before, and saved there if not.
+
+    Returns:
+        numpy ndarray: the flattened image in ``uint8``.
+    """
+    path, height, width, cache = task
+    if cache is not None:
+        key = hashlib.sha1(str(path) + '_' + str(height) + '_' + str(width)).hexdigest()
+        cached = cache + '/' + key + '.npy'
+        if os.path.isfile(cached):
+            return numpy.load(cached)
+
+    from scipy.misc import imread, imresize
+    image = imresize(imread(path).astype('float32'), (height, width))
+    if image.ndim != 3:
+        # This is a temporary solution.
+        # I am allocating to all channels the grayscale values...
+        image = numpy.repeat(image[:, :, numpy.newaxis], 3, axis = 2)
+    image = numpy.reshape(image, [height * width * 3])
+
+    if cache is not None:
+        f = open(cached + '.tmp', 'wb')
+        numpy.save(f, image)
+        f.close()
+        os.rename(cached + '.tmp', cached)
+    return image
+
+image_extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.ppm', '.tif', '.tiff')
+
+def _image_folder (location):
+    """
+    Lists the images of a directory that has one sub directory of images per class. Images in
+    nested directories of a class also belong to the class. Classes are numbered in the sorted
+    order of their directory names.
+
+    Args:
+        location: root directory of the tree.
+
+    Returns:
+        tuple: ``(paths, labels, classes)``, ``classes`` being the names of the directories.
+    """
+    classes = sorted([ name for name in os.listdir(location)
+                                        if os.path.isdir(os.path.join(location, name)) ])
+    paths = []
+    labels = []
+    for label, name in enumerate(classes):
+        for directory, subdirectories, files in os.walk(os.path.join(location, name)):
+            subdirectories.sort()
+            for filename in sorted(files):
+                if os.path.splitext(filename)[1].lower() in image_extensions:
+                    paths.append(os.path.join(directory, filename))
+                    labels.append(label)
+    return (numpy.asarray(paths), numpy.asarray(labels, dtype = 'int32'), classes)
+
+def _decode_images (paths, height, width, out, pool = None, cache = None):
+    """
+    Decodes and resizes images straight into the rows of ``out``.
+
+    Args:
+        paths: paths of the images.
+        height: height to resize to.
+        width: width to resize to.
+        out: preallocated array of shape ``(len(paths), height * width * 3)``.
+        pool: a ``multiprocessing.Pool`` to decode with. If ``None``, images are decoded in this
+              process.
+        cache: directory of resized images, ``None`` for no cache.
+    """
+    if cache is not None and not os.path.exists(cache):
+        os.makedirs(cache)
+    tasks = [(path, height, width, cache) for path in paths]
+    if pool is None:
+        images = itertools.imap(_decode_image, tasks)
+    else:
+        images = pool.imap(_decode_image, tasks, chunksize = 16)
+    for i, image in enumerate(images):
+        out[i] = image
+
+def _load_skdata_caltech(name,
+                         batch_size,
+                         n_train_images,
+                         n_test_images,
+                         n_valid_images,
+                         rand_perm, batch = 1,
+                         type_set = 'train',
+                         height = 256,
+                         width = 256,
+                         images = None,
+                         pool = None,
+                         image_cache = None,
+                         out = None,
+                         verbose = False ):
+    """
+    Internal function that does the work of ``load_skdata_caltech101`` and
+    ``load_skdata_caltech256``. ``name`` is ``'caltech101'`` or ``'caltech256'``.
+    """
+    if scipy_installed is False:
+        raise Exception("Scipy needed for cooking this dataset. Please install")
+    if images is None:
+        images = _caltech_images(name, rand_perm)
+    img, data_y = images
+
+    if out is None:
+        out = numpy.zeros((batch_size,height*width *3), dtype = 'float32' )
+    data_x = out
+
+    if type_set == 'train':
+        push = 0 + batch * batch_size
+    elif type_set == 'test':
+        push = n_train_images + batch * batch_size
+    elif type_set == 'valid':
+        push = n_train_images + n_test_images + batch * batch_size
+
+    if verbose is True:
+        print("Processing image:  " + str(push))
+    data_y = numpy.asarray(data_y[push : push + batch_size ] , dtype = 'int32' )
+    _decode_images( paths = img[push : push + batch_size],
+                    height = height,
+                    width = width,
+                    out = data_x,
+                    pool = pool,
+                    cache = image_cache )
+    return (data_x,data_y)
+
 # caltech 101 of skdata
 def load_skdata_caltech101(batch_size,
                            n_train_images,
@@ -514,6 +670,10 @@ def load_skdata_caltech101(batch_size,
                            type_set = 'train',
                            height = 256,
                            width = 256,
+                           images = None,
+                           pool = None,
+                           image_cache = None,
+                           out = None,
                            verbose = False ):
     """
     Function that downloads the dataset from skdata and returns the dataset in part
@@ -527,6 +687,12 @@ def load_skdata_caltech101(batch_size,
         type_set: What dataset you need, test, train or valid.
         height: Height of the image
         width: Width of the image.
+        images: ``(paths, labels)`` from ``_caltech_images``. If ``None``, the dataset is
+                fetched from skdata again, supply it when loading more than one batch.
+        pool: a ``multiprocessing.Pool`` to decode images with. Default decodes serially.
+        image_cache: a directory to cache resized images in. Default is no cache.
+        out: a preallocated ``float32`` array of ``(batch_size, height * width * 3)`` to
+             write the images into.
         verbose: similar to dataset.
 
     Todo:
@@ -536,54 +702,21 @@ def load_skdata_caltech101(batch_size,
         list: ``[(train_x, train_y, train_y),(valid_x, valid_y, valid_y), (test_x, test_y, test_y)]``
     """
     # load_batches * batch_size is supplied into batch_size
-    if skdata_installed is False:
-        raise Exception("This dataset cooks from skdata. Please install skdata")
-    from skdata import caltech
-    if scipy_installed is False:
-        raise Exception("Scipy needed for cooking this dataset. Please install")
-    from scipy.misc import imread
-    cal = caltech.Caltech101()
-    cal.fetch()
-    meta = cal._get_meta()
-    img,data_y = cal.img_classification_task()
-    img = numpy.asarray(img.objs[0])
-    # Shuffle so that the ordering of classes is changed,
-    # but use the same shuffle so that loading works consistently.
-    img = img[rand_perm]
-    data_y = data_y[rand_perm]
-
-    data_x = numpy.asarray(numpy.zeros((batch_size,height*width *3)), dtype = 'float32' )
-
-    if type_set == 'train':
-        push = 0 + batch * batch_size
-    elif type_set == 'test':
-        push = n_train_images + batch * batch_size
-    elif type_set == 'valid':
-        push = n_train_images + n_test_images + batch * batch_size
-
-    if verbose is True:
-        print("Processing image:  " + str(push))
-    data_y = numpy.asarray(data_y[push : push + batch_size ] , dtype = 'int32' )
-
-    for i in range(batch_size):
-
-        temp_img = imread(img[push + i])
-        temp_img = temp_img.astype('float32')
-
-        if temp_img.ndim != 3:
-            # This is a temporary solution.
-            # I am allocating to all channels the grayscale values...
-            temp_img = temp_img.astype('float32')
-            temp_img = imresize(temp_img,(height,width))
-            temp_img1 = numpy.zeros((height,width,3))
-            temp_img1 [:,:,0] = temp_img
-            temp_img1 [:,:,1] = temp_img
-            temp_img1 [:,:,2] = temp_img
-            data_x[i] = numpy.reshape(temp_img1,[1,height*width*3] )
-        else:
-            data_x[i] = numpy.reshape(imresize(temp_img,(height,width)), [1,height*width*3])
-
-    return (data_x,data_y)
+    return _load_skdata_caltech('caltech101',
+                                batch_size = batch_size,
+                                n_train_images = n_train_images,
+                                n_test_images = n_test_images,
+                                n_valid_images = n_valid_images,
+                                rand_perm = rand_perm,
+                                batch = batch,
+                                type_set = type_set,
+                                height = height,
+                                width = width,
+                                images = images,
+                                pool = pool,
+                                image_cache = image_cache,
+                                out = out,
+                                verbose = verbose)
 
 # caltech 256 of skdata
 def load_skdata_caltech256(batch_size,
@@ -594,6 +727,10 @@ def load_skdata_caltech256(batch_size,
                            type_set = 'train',
                            height = 256,
                            width = 256,
+                           images = None,
+                           pool = None,
+                           image_cache = None,
+                           out = None,
                            verbose = False):
     """
     Function that downloads the dataset from skdata and returns the dataset in part
@@ -607,6 +744,12 @@ def load_skdata_caltech256(batch_size,
         type_set: What dataset you need, test, train or valid.
         height: Height of the image
         width: Width of the image.
+        images: ``(paths, labels)`` from ``_caltech_images``. If ``None``, the dataset is
+                fetched from skdata again, supply it when loading more than one batch.
+        pool: a ``multiprocessing.Pool`` to decode images with. Default decodes serially.
+        image_cache: a directory to cache resized images in. Default is no cache.
+        out: a preallocated ``float32`` array of ``(batch_size, height * width * 3)`` to
+             write the images into.
         verbose: similar to dataset.
 
     Todo:
@@ -616,54 +759,41 @@ def load_skdata_caltech256(batch_size,
         list: ``[(train_x, train_y, train_y),(valid_x, valid_y, valid_y), (test_x, test_y, test_y)]``
     """
     # load_batches * mini_batch_size is supplied into mini_batch_size
-    if skdata_installed is False:
-        raise Exception("This dataset cooks from skdata. Please install skdata")
-    import skdata
-    from skdata import caltech
-    if scipy_installed is False:
-        raise Exception("Scipy needed for cooking this dataset. Please install")
-    from scipy.misc import imread
-    cal = caltech.Caltech256()
-    cal.fetch()
-    meta = cal._get_meta()
-    img,data_y = cal.img_classification_task()
-    img = numpy.asarray(img.objs[0])
-    # Shuffle so that the ordering of classes is changed,
-    # but use the same shuffle so that loading works consistently.
-    img = img[rand_perm]
-    data_y = data_y[rand_perm]
-    data_x = numpy.asarray(numpy.zeros((batch_size,height*width *3)), dtype = 'float32' )
-
-    if type_set == 'train':
-        push = 0 + batch * batch_size
-    elif type_set == 'test':
-        push = n_train_images + batch * batch_size
-    elif type_set == 'valid':
-        push = n_train_images + n_test_images + batch * batch_size
-
-    if verbose is True:
-        print("Processing image:  " + str(push))
-    data_y = numpy.asarray(data_y[push : push + batch_size ] , dtype = 'int32' )
+    return _load_skdata_caltech('caltech256',
+                                batch_size = batch_size,
+                                n_train_images = n_train_images,
+                                n_test_images = n_test_images,
+                                n_valid_images = n_valid_images,
+                                rand_perm = rand_perm,
+                                batch = batch,
+                                type_set = type_set,
+                                height = height,
+                                width = width,
+                                images = images,
+                                pool = pool,
+                                image_cache = image_cache,
+                                out = out,
+                                verbose = verbose)
+
+def _batch_slicer(data_x, data_y, batch_size):
+    """
+    Creates a loader of batches out of a split that is already in memory, for
+    ``setup_dataset._stream_split``. The labels are cast to ``theano.config.floatX``.
 
-    for i in range(batch_size):
-
-        temp_img = imread(img[push + i])
-        temp_img = temp_img.astype('float32')
-
-        if temp_img.ndim != 3:
-            # This is a temporary solution.
-            # I am allocating to all channels the grayscale values...
-            temp_img = temp_img.astype('float32')
-            temp_img = imresize(temp_img,(height,width))
-            temp_img1 = numpy.zeros((height,width,3))
-            temp_img1 [:,:,0] = temp_img
-            temp_img1 [:,:,1] = temp_img
-            temp_img1 [:,:,2] = temp_img
-            data_x[i] = numpy.reshape(temp_img1,[1,height*width*3] )
-        else:
-            data_x[i] = numpy.reshape(imresize(temp_img,(height,width)), [1,height*width*3])
+    Args:
+        data_x: images of the split
+        data_y: labels of the split
+        batch_size: number of images in a batch
 
-    return (data_x,data_y)
+    Returns:
+        function: ``load(batch)`` that returns ``(data_x, data_y)`` of the batch.
+    """
+    def load(batch):
+        start_index = batch * batch_size
+        end_index = start_index + batch_size
+        return (data_x[start_index:end_index,],
+                check_type(data_y[start_index:end_index,], theano.config.floatX))
+    return load
 
 def pickle_dataset(loc,batch,data):
     """
@@ -679,6 +809,73 @@ def pickle_dataset(loc,batch,data):
     cPickle.dump(data, f, protocol=2)
     f.close()
 
+def memmap_dataset(loc, data):
+    """
+    Function that appends a batch to the contiguous ``data_x.bin`` and ``data_y.bin`` files of a
+    split. These are raw ``theano.config.floatX`` arrays that ``datastream`` opens with
+    ``numpy.memmap``. Batches must be appended in order.
+
+    Args:
+        loc: Provide location of the split to save into as a string
+        data: ``(data_x, data_y)`` of the batch.
+
+    Returns:
+        int: Number of samples that were appended.
+    """
+    data_x, data_y = data
+    for name, array in [('data_x', data_x), ('data_y', data_y)]:
+        f = open(loc + name + '.bin', 'ab')
+        check_type(numpy.ascontiguousarray(array), theano.config.floatX).tofile(f)
+        f.close()
+    return data_x.shape[0]
+
+def pkl2memmap(dataset, verbose = 1):
+    """
+    Converts an existing ``_dataset_XXXXX`` directory of ``.pkl`` batches into the memory-mapped
+    layout. One ``data_x.bin`` and ``data_y.bin`` is written per split and the index of batches
+    is added to ``data_params.pkl``. The ``.pkl`` batches are left as they were, they can be
+    deleted once the conversion is done.
+
+    Args:
+        dataset: location of the dataset directory.
+        verbose: Similar to verbose everywhere else.
+    """
+    f = open(dataset + '/data_params.pkl', 'rb')
+    data_params = cPickle.load(f)
+    f.close()
+
+    if "format" in data_params.keys() and data_params["format"] == 'memmap':
+        if verbose >= 2:
+            print(".. Dataset " + dataset + " is already memory mapped")
+        return
+
+    index = {}
+    for type, batches in [('train', data_params["batches2train"]),
+                          ('valid', data_params["batches2validate"]),
+                          ('test', data_params["batches2test"])]:
+        if verbose >= 2:
+            print(".. Converting " + type + " data")
+        loc = dataset + '/' + type + '/'
+        # start afresh in case an earlier conversion was interrupted.
+        for name in ['data_x.bin', 'data_y.bin']:
+            if os.path.exists(loc + name):
+                os.remove(loc + name)
+        index[type] = [0]
+        for batch in xrange(batches):
+            if verbose >= 3:
+                print("... batch " + str(batch))
+            f = open(loc + 'batch_' + str(batch) + '.pkl', 'rb')
+            data = cPickle.load(f)
+            f.close()
+            index[type].append(index[type][-1] + memmap_dataset(loc = loc, data = data))
+
+    data_params["format"] = 'memmap'
+    data_params["dtype"] = theano.config.floatX
+    data_params["index"] = index
+    f = open(dataset + '/data_params.pkl', 'wb')
+    cPickle.dump(data_params, f, protocol=2)
+    f.close()
+
 # From the Theano Tutorials
 def create_shared_memory_dataset(data_xy,
                                  borrow=True,
@@ -730,7 +927,6 @@ class setup_dataset (object):
     Yann toolbox.
 
     Todo:
-        ``images`` option for the ``source``.
         ``skdata pascal`` isn't working
         ``imagenet`` dataset and ``coco`` needs to be setup.
 
@@ -745,6 +941,11 @@ class setup_dataset (object):
                                 'pkl' : A theano tutorial style 'pkl' file.
                                 'skdata' : Download and setup from skdata
                                 'matlab' : Data is created and is being used from Matlab
+                                'images' : A directory with one sub directory of images per
+                                           class. Images are decoded by a pool of processes
+                                           and written one batch at a time, so the tree can be
+                                           as large as the disk holds. Images are resized to
+                                           ``height`` X ``width`` in rgb, ``channels`` is 3.
                     "name" : necessary only for skdata
                               supports
                                 * ``'mnist'``
@@ -763,7 +964,7 @@ class setup_dataset (object):
                                 * ``'caltech256'``
                         Refer to original paper by Hugo Larochelle [1] for these dataset details.
 
-                    "location"                  : #necessary for 'pkl' and 'matlab'
+                    "location"                  : #necessary for 'pkl', 'matlab' and 'images'
                     "mini_batch_size"           : 500,
                     "mini_batches_per_batch"    : (100, 20, 20), # trianing, testing, validation
                     "batches2train"             : 1,
@@ -772,6 +973,13 @@ class setup_dataset (object):
                     "height"                    : 28,
                     "width"                     : 28,
                     "channels"                  : 1 ,
+                    "format"                    : 'pkl' or 'memmap', default is 'pkl'
+                    "processes"                 : processes to decode images with, default is
+                                                  the number of cpus. (caltech and images)
+                    "image_cache"               : directory to cache resized images in, so
+                                                  that rebuilding at the same size skips
+                                                  decoding. Default is None.
+                                                  (caltech and images)
 
                         }
 
@@ -795,8 +1003,8 @@ class setup_dataset (object):
 
     Notes:
 
-        Yann toolbox takes datasets in a ``.pkl`` format. The dataset requires a directory
-        structure such as the following:
+        Yann toolbox takes datasets in a ``.pkl`` format by default. The dataset requires a
+        directory structure such as the following:
 
         .. code-block:: python
 
@@ -825,6 +1033,11 @@ class setup_dataset (object):
         produced is the unique id of the dataset.
 
         The file ``data_params.pkl`` contains one variable ``dataset_args`` used by datastream.
+
+        With ``"format" : 'memmap'``, each of ``train``, ``valid`` and ``test`` instead holds one
+        contiguous ``data_x.bin`` and ``data_y.bin`` that ``datastream`` memory maps. The
+        ``index`` in ``data_params.pkl`` records where each batch begins. Use ``pkl2memmap`` to
+        convert an existing dataset.
     """
     def __init__(self,
                  dataset_init_args,
@@ -842,7 +1055,7 @@ class setup_dataset (object):
         if self.source == 'skdata':
             self.name = dataset_init_args ["name"]
 
-        elif self.source == 'matlab':
+        elif self.source == 'matlab' or self.source == 'images':
             self.location        = dataset_init_args [ "location" ]
 
         if "height" in dataset_init_args.keys():
@@ -892,6 +1105,25 @@ class setup_dataset (object):
                            self.batches2test == 1 and
                            self.batches2validate == 1 )
 
+        if "format" in dataset_init_args.keys():
+            self.format              = dataset_init_args [ "format" ]
+        else:
+            self.format = 'pkl'
+        if not self.format in ['pkl', 'memmap']:
+            raise Exception("Unknown dataset format " + str(self.format))
+        # where each batch begins in the contiguous files of the memmap format.
+        self.index = {'train': [0], 'valid': [0], 'test': [0]}
+
+        if "processes" in dataset_init_args.keys():
+            self.processes = dataset_init_args [ "processes" ]
+        else:
+            self.processes = multiprocessing.cpu_count()
+
+        if "image_cache" in dataset_init_args.keys():
+            self.image_cache = dataset_init_args [ "image_cache" ]
+        else:
+            self.image_cache = None
+
         # create some directory for storing all this data
         self.id = str(randint(11111,99999))
         self.key_root = '/_dataset_'
@@ -920,6 +1152,9 @@ class setup_dataset (object):
         if self.source == 'matlab':
             self._mat2yann( verbose = verbose )
 
+        if self.source == 'images':
+            self._create_images( verbose = verbose )
+
         end_time = time.clock()
         if verbose >=1:
             print(". Dataset " + self.id + " is created.")
@@ -944,35 +1179,24 @@ class setup_dataset (object):
                 batches = self.batches2test
             else:
                 batches = self.batches2validate
-            for batch in xrange(batches):		# for each batch_i file....
+            def load(batch):
                 if verbose >= 3:
                     print ( "... batch " +str(batch) )
-                data_x, data_y = load_data_mat(location = self.location, 
-                                                        batch = batch, 
-                                                        type_set = type,
-                                                        height = self.height,
-                                                        width = self.width,
-                                                        channels = self.channels)
-                                                        
-                data_x = preprocessing ( data_x, 
-                                        self.height,
-                                        self.width,
-                                        self.channels,
-                                        self.preprocessor )
-
-                if verbose >=3: 
-                    print ("... Dumping batch " + str(batch))
-                # compute number of minibatches for training, validation and testing
-                f = open(self.root + "/" + type + "/" + 'batch_' + str(batch) + '.pkl', 'wb')
-                obj = (data_x, data_y )
-                cPickle.dump(obj, f, protocol=2)
-                f.close()
-                if type == 'train':
-                    mppb_train = data_x.shape[0] / self.mini_batch_size
-                elif type == 'test': 
-                    mppb_test = data_x.shape[0] / self.mini_batch_size
-                else: 
-                    mppb_valid = data_x.shape[0] / self.mini_batch_size
+                return load_data_mat(location = self.location,
+                                     batch = batch,
+                                     type_set = type,
+                                     height = self.height,
+                                     width = self.width,
+                                     channels = self.channels)
+
+            data_x = self._stream_split(type, batches, load, verbose = verbose)
+            # compute number of minibatches for training, validation and testing
+            if type == 'train':
+                mppb_train = data_x.shape[0] / self.mini_batch_size
+            elif type == 'test':
+                mppb_test = data_x.shape[0] / self.mini_batch_size
+            else:
+                mppb_valid = data_x.shape[0] / self.mini_batch_size
             
         dataset_args = {
                 "location"                  : self.root,
@@ -988,6 +1212,165 @@ class setup_dataset (object):
                 }
         
         assert ( self.height * self.width * self.channels == numpy.prod(data_x.shape[1:]) )
+        self._save_params(dataset_args)
+
+    def _create_images (self, verbose = 2):
+        """
+        Interal function that creates a dataset out of a directory of images, one sub
+        directory per class. The images are shuffled once and split into training, testing and
+        validation images in that order. A pool of ``self.processes`` processes decodes and
+        resizes each batch straight into one preallocated array, which is preprocessed and
+        saved before the next batch is decoded.
+        """
+        self.channels = 3
+        paths, labels, classes = _image_folder(self.location)
+        if verbose >= 2:
+            print(".. Found " + str(len(paths)) + " images of " + str(len(classes)) + " classes")
+
+        perm = numpy.random.permutation(len(paths))
+        paths = paths[perm]
+        labels = labels[perm]
+
+        batch_sizes = { 'train' : self.mini_batches_per_batch[0] * self.mini_batch_size,
+                        'valid' : self.mini_batches_per_batch[1] * self.mini_batch_size,
+                        'test'  : self.mini_batches_per_batch[2] * self.mini_batch_size }
+        batches = { 'train' : self.batches2train,
+                    'valid' : self.batches2validate,
+                    'test'  : self.batches2test }
+        needed = sum([batch_sizes[type] * batches[type] for type in batches.keys()])
+        if needed > len(paths):
+            raise Exception("The batches need " + str(needed) + " images, but only " + \
+                                                        str(len(paths)) + " were found.")
+
+        pool = None
+        if self.processes > 1:
+            if verbose >= 3:
+                print("... Decoding images with " + str(self.processes) + " processes")
+            pool = multiprocessing.Pool(self.processes)
+
+        try:
+            push = 0
+            for type in ['train', 'test', 'valid']:
+                if verbose >= 2:
+                    print(".. Setting up " + type + " data")
+                batch_size = batch_sizes[type]
+                out = numpy.zeros((batch_size, self.height * self.width * 3), dtype = 'float32')
+
+                def load(i, start = push, batch_size = batch_size, out = out):
+                    if verbose >= 3:
+                        print("... Decoding batch " + str(i))
+                    begin = start + i * batch_size
+                    _decode_images( paths = paths[begin : begin + batch_size],
+                                    height = self.height,
+                                    width = self.width,
+                                    out = out,
+                                    pool = pool,
+                                    cache = self.image_cache )
+                    return (out, labels[begin : begin + batch_size])
+                data_x = self._stream_split(type, batches[type], load, verbose = verbose)
+                push = push + batch_size * batches[type]
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        dataset_args = {
+                "location"                  : self.root,
+                "mini_batch_size"           : self.mini_batch_size,
+                "cache_batches"             : self.mini_batches_per_batch,
+                "batches2train"             : self.batches2train,
+                "batches2test"              : self.batches2test,
+                "batches2validate"          : self.batches2validate,
+                "height"                    : self.height,
+                "width"                     : self.width,
+                "channels"                  : 1 if self.preprocessor ["grayscale"] else 3,
+                "cache"                     : self.cache,
+                "classes"                   : classes,
+                }
+        self._save_params(dataset_args)
+
+    def _save_batch (self, type, batch, data_x, data_y):
+        """
+        Saves one batch in whichever ``format`` was asked for. Batches of a split must be saved
+        in order.
+
+        Args:
+            type: ``'train'``, ``'test'`` or ``'valid'``
+            batch: batch number
+            data_x: images of the batch
+            data_y: labels of the batch
+        """
+        loc = self.root + "/" + type + "/"
+        if self.format == 'memmap':
+            samples = memmap_dataset(loc = loc, data = (data_x, data_y))
+            self.index[type].append(self.index[type][-1] + samples)
+        else:
+            pickle_dataset(loc = loc, data = (data_x, data_y), batch = batch)
+
+    def _stream_split (self, type, batches, load, scratch = True, verbose = 2):
+        """
+        Preprocesses and saves a split one batch at a time with a :mod:`stream_preprocessor`.
+        If preprocessing needs statistics of the split, a first pass over all the batches
+        collects them before any batch is saved. Only one batch is in memory at a time.
+
+        Args:
+            type: ``'train'``, ``'test'`` or ``'valid'``
+            batches: number of batches in the split
+            load: a function, ``load(batch)`` returns the raw ``(data_x, data_y)`` of a batch.
+            scratch: If ``True``, the raw batches of the first pass are kept in a scratch
+                directory until the second pass, so that ``load`` is called once per batch. Use
+                ``False`` when ``load`` is cheap.
+            verbose: Similar to verbose everywhere else.
+
+        Returns:
+            numpy ndarray: the last preprocessed batch of images.
+        """
+        preprocessor = stream_preprocessor (self.height, self.width, self.channels,
+                                            self.preprocessor)
+        first_pass = preprocessor.needs_statistics()
+        scratch = scratch and first_pass
+        if scratch is True:
+            scratch_root = self.root + "/" + type + "/_raw/"
+            os.mkdir(scratch_root)
+
+        if first_pass is True:
+            if verbose >= 3:
+                print("... Collecting preprocessing statistics of " + type + " data")
+            for batch in xrange(batches):
+                data_x, data_y = load(batch)
+                preprocessor.accumulate(data_x)
+                if scratch is True:
+                    numpy.save(scratch_root + 'x_' + str(batch) + '.npy', data_x)
+                    numpy.save(scratch_root + 'y_' + str(batch) + '.npy', data_y)
+
+        for batch in xrange(batches):
+            if scratch is True:
+                data_x = numpy.load(scratch_root + 'x_' + str(batch) + '.npy')
+                data_y = numpy.load(scratch_root + 'y_' + str(batch) + '.npy')
+                os.remove(scratch_root + 'x_' + str(batch) + '.npy')
+                os.remove(scratch_root + 'y_' + str(batch) + '.npy')
+            else:
+                data_x, data_y = load(batch)
+            data_x = check_type(preprocessor.transform(data_x), theano.config.floatX)
+            if verbose >=3:
+                print ("... Dumping batch " + str(batch))
+            self._save_batch(type, batch, data_x, data_y)
+
+        if scratch is True:
+            os.rmdir(scratch_root)
+        return data_x
+
+    def _save_params (self, dataset_args):
+        """
+        Saves ``data_params.pkl``, along with the index of the batches for the memmap format.
+
+        Args:
+            dataset_args: the ``data_params`` dictionary.
+        """
+        if self.format == 'memmap':
+            dataset_args["format"] = 'memmap'
+            dataset_args["dtype"] = theano.config.floatX
+            dataset_args["index"] = self.index
         f = open(self.root +  '/data_params.pkl', 'wb')
         cPickle.dump(dataset_args, f, protocol=2)
         f.close()
@@ -1040,11 +1423,6 @@ class setup_dataset (object):
 
         data_x, data_y, data_y1  = data[0]
 
-        data_x = preprocessing ( data = data_x,
-                                 height = self.height,
-                                 width = self.width,
-                                 channels = self.channels,
-                                 args = self.preprocessor )
         training_sample_size = data_x.shape[0]
         training_batches_available  = training_sample_size / self.mini_batch_size
 
@@ -1054,26 +1432,14 @@ class setup_dataset (object):
             else:
                 data_x = data_x[:self.batches2train * self.cache_images[0]]
                 data_y = data_y[:self.batches2train * self.cache_images[0]]
-        loc = self.root + "/train/"
-        data_x = check_type(data_x, theano.config.floatX)
-        data_y = check_type(data_y, theano.config.floatX)
-
-
-        for batch in xrange(self.batches2train):
-            start_index = batch * self.cache_images[0]
-            end_index = start_index + self.cache_images[0]
-            data2save = (data_x [start_index:end_index,], data_y[start_index:end_index,] )
-            pickle_dataset(loc = loc, data = data2save, batch=batch)
+        data_x = self._stream_split('train', self.batches2train,
+                                    _batch_slicer(data_x, data_y, self.cache_images[0]),
+                                    scratch = False, verbose = verbose)
 
         if verbose >=2:
             print(".. validation data ")
 
         data_x, data_y, data_y1  = data[1]
-        data_x = preprocessing ( data = data_x,
-                                 height = self.height,
-                                 width = self.width,
-                                 channels = self.channels,
-                                 args = self.preprocessor )
         validation_sample_size = data_x.shape[0]
         validation_batches_available = validation_sample_size / self.mini_batch_size
 
@@ -1085,24 +1451,13 @@ class setup_dataset (object):
             else:
                 data_x = data_x[:self.batches2validate * self.cache_images[1]]
                 data_y = data_y[:self.batches2validate * self.cache_images[1]]
-        loc = self.root + "/valid/"
-        data_x = check_type(data_x, theano.config.floatX)
-        data_y = check_type(data_y, theano.config.floatX)
-
-        for batch in xrange(self.batches2validate):
-            start_index = batch * self.cache_images[1]
-            end_index = start_index + self.cache_images[1]
-            data2save = (data_x [start_index:end_index,], data_y[start_index:end_index,] )
-            pickle_dataset(loc = loc, data = data2save, batch=batch)
+        data_x = self._stream_split('valid', self.batches2validate,
+                                    _batch_slicer(data_x, data_y, self.cache_images[1]),
+                                    scratch = False, verbose = verbose)
 
         if verbose >=2:
             print(".. testing data ")
         data_x, data_y, data_y1 = data[2]
-        data_x = preprocessing ( data = data_x,
-                                 height = self.height,
-                                 width = self.width,
-                                 channels = self.channels,
-                                 args = self.preprocessor )
         testing_sample_size = data_x.shape[0]
         testing_batches_available = testing_sample_size / self.mini_batch_size
 
@@ -1112,15 +1467,9 @@ class setup_dataset (object):
             else:
                 data_x = data_x[:self.batches2test * self.cache_images[2]]
                 data_y = data_y[:self.batches2test * self.cache_images[2]]
-        loc = self.root + "/test/"
-        data_x = check_type(data_x, theano.config.floatX)
-        data_y = check_type(data_y, theano.config.floatX)
-
-        for batch in xrange(self.batches2test):
-            start_index = batch * self.cache_images[2]
-            end_index = start_index + self.cache_images[2]
-            data2save = (data_x [start_index:end_index,], data_y[start_index:end_index,] )
-            pickle_dataset(loc = loc, data = data2save, batch=batch)
+        data_x = self._stream_split('test', self.batches2test,
+                                    _batch_slicer(data_x, data_y, self.cache_images[2]),
+                                    scratch = False, verbose = verbose)
 
         dataset_args = {
                 "location"                  : self.root,
@@ -1136,16 +1485,15 @@ class setup_dataset (object):
                 }
 
         assert ( self.height * self.width * self.channels == numpy.prod(data_x.shape[1:]) )
-        f = open(self.root +  '/data_params.pkl', 'wb')
-        cPickle.dump(dataset_args, f, protocol=2)
-        f.close()
+        self._save_params(dataset_args)
 
-    def _create_skdata_caltech101(self, verbose = 2):
+    def _create_skdata_caltech(self, name, total_images_in_dataset, verbose = 2):
         """
-        Interal function. Use this to create mnist and caltech101 image datasets
+        Interal function. Use this to create caltech101 and caltech256 image datasets. The
+        dataset is fetched and shuffled once, and images are decoded by a pool of
+        ``self.processes`` processes straight into one preallocated array per split.
         """
         # shuffle the data
-        total_images_in_dataset = 9144
         self.rand_perm = numpy.random.permutation(total_images_in_dataset)
         # create a constant shuffle, so that data can be loaded in batchmode with the same
         # random shuffle
@@ -1158,90 +1506,49 @@ class setup_dataset (object):
 
         if verbose >=2:
             print(".. Setting up dataset")
-            print(".. Training data")
-
-        looper = n_train_images / ( self.mini_batches_per_batch[0] * self.mini_batch_size )
-
-        for i in xrange(looper):		# for each batch_i file....
+        images = _caltech_images(name, self.rand_perm)
+        pool = None
+        if self.processes > 1:
             if verbose >= 3:
-                print("... Training batch " + str(i))
-            data_x, data_y  = load_skdata_caltech101(
-                                    n_train_images = n_train_images,
-                                    n_test_images = n_test_images,
-                                    n_valid_images = n_valid_images,
-                                    batch_size = self.mini_batches_per_batch[0] * \
-                                                        self.mini_batch_size,
-                                    rand_perm = self.rand_perm,
-                                    batch = i ,
-                                    type_set = 'train',
-                                    height = self.height,
-                                    width = self.width,
-                                    verbose = verbose )
-            data_x = preprocessing ( data_x,
-                                    self.height,
-                                    self.width,
-                                    self.channels,
-                                    self.preprocessor )
-            f = open(self.root + "/train/" + 'batch_' + str(i) + '.pkl', 'wb')
-            obj = (data_x, data_y )
-            cPickle.dump(obj, f, protocol=2)
-            f.close()
-
-        if verbose >=2:
-            print(".. Testing data")
-        looper = n_test_images / ( self.mini_batches_per_batch[1] * self.mini_batch_size )
-        for i in xrange(looper):		# for each batch_i file....
-            if verbose >= 3:
-                print("... Testing batch " + str(i))
-            data_x, data_y  = load_skdata_caltech101(
-                                    n_train_images = n_train_images,
-                                    n_test_images = n_test_images,
-                                    n_valid_images = n_valid_images,
-                                    batch_size = self.mini_batches_per_batch[1] * \
-                                                    self.mini_batch_size,
-                                    rand_perm = self.rand_perm,
-                                    batch = i ,
-                                    type_set = 'test' ,
-                                    height = self.height,
-                                    width = self.width,
-                                    verbose = verbose )
-            data_x = preprocessing ( data_x,
-                                self.height,
-                                self.width,
-                                self.channels,
-                                self.preprocessor )
-            f = open(self.root + "/test/" + 'batch_' + str(i) + '.pkl', 'wb')
-            obj = (data_x, data_y )
-            cPickle.dump(obj, f, protocol=2)
-            f.close()
-
-        if verbose >=2:
-                print(".. Validation data")
-        looper = n_valid_images / ( self.mini_batches_per_batch[2] * self.mini_batch_size )
-        for i in xrange(looper):		# for each batch_i file....
-            if verbose >= 3:
-                    print("... Validation batch " + str(i))
-            data_x, data_y  = load_skdata_caltech101(
-                                            n_train_images = n_train_images,
-                                            n_test_images = n_test_images,
-                                            n_valid_images = n_valid_images,
-                                            batch_size = self.mini_batches_per_batch[2] * \
-                                                          self.mini_batch_size,
-                                            rand_perm = self.rand_perm,
-                                            batch = i ,
-                                            type_set = 'valid' ,
-                                            height = self.height,
-                                            width = self.width,
-                                            verbose = verbose  )
-            data_x = preprocessing ( data_x,
-                                     self.height,
-                                     self.width,
-                                     self.channels,
-                                     self.preprocessor )
-            f = open(self.root + "/valid/" + 'batch_' + str(i) + '.pkl', 'wb')
-            obj = (data_x, data_y )
-            cPickle.dump(obj, f, protocol=2)
-            f.close()
+                print("... Decoding images with " + str(self.processes) + " processes")
+            pool = multiprocessing.Pool(self.processes)
+
+        try:
+            for type, n_images, cache_batch in [ ('train', n_train_images, 0),
+                                                 ('test', n_test_images, 1),
+                                                 ('valid', n_valid_images, 2) ]:
+                if verbose >=2:
+                    print(".. " + {'train': 'Training',
+                                   'test': 'Testing',
+                                   'valid': 'Validation'}[type] + " data")
+                batch_size = self.mini_batches_per_batch[cache_batch] * self.mini_batch_size
+                looper = n_images / batch_size
+                out = numpy.zeros((batch_size, self.height * self.width * 3), dtype = 'float32')
+
+                def load(i, type = type, batch_size = batch_size, out = out):
+                    if verbose >= 3:
+                        print("... " + type + " batch " + str(i))
+                    return _load_skdata_caltech(
+                                        name,
+                                        n_train_images = n_train_images,
+                                        n_test_images = n_test_images,
+                                        n_valid_images = n_valid_images,
+                                        batch_size = batch_size,
+                                        rand_perm = self.rand_perm,
+                                        batch = i ,
+                                        type_set = type,
+                                        height = self.height,
+                                        width = self.width,
+                                        images = images,
+                                        pool = pool,
+                                        image_cache = self.image_cache,
+                                        out = out,
+                                        verbose = verbose )
+                data_x = self._stream_split(type, looper, load, verbose = verbose)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
 
         assert ( self.height * self.width * self.channels == numpy.prod(data_x.shape[1:]) )
         data_args = {
@@ -1257,130 +1564,19 @@ class setup_dataset (object):
             "cache"                 : self.cache,
             }
 
-        f = open(self.root +  '/data_params.pkl', 'wb')
-        cPickle.dump(data_args, f, protocol=2)
-        f.close()
+        self._save_params(data_args)
 
-    def _create_skdata_caltech256(self, verbose = 2):
+    def _create_skdata_caltech101(self, verbose = 2):
         """
-        Interal function. Use this to create mnist and caltech101 image datasets
+        Interal function. Use this to create caltech101 image datasets
         """
-        # shuffle the data
-        total_images_in_dataset = 30607
-        self.rand_perm = numpy.random.permutation(total_images_in_dataset)
-        # create a constant shuffle, so that data can be loaded in batchmode with the same
-        # random shuffle
-
-        n_train_images = self.mini_batches_per_batch[0]*self.mini_batch_size * self.batches2train
-        n_test_images = self.mini_batches_per_batch[2]*self.mini_batch_size * self.batches2test
-        n_valid_images = self.mini_batches_per_batch[1]*self.mini_batch_size * self.batches2validate
-
-        assert n_valid_images + n_train_images + n_test_images <= total_images_in_dataset
-
-        if verbose >=2:
-            print(".. Setting up dataset")
-            print(".. Training data")
-
-        looper = n_train_images / ( self.mini_batches_per_batch[0] * self.mini_batch_size )
-
-        for i in xrange(looper):		# for each batch_i file....
-            if verbose >= 3:
-                print("... Training batch " + str(i))
-            data_x, data_y  = load_skdata_caltech256(
-                                    n_train_images = n_train_images,
-                                    n_test_images = n_test_images,
-                                    n_valid_images = n_valid_images,
-                                    batch_size = self.mini_batches_per_batch[0] * \
-                                                        self.mini_batch_size,
-                                    rand_perm = self.rand_perm,
-                                    batch = i ,
-                                    type_set = 'train',
-                                    height = self.height,
-                                    width = self.width,
-                                    verbose = verbose )
-            data_x = preprocessing ( data_x,
-                                    self.height,
-                                    self.width,
-                                    self.channels,
-                                    self.preprocessor )
-            f = open(self.root + "/train/" + 'batch_' + str(i) + '.pkl', 'wb')
-            obj = (data_x, data_y )
-            cPickle.dump(obj, f, protocol=2)
-            f.close()
-
-        if verbose >=2:
-            print(".. Testing data")
-        looper = n_test_images / ( self.mini_batches_per_batch[1] * self.mini_batch_size )
-        for i in xrange(looper):		# for each batch_i file....
-            if verbose >= 3:
-                print("... Testing batch " + str(i))
-            data_x, data_y  = load_skdata_caltech256(
-                                    n_train_images = n_train_images,
-                                    n_test_images = n_test_images,
-                                    n_valid_images = n_valid_images,
-                                    batch_size = self.mini_batches_per_batch[1] * \
-                                                    self.mini_batch_size,
-                                    rand_perm = self.rand_perm,
-                                    batch = i ,
-                                    type_set = 'test' ,
-                                    height = self.height,
-                                    width = self.width,
-                                    verbose = verbose )
-            data_x = preprocessing ( data_x,
-                                self.height,
-                                self.width,
-                                self.channels,
-                                self.preprocessor )
-            f = open(self.root + "/test/" + 'batch_' + str(i) + '.pkl', 'wb')
-            obj = (data_x, data_y )
-            cPickle.dump(obj, f, protocol=2)
-            f.close()
-
-        if verbose >=2:
-                print(".. Validation data")
-        looper = n_valid_images / ( self.mini_batches_per_batch[2] * self.mini_batch_size )
-        for i in xrange(looper):		# for each batch_i file....
-            if verbose >= 3:
-                    print("... Validation batch " + str(i))
-            data_x, data_y  = load_skdata_caltech256(
-                                            n_train_images = n_train_images,
-                                            n_test_images = n_test_images,
-                                            n_valid_images = n_valid_images,
-                                            batch_size = self.mini_batches_per_batch[2] * \
-                                                          self.mini_batch_size,
-                                            rand_perm = self.rand_perm,
-                                            batch = i ,
-                                            type_set = 'valid' ,
-                                            height = self.height,
-                                            width = self.width,
-                                            verbose = verbose  )
-            data_x = preprocessing ( data_x,
-                                     self.height,
-                                     self.width,
-                                     self.channels,
-                                     self.preprocessor )
-            f = open(self.root + "/valid/" + 'batch_' + str(i) + '.pkl', 'wb')
-            obj = (data_x, data_y )
-            cPickle.dump(obj, f, protocol=2)
-            f.close()
-
-        assert ( self.height * self.width * self.channels == numpy.prod(data_x.shape[1:]) )
-        data_args = {
-            "location"                  : self.root,
-            "mini_batch_size"           : self.mini_batch_size,
-            "cache_batches"             : self.mini_batches_per_batch,
-            "batches2train"             : self.batches2train,
-            "batches2test"              : self.batches2test,
-            "batches2validate"          : self.batches2validate,
-            "height"                    : self.height,
-            "width"                     : self.width,
-            "channels"              : 1 if self.preprocessor ["grayscale"] else self.channels,
-            "cache"                 : self.cache,
-            }
+        self._create_skdata_caltech('caltech101', 9144, verbose = verbose)
 
-        f = open(self.root +  '/data_params.pkl', 'wb')
-        cPickle.dump(data_args, f, protocol=2)
-        f.close()
+    def _create_skdata_caltech256(self, verbose = 2):
+        """
+        Interal function. Use this to create caltech256 image datasets
+        """
+        self._create_skdata_caltech('caltech256', 30607, verbose = verbose)
 
 if __name__ == '__main__':
     pass
@@ -0,0 +1,308 @@
+"""
+This module freezes the inference path of a cooked classifier network into one file, and loads
+it back without the datastream, the optimizer or the training streams of the network.
+
+``export`` walks back from the classifier through ``network.inference_layers`` and writes down
+the arguments needed to rebuild each layer along with its parameters, including the running
+statistics of batch norm. ``load`` rebuilds only those layers with a symbolic mini batch
+dimension and compiles one forward function.
+
+The file is an uncompressed ``.npz``. The topology is stored as ``json`` in it, so nothing is
+pickled. ``theano`` is only imported when a file is loaded here, so that the
+:mod:`numpy_engine` can read the same files without it.
+"""
+import json
+from collections import OrderedDict
+
+import numpy
+from yann.utils.serving import serve
+
+def _tuples (value):
+    """
+    Internal function that turns the lists ``json`` made out of tuples back into tuples.
+    """
+    if isinstance(value, list):
+        return tuple([_tuples(item) for item in value])
+    if isinstance(value, unicode):
+        return str(value)
+    return value
+
+def _ancestors (net, id):
+    """
+    Internal function that returns the ids of ``id`` and all the layers it takes input from, in
+    an order where every layer comes after its origins.
+    """
+    order = []
+    def visit (lyr):
+        if lyr in order:
+            return
+        if not lyr in net.inference_layers.keys():   # a datastream
+            return
+        for origin in net.inference_layers[lyr].origin:
+            visit(origin)
+        order.append(lyr)
+    visit(id)
+    return order
+
+def _describe (layer, input_shapes):
+    """
+    Internal function that returns the arguments needed to rebuild an inference layer.
+    """
+    description = OrderedDict()
+    description['id'] = layer.id
+    description['type'] = layer.type
+    if layer.type == 'input':
+        description['height'] = layer.output_shape[2]
+        description['width'] = layer.output_shape[3]
+        description['channels'] = layer.output_shape[1]
+        description['mean_subtract'] = layer.mean_subtract
+        return description
+
+    description['origin'] = list(layer.origin)
+    description['input_shape'] = input_shapes[0]
+    if layer.type == 'conv_pool':
+        description['nkerns'] = layer.nkerns
+        description['filter_shape'] = layer.filter_shape
+        description['poolsize'] = layer.poolsize
+        description['pooltype'] = layer.pooltype
+        description['batch_norm'] = layer.batch_norm
+        description['border_mode'] = layer.border_mode
+        description['stride'] = layer.stride
+        description['activation'] = layer.activation
+    elif layer.type == 'dot_product':
+        description['num_neurons'] = layer.num_neurons
+        description['batch_norm'] = layer.batch_norm
+        description['activation'] = layer.activation
+    elif layer.type == 'classifier':
+        description['num_classes'] = layer.num_neurons
+        description['activation'] = layer.activation
+    elif layer.type == 'unflatten':
+        description['shape'] = layer.shape
+    elif layer.type == 'merge' and layer.merge_type in ('sum', 'concatenate'):
+        description['input_shape'] = input_shapes
+        description['merge_type'] = layer.merge_type
+    elif not layer.type == 'flatten':
+        raise Exception ("Layer " + layer.id + " of type " + layer.type + \
+                                                                    " can not be exported.")
+    return description
+
+def export (net, filename, classifier = None, verbose = 2):
+    """
+    Writes the inference path of a cooked classifier network to ``filename``.
+
+    Args:
+        net: A cooked yann network.
+        filename: name of the file to write. Convention is to end it with ``.npz``.
+        classifier: id of the classifier layer to export. Default is the one the network was
+                    cooked with.
+        verbose: Similar to the rest of the toolbox.
+    """
+    if classifier is None:
+        if not getattr(net, 'network_type', None) == 'classifier':
+            raise Exception ("Only cooked classifier networks can be exported")
+        classifier = net.cooked_classifier
+
+    if verbose >= 2:
+        print(".. Exporting the inference path of " + classifier + " to " + filename)
+
+    topology = []
+    arrays = {}
+    for lyr in _ancestors(net, classifier):
+        layer = net.inference_layers[lyr]
+        input_shapes = [list(net.inference_layers[origin].output_shape)
+                                    for origin in layer.origin if origin in net.inference_layers]
+        description = _describe(layer, input_shapes)
+        params = layer.get_params() if layer.params is not None else []
+        description['params'] = len(params)
+        for count, param in enumerate(params):
+            arrays['param_' + lyr + '_' + str(count)] = param
+        topology.append(description)
+        if verbose >= 3:
+            print("... Exported layer " + lyr + " of type " + layer.type)
+
+    arrays['topology'] = numpy.array(json.dumps({ 'classifier' : classifier,
+                                                  'chunk_size' : net.mini_batch_size * \
+                                                                 net.mini_batches_per_batch[0],
+                                                  'layers' : topology }))
+    f = open(filename, 'wb')
+    numpy.savez(f, **arrays)
+    f.close()
+
+class frozen_network (object):
+    """
+    The inference path of a network loaded from a file written by ``export``. Only the forward
+    function is compiled.
+
+    Args:
+        filename: file written by ``export``.
+        borrow: Check ``theano's`` borrow. Default is ``True``.
+        verbose: Similar to the rest of the toolbox.
+
+    Notes:
+        Use ``frozen_network.predict`` and ``frozen_network.posterior`` just like the methods of
+        the same name of a cooked network. ``frozen_network.layers`` has the rebuilt layers.
+    """
+    def __init__ (self, filename, borrow = True, verbose = 2):
+        import theano
+        import theano.tensor as T
+        from yann.layers.input import input_layer
+        from yann.layers.conv_pool import conv_pool_layer_2d
+        from yann.layers.fully_connected import dot_product_layer
+        from yann.layers.output import classifier_layer
+        from yann.layers.flatten import flatten_layer, unflatten_layer
+        from yann.layers.merge import merge_layer
+
+        if verbose >= 2:
+            print(".. Loading the frozen network " + filename)
+
+        archive = numpy.load(filename)
+        description = json.loads(str(archive['topology']))
+        self.classifier = str(description['classifier'])
+        self.chunk_size = description['chunk_size']
+        self.x = T.matrix('x')
+        self.layers = OrderedDict()
+
+        for options in description['layers']:
+            options = dict([(str(key), _tuples(value)) for key, value in options.items()])
+            id = options['id']
+            params = [ theano.shared(value = archive['param_' + id + '_' + str(count)],
+                                     borrow = borrow)
+                                                        for count in xrange(options['params'])]
+            if len(params) == 0:
+                params = None
+            if verbose >= 3:
+                print("... Rebuilding layer " + id + " of type " + options['type'])
+
+            if options['type'] == 'input':
+                self.height = options['height']
+                self.width = options['width']
+                self.channels = options['channels']
+                self.layers[id] = input_layer ( mini_batch_size = None,
+                                                x = self.x,
+                                                id = id,
+                                                height = self.height,
+                                                width = self.width,
+                                                channels = self.channels,
+                                                mean_subtract = options['mean_subtract'],
+                                                verbose = verbose )
+                continue
+
+            inputs = [self.layers[origin].inference for origin in options['origin']]
+            if options['type'] == 'conv_pool':
+                self.layers[id] = conv_pool_layer_2d ( input = inputs[0],
+                                                       nkerns = options['nkerns'],
+                                                       input_shape = options['input_shape'],
+                                                       id = id,
+                                                       filter_shape = options['filter_shape'],
+                                                       poolsize = options['poolsize'],
+                                                       pooltype = options['pooltype'],
+                                                       batch_norm = options['batch_norm'],
+                                                       border_mode = options['border_mode'],
+                                                       stride = options['stride'],
+                                                       borrow = borrow,
+                                                       activation = options['activation'],
+                                                       input_params = params,
+                                                       verbose = verbose )
+            elif options['type'] == 'dot_product':
+                self.layers[id] = dot_product_layer ( input = inputs[0],
+                                                      num_neurons = options['num_neurons'],
+                                                      input_shape = options['input_shape'],
+                                                      id = id,
+                                                      input_params = params,
+                                                      borrow = borrow,
+                                                      activation = options['activation'],
+                                                      batch_norm = options['batch_norm'],
+                                                      verbose = verbose )
+            elif options['type'] == 'classifier':
+                self.layers[id] = classifier_layer ( input = inputs[0],
+                                                     input_shape = options['input_shape'],
+                                                     id = id,
+                                                     num_classes = options['num_classes'],
+                                                     input_params = params,
+                                                     borrow = borrow,
+                                                     activation = options['activation'],
+                                                     verbose = verbose )
+            elif options['type'] == 'flatten':
+                self.layers[id] = flatten_layer ( input = inputs[0],
+                                                  input_shape = options['input_shape'],
+                                                  id = id )
+            elif options['type'] == 'unflatten':
+                self.layers[id] = unflatten_layer ( input = inputs[0],
+                                                    shape = options['shape'],
+                                                    input_shape = options['input_shape'],
+                                                    id = id )
+            elif options['type'] == 'merge':
+                self.layers[id] = merge_layer ( x = inputs,
+                                                input_shape = options['input_shape'],
+                                                id = id,
+                                                type = options['merge_type'],
+                                                verbose = verbose )
+            else:
+                raise Exception ("Layer type " + options['type'] + " can not be loaded.")
+            self.layers[id].origin = list(options['origin'])
+        archive.close()
+
+        _layer = self.layers[self.classifier]
+        if verbose >= 3:
+            print("... Compiling the forward function")
+        self.serving_function = theano.function ( inputs = [self.x],
+                                                  outputs = [ _layer.predictions,
+                                                              _layer.probabilities ],
+                                                  name = 'serve' )
+
+    def _serve (self, data, chunk_size = None, verbose = 2):
+        """
+        Internal function that runs the forward function over ``data`` a chunk at a time.
+        """
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+        return serve ( forward = self.serving_function,
+                       data = data,
+                       features = self.height * self.width * self.channels,
+                       chunk_size = chunk_size,
+                       dtype = self.x.dtype,
+                       verbose = verbose )
+
+    def predict (self, data, chunk_size = None, verbose = 2):
+        """
+        Predicts the classes of any number of samples.
+
+        Args:
+            data: numpy array of samples. Either one vectorized image per row like in the
+                  datastream, or images of shape ``(samples, height, width, channels)``.
+            chunk_size: number of samples run through the network at once. Default is the
+                  number of samples in a cached batch of the network that was exported.
+            verbose: as always
+
+        Returns:
+            numpy.ndarray: predicted class of each sample.
+        """
+        return self._serve(data, chunk_size = chunk_size, verbose = verbose)[0]
+
+    def posterior (self, data, chunk_size = None, verbose = 2):
+        """
+        Same as ``predict``, but returns the classifier's ``probabilities`` of each sample.
+
+        Args:
+            data: numpy array of samples.
+            chunk_size: number of samples run through the network at once.
+            verbose: as always
+
+        Returns:
+            numpy.ndarray: probabilities of each sample, one row per sample.
+        """
+        return self._serve(data, chunk_size = chunk_size, verbose = verbose)[1]
+
+def load (filename, borrow = True, verbose = 2):
+    """
+    Loads a network written by ``export``.
+
+    Args:
+        filename: file written by ``export``.
+        borrow: Check ``theano's`` borrow. Default is ``True``.
+        verbose: Similar to the rest of the toolbox.
+
+    Returns:
+        frozen_network: ready to ``predict``.
+    """
+    return frozen_network(filename, borrow = borrow, verbose = verbose)
@@ -0,0 +1,326 @@
+"""
+This module provides a cache of compiled theano functions. Cooking a network builds the same
+graphs and compiles the same functions every time. When a network of an identical architecture
+is cooked again, the function compiled the first time is copied with the shared variables of
+the new network swapped in, which skips the optimization of the graph.
+
+The cache is kept in memory for the life of the process, up to ``memory_limit`` functions, the
+least recently used of which are forgotten first. The copies kept in memory use placeholder
+shared variables, so the cache never keeps the parameters of a network alive. If a ``root`` directory is provided,
+compiled functions are also pickled there so that they can be reused after a restart. Loading a
+pickled function still skips the graph optimization, but theano may have to link or rebuild some
+of its C modules, so a cache on disk saves less time than the one in memory.
+"""
+import os
+import hashlib
+import cPickle
+from collections import OrderedDict
+
+import numpy
+import theano
+from theano.compile import SharedVariable
+from theano.compile.function_module import FunctionMaker
+from theano.gof.destroyhandler import DestroyHandler
+from theano.tensor import TensorConstant
+from theano.gof.graph import inputs as graph_inputs
+from theano.gof.graph import ancestors
+
+# Functions compiled in this process, least recently used first. Shared by all caches.
+_memory = OrderedDict()
+# Most number of functions kept in memory.
+memory_limit = 64
+
+def _recall (key):
+    """
+    Internal function that returns the function cached in memory under ``key`` and marks it as
+    the most recently used, ``None`` if there is none.
+    """
+    entry = _memory.pop(key, None)
+    if entry is not None:
+        _memory[key] = entry
+    return entry
+
+def _remember (key, entry):
+    """
+    Internal function that caches a function in memory, forgetting the least recently used ones
+    beyond ``memory_limit``.
+    """
+    _memory.pop(key, None)
+    _memory[key] = entry
+    while len(_memory) > memory_limit:
+        _memory.popitem(last = False)
+
+def _pairs (mapping):
+    """
+    Internal function that returns the ``(variable, expression)`` pairs of ``givens`` or
+    ``updates`` in a deterministic order. Lists and ``OrderedDict`` keep their order, plain
+    dictionaries are sorted by the printed structure of each pair.
+    """
+    if mapping is None:
+        return []
+    if isinstance(mapping, OrderedDict):
+        return list(mapping.items())
+    if isinstance(mapping, dict):
+        keyed = []
+        for key, value in mapping.items():
+            text = theano.printing.debugprint([key, value], file = 'str', ids = 'int',
+                                                                        print_type = True)
+            keyed.append((text, key, value))
+        keyed.sort(key = lambda item: item[0])
+        return [(key, value) for text, key, value in keyed]
+    return list(mapping)
+
+def _shared_variables (variables):
+    """
+    Internal function that returns the shared variables that ``variables`` depend on, in the
+    order they are first seen.
+    """
+    shared = []
+    seen = set()
+    for variable in graph_inputs(variables):
+        if isinstance(variable, SharedVariable) and not variable in seen:
+            seen.add(variable)
+            shared.append(variable)
+    return shared
+
+def _constants (variables):
+    """
+    Internal function that describes the values of all the tensor constants that ``variables``
+    depend on. ``debugprint`` shortens large constants, so their values are hashed instead.
+    """
+    description = []
+    for variable in ancestors(variables):
+        if isinstance(variable, TensorConstant):
+            value = numpy.ascontiguousarray(variable.data)
+            description.append(str(value.dtype) + str(value.shape) +
+                               hashlib.sha1(value.tostring()).hexdigest())
+    return description
+
+def fingerprint (inputs, outputs = None, updates = None, givens = None, **kwargs):
+    """
+    Creates a key that is the same for two calls of ``theano.function`` on graphs of the same
+    structure, types and shapes, even when the variables themselves are different. Along with
+    the key, the shared variables of the graph are returned in an order that is the same for
+    all such graphs.
+
+    Args:
+        Same as ``theano.function``.
+
+    Returns:
+        tuple: ``(key, shared_variables)``
+    """
+    if outputs is None:
+        outputs = []
+    elif not isinstance(outputs, (list, tuple)):
+        outputs = [outputs]
+    else:
+        outputs = list(outputs)
+
+    variables = list(outputs)
+    for pairs in [_pairs(updates), _pairs(givens)]:
+        for key, value in pairs:
+            variables.extend([key, value])
+
+    shared_variables = _shared_variables(variables)
+    for variable in shared_variables:
+        if getattr(variable, 'default_update', None) is not None:
+            for extra in _shared_variables([variable.default_update]):
+                if not extra in shared_variables:
+                    shared_variables.append(extra)
+
+    description = [ theano.__version__,
+                    theano.config.floatX,
+                    theano.config.device,
+                    str(theano.config.mode),
+                    theano.config.optimizer,
+                    theano.config.cxx,
+                    str(sorted(kwargs.items())),
+                    str([(str(variable.type), variable.name) for variable in inputs]),
+                    str(len(outputs)),
+                    theano.printing.debugprint(variables, file = 'str', ids = 'int',
+                                                                        print_type = True) ]
+    description.extend(_constants(variables))
+    for variable in shared_variables:
+        value = variable.get_value(borrow = True)
+        description.append(str(variable.type) + str(getattr(value, 'shape', None)))
+    key = hashlib.sha1('\n'.join(description)).hexdigest()
+    return key, shared_variables
+
+def _dummy (variable):
+    """
+    Internal function that returns the smallest value a shared tensor variable can hold, so
+    that pickled functions don't carry the values of parameters along.
+    """
+    shape = tuple([1 if broadcastable else 0 for broadcastable in variable.broadcastable])
+    return numpy.zeros(shape, dtype = variable.dtype)
+
+class _function_maker (FunctionMaker):
+    """
+    Internal ``FunctionMaker`` of the functions in the cache. ``Function.copy`` copies the
+    optimized graph without its ``DestroyHandler``, and without it the inplace operations of the
+    copy may run before the ones that still read their inputs. The maker of a copy is of the
+    same class as the original's, so this one puts the handler back. It also forgets the
+    history of the swap, which would otherwise keep the swapped out variables alive.
+    """
+    def __init__ (self, inputs, outputs, fgraph = None, **kwargs):
+        if fgraph is not None:
+            if not any([isinstance(feature, DestroyHandler) for feature in fgraph._features]):
+                fgraph.attach_feature(DestroyHandler())
+            if hasattr(fgraph, 'checkpoint'):
+                fgraph.checkpoint()
+        super(_function_maker, self).__init__(inputs, outputs, fgraph = fgraph, **kwargs)
+
+class function_cache(object):
+    """
+    A drop-in replacement for ``theano.function`` that reuses compiled functions.
+
+    Args:
+        root: directory to pickle the compiled functions in. If ``None``, functions are cached
+              only in memory.
+        verbose: Similar to the rest of the toolbox.
+
+    Notes:
+        Use ``function_cache.function`` exactly like ``theano.function``. The functions
+        returned on a hit are copies that use the shared variables of the new graph, so two
+        networks never share state through the cache.
+    """
+    def __init__ (self, root = None, verbose = 2):
+        self.root = root
+        self.verbose = verbose
+        self.hits = 0
+        self.misses = 0
+        if root is not None and not os.path.exists(root):
+            if verbose >= 3:
+                print("... Creating the function cache directory " + root)
+            os.makedirs(root)
+
+    def _swap (self, entry, shared_variables, name, profile):
+        """
+        Internal function that copies a cached function onto new shared variables.
+        """
+        compiled, positions = entry
+        compiled.maker.__class__ = _function_maker
+        swap = {}
+        for position, variable in zip(positions, shared_variables):
+            if position is not None:
+                swap[compiled.maker.inputs[position].variable] = variable
+        copied = compiled.copy(swap = swap, name = name, profile = profile)
+        # copy always returns a list of outputs, return them the way the original did. The maker
+        # remembers it too, for the copies that are pickled.
+        copied.unpack_single = copied.maker.unpack_single = compiled.unpack_single
+        copied.return_none = copied.maker.return_none = compiled.return_none
+        return copied
+
+    def _detach (self, entry, shared_variables):
+        """
+        Internal function that copies a compiled function onto placeholder shared variables
+        that hold the smallest possible values, so that the copy cached in memory doesn't keep
+        the parameters of the network it was compiled for.
+        """
+        placeholders = []
+        for variable in shared_variables:
+            if hasattr(variable, 'broadcastable'):
+                placeholders.append(theano.shared( value = _dummy(variable),
+                                                   name = variable.name,
+                                                   broadcastable = variable.broadcastable ))
+            else:
+                placeholders.append(variable)
+        return (self._swap(entry, placeholders, entry[0].name, None), entry[1])
+
+    def _load (self, key):
+        """
+        Internal function that loads a pickled function, ``None`` if not possible.
+        """
+        if self.root is None:
+            return None
+        filename = self.root + '/' + key + '.pkl'
+        if not os.path.isfile(filename):
+            return None
+        try:
+            f = open(filename, 'rb')
+            entry = cPickle.load(f)
+            f.close()
+        except Exception:
+            if self.verbose >= 2:
+                print(".. Could not load the cached function " + filename + ", recompiling.")
+            return None
+        return entry
+
+    def _save (self, key, entry):
+        """
+        Internal function that pickles a compiled function without the values of its shared
+        variables.
+        """
+        compiled = entry[0]
+        values = []
+        for item in compiled.maker.inputs:
+            variable = item.variable
+            if isinstance(variable, SharedVariable) and hasattr(variable, 'broadcastable'):
+                values.append((variable, variable.get_value(borrow = True)))
+                variable.set_value(_dummy(variable), borrow = True)
+        filename = self.root + '/' + key + '.pkl'
+        try:
+            f = open(filename + '.tmp', 'wb')
+            cPickle.dump(entry, f, protocol = cPickle.HIGHEST_PROTOCOL)
+            f.close()
+            os.rename(filename + '.tmp', filename)
+        except Exception:
+            if self.verbose >= 2:
+                print(".. Could not pickle the function " + str(compiled.name) +
+                                                                        ", it is not cached.")
+        finally:
+            for variable, value in values:
+                variable.set_value(value, borrow = True)
+
+    def function (self, inputs, outputs = None, updates = None, givens = None, name = None,
+                  profile = None, **kwargs):
+        """
+        Returns a compiled function, just like ``theano.function``.
+        """
+        key, shared_variables = fingerprint( inputs = inputs,
+                                             outputs = outputs,
+                                             updates = updates,
+                                             givens = givens,
+                                             name = name,
+                                             profile = profile,
+                                             **kwargs )
+        entry = _recall(key)
+        if entry is None:
+            entry = self._load(key)
+            if entry is not None:
+                _remember(key, entry)
+
+        if entry is not None:
+            if self.verbose >= 3:
+                print("... Reusing compiled function " + str(name))
+            self.hits = self.hits + 1
+            return self._swap(entry, shared_variables, name, profile)
+
+        if self.verbose >= 3:
+            print("... Compiling function " + str(name))
+        self.misses = self.misses + 1
+        compiled = theano.function( inputs = inputs,
+                                    outputs = outputs,
+                                    updates = updates,
+                                    givens = givens,
+                                    name = name,
+                                    profile = profile,
+                                    **kwargs )
+        compiled_inputs = [item.variable for item in compiled.maker.inputs]
+        positions = []
+        for variable in shared_variables:
+            if variable in compiled_inputs:
+                positions.append(compiled_inputs.index(variable))
+            else:
+                positions.append(None)
+        for variable in compiled_inputs:
+            if isinstance(variable, SharedVariable) and not variable in shared_variables:
+                # A copy would share this variable with the graph it was compiled for.
+                if self.verbose >= 3:
+                    print("... Function " + str(name) + " can not be cached")
+                return compiled
+        entry = self._detach((compiled, positions), shared_variables)
+        _remember(key, entry)
+        if self.root is not None:
+            self._save(key, entry)
+        return compiled
@@ -79,58 +79,163 @@ def preprocessing( data, height, width, channels, args):
     Returns:
         numpy ndarray: data
 
+    Notes:
+        This is a one-chunk use of :mod:`stream_preprocessor`. Use that directly when the data
+        doesn't fit in memory.
     """
-    normalize       = args [ "normalize" ]
-    ZCA             = args [ "ZCA" ]
-    gray            = args [ "grayscale" ]
-    zero_mean       = args [ "zero_mean" ]
-
-    # Assume that the data is already resized on height and width and all ...
-    if len(data.shape) == 2 and channels > 1:
-        data = numpy.reshape ( data, (data.shape[0], height, width, channels))
-    elif len(data.shape) == 2:
-        data = numpy.reshape ( data, (data.shape[0], height, width))
-    shp = data.shape
-
-    out_shp_flag = False
-    if gray is True and len(shp) == 4 and out_shp_flag is False:
-        temp_data = numpy.zeros(shp)
-        data = rgb2gray(data)
-        out_shp = (shp[0], shp[1]*shp[2])
-
-    if len(shp) == 2 and out_shp_flag is False:
-        out_shp = shp
-
-    if gray is False and len(shp) == 4 and out_shp_flag is False:
-        out_shp = (shp[0], shp[1]*shp[2]*shp[3])
-
-    if len(shp) == 3 and out_shp_flag is False:
-        out_shp = (shp[0], shp[1]*shp[2])
-
-    # from here on data is processed as a 2D matrix
-    data = numpy.reshape(data,out_shp)
-
-    if normalize is True or ZCA is True:
-        data = data / (data.max() + 1e-7)
-
-    if normalize is True and zero_mean is True:
-        data = ( data - 0.5 ) * 2
-    elif normalize is False and zero_mean is True:
-        data = (data - data.mean())
-
-    if ZCA is True:
-
-        sigma = numpy.dot(data.T,data) / data.shape[1]
-        if scipy_installed is False:
-            raise Exception("Scipy needs to be installed for performing ZCA")
-        U, S, V = linalg.svd(sigma)
-        # data_rotated = numpy.dot(U.T, data) , full_matrices = True
-        temp = numpy.dot(U, numpy.diag(1/numpy.sqrt(S + 1e-7)))
-        temp = numpy.dot(temp, U.T)
-        data = numpy.dot(data, temp)
-
-    # if GCN is True :
-    return data
+    preprocessor = stream_preprocessor (height, width, channels, args)
+    data = preprocessor._flatten(data)
+    preprocessor._accumulate(data)
+    return preprocessor._apply(data)
+
+class stream_preprocessor(object):
+    """
+    A two-pass version of :mod:`preprocessing` for data that comes in chunks. The first pass
+    calls ``accumulate`` on every chunk and collects the global max, the mean and, for ZCA,
+    the second moments of the data. The second pass calls ``transform`` on every chunk. The
+    result is the same as ``preprocessing`` on all the chunks stacked together, but only a chunk
+    is ever held in memory.
+
+    Args:
+        height: integer
+        width: integer
+        channels: integer (1 for grayscale and 3 for rgb)
+        args: preprocessing arguments, same as for :mod:`preprocessing`.
+
+    Notes:
+        ZCA still needs a ``features x features`` matrix, which is independent of the number of
+        images but is large for large images.
+    """
+    def __init__(self, height, width, channels, args):
+        self.height         = height
+        self.width          = width
+        self.channels       = channels
+        self.normalize      = args [ "normalize" ]
+        self.ZCA            = args [ "ZCA" ]
+        self.gray           = args [ "grayscale" ]
+        self.zero_mean      = args [ "zero_mean" ]
+
+        self.max = None
+        self.sum = 0.
+        self.samples = 0
+        self.column_sum = None
+        self.gram = None
+        self.scale = None
+
+    def needs_statistics(self):
+        """
+        Returns:
+            bool: ``False`` if ``transform`` can be used without a first pass.
+        """
+        return self.normalize or self.ZCA or self.zero_mean
+
+    def _flatten(self, data):
+        """
+        Reshapes a chunk into a 2D matrix of ``<number of images, features>``, converting to
+        grayscale on the way if needed.
+        """
+        # Assume that the data is already resized on height and width and all ...
+        if len(data.shape) == 2 and self.channels > 1:
+            data = numpy.reshape ( data, (data.shape[0], self.height, self.width, self.channels))
+        elif len(data.shape) == 2:
+            data = numpy.reshape ( data, (data.shape[0], self.height, self.width))
+
+        if self.gray is True and len(data.shape) == 4:
+            data = rgb2gray(data)
+        # from here on data is processed as a 2D matrix
+        return numpy.reshape(data, (data.shape[0], numpy.prod(data.shape[1:])))
+
+    def _accumulate(self, data):
+        """
+        ``accumulate`` for a chunk that is already flattened.
+        """
+        chunk_max = data.max()
+        if self.max is None or chunk_max > self.max:
+            self.max = chunk_max
+        self.sum = self.sum + data.sum(dtype = 'float64')
+        self.samples = self.samples + data.shape[0]
+        self.features = data.shape[1]
+
+        if self.ZCA is True:
+            data = numpy.asarray(data, dtype = 'float64')
+            if self.gram is None:
+                self.column_sum = numpy.zeros((data.shape[1],))
+                self.gram = numpy.zeros((data.shape[1], data.shape[1]))
+            self.column_sum += data.sum(axis = 0)
+            self.gram += numpy.dot(data.T, data)
+        self.scale = None
+
+    def accumulate(self, data):
+        """
+        First pass. Collects the statistics of one chunk.
+
+        Args:
+            data: a chunk of images, shaped as in :mod:`preprocessing`.
+        """
+        self._accumulate(self._flatten(data))
+
+    def _finalize(self):
+        """
+        Works out the affine ``data * scale + shift`` that normalize and zero_mean amount to and
+        the ZCA matrix, from the statistics of the first pass.
+        """
+        if self.needs_statistics() and self.max is None:
+            raise Exception("Preprocessing needs a pass of accumulate before transform")
+
+        scale = 1.
+        shift = 0.
+        if self.normalize is True or self.ZCA is True:
+            scale = 1. / (self.max + 1e-7)
+
+        if self.normalize is True and self.zero_mean is True:
+            scale = scale * 2
+            shift = -1.
+        elif self.normalize is False and self.zero_mean is True:
+            shift = - scale * self.sum / (self.samples * self.features)
+
+        self.whiten = None
+        if self.ZCA is True:
+            # second moments of data * scale + shift, from the moments of data.
+            sigma = scale * scale * self.gram
+            sigma += scale * shift * (self.column_sum[:, numpy.newaxis] +
+                                      self.column_sum[numpy.newaxis, :])
+            sigma += shift * shift * self.samples
+            sigma = sigma / self.features
+            U, S, V = numpy.linalg.svd(sigma)
+            # data_rotated = numpy.dot(U.T, data) , full_matrices = True
+            temp = numpy.dot(U, numpy.diag(1/numpy.sqrt(S + 1e-7)))
+            self.whiten = numpy.dot(temp, U.T)
+
+        self.scale = scale
+        self.shift = shift
+
+    def _apply(self, data):
+        """
+        ``transform`` for a chunk that is already flattened.
+        """
+        if self.scale is None:
+            self._finalize()
+
+        if not self.scale == 1.:
+            data = data * self.scale
+        if not self.shift == 0.:
+            data = data + self.shift
+        if self.whiten is not None:
+            data = numpy.dot(data, self.whiten)
+        # if GCN is True :
+        return data
+
+    def transform(self, data):
+        """
+        Second pass. Preprocesses one chunk.
+
+        Args:
+            data: a chunk of images, shaped as in :mod:`preprocessing`.
+
+        Returns:
+            numpy ndarray: preprocessed chunk as a 2D matrix.
+        """
+        return self._apply(self._flatten(data))
 
 def check_type(data, type):
     """
@@ -0,0 +1,195 @@
+"""
+This module keeps histories of values recorded during training, such as the cost of every mini
+batch. The values are kept in a preallocated ``numpy`` array that doubles when it is full, so
+recording a value costs the same no matter how long training has run. The running sum of the
+values is kept alongside, so that the mean of the last ``n`` values, such as those of the last
+epoch, is one subtraction away.
+
+A history can be limited to a number of values in memory. Once it is full, the older half of
+the values are appended to a ``spill`` file if there is one and dropped from memory.
+"""
+import numpy
+
+class metric(object):
+    """
+    History of a value. This behaves like a list of the values for ``len``, indexing, slicing and
+    iteration. Slices are ``numpy`` arrays.
+
+    Args:
+        size: number of values to allocate for in the beginning. Default is ``1024``.
+        dtype: ``dtype`` of the values. Default is ``float64``.
+        limit: most number of values held in memory. Default is ``None``, no limit.
+        spill: file to append the values dropped from memory to, as raw values of ``dtype``
+            that can be read back with ``numpy.fromfile``. Default is ``None``, the dropped
+            values are forgotten.
+
+    Notes:
+        Use ``metric.mean(last = n)`` for the mean of the last ``n`` values. It is computed from
+        the running sum, as long as the ``n`` values are all in memory.
+    """
+    def __init__ (self, size = 1024, dtype = 'float64', limit = None, spill = None):
+        if limit is not None:
+            size = min(size, limit)
+        self.limit = limit
+        self.spill = spill
+        self.values = numpy.zeros((max(size, 2),), dtype = dtype)
+        # sums[i] is the sum of all the values before values[i], including the dropped ones.
+        self.sums = numpy.zeros((self.values.shape[0] + 1,), dtype = 'float64')
+        self.count = 0      # values in memory
+        self.dropped = 0    # values no longer in memory
+
+    def _grow (self):
+        """
+        Internal function that makes room for more values, either by doubling the arrays or, if
+        the limit is reached, by dropping the older half of the values.
+        """
+        capacity = self.values.shape[0]
+        if self.limit is not None and capacity >= self.limit:
+            self._drop(capacity // 2)
+            return
+        capacity = capacity * 2
+        if self.limit is not None:
+            capacity = min(capacity, self.limit)
+        values = numpy.zeros((capacity,), dtype = self.values.dtype)
+        values[:self.count] = self.values[:self.count]
+        sums = numpy.zeros((capacity + 1,), dtype = 'float64')
+        sums[:self.count + 1] = self.sums[:self.count + 1]
+        self.values = values
+        self.sums = sums
+
+    def _drop (self, count):
+        """
+        Internal function that drops the oldest ``count`` values from memory, into the spill
+        file if there is one. Returns the dropped values.
+        """
+        dropped = self.values[:count].copy()
+        if self.spill is not None:
+            f = open(self.spill, 'ab')
+            dropped.tofile(f)
+            f.close()
+        remaining = self.count - count
+        self.values[:remaining] = self.values[count:self.count]
+        self.sums[:remaining + 1] = self.sums[count:self.count + 1]
+        self.count = remaining
+        self.dropped = self.dropped + count
+        return dropped
+
+    def append (self, value):
+        """
+        Records one value.
+
+        Args:
+            value: the value.
+        """
+        if self.count == self.values.shape[0]:
+            self._grow()
+        self.values[self.count] = value
+        self.sums[self.count + 1] = self.sums[self.count] + self.values[self.count]
+        self.count = self.count + 1
+
+    def extend (self, values):
+        """
+        Records many values at once.
+
+        Args:
+            values: list or ``numpy`` array of values.
+        """
+        values = numpy.asarray(values).ravel()
+        start = 0
+        while start < values.shape[0]:
+            if self.count == self.values.shape[0]:
+                self._grow()
+            size = min(values.shape[0] - start, self.values.shape[0] - self.count)
+            end = self.count + size
+            self.values[self.count:end] = values[start:start + size]
+            self.sums[self.count + 1:end + 1] = self.sums[self.count] + \
+                                                numpy.cumsum(self.values[self.count:end])
+            self.count = end
+            start = start + size
+
+    def drain (self):
+        """
+        Returns the values held in memory and drops them, without spilling them. The length and
+        the running sum are kept as they were.
+
+        Returns:
+            numpy.ndarray: the values that were in memory.
+        """
+        values = self.values[:self.count].copy()
+        self.sums[0] = self.sums[self.count]
+        self.dropped = self.dropped + self.count
+        self.count = 0
+        return values
+
+    def mean (self, last = None):
+        """
+        Mean of the last ``last`` values.
+
+        Args:
+            last: number of values to average. Default is all of them.
+
+        Returns:
+            float: the mean.
+        """
+        total = len(self)
+        if last is None or last > total:
+            last = total
+        if last == 0:
+            return numpy.nan
+        if last <= self.count:
+            return (self.sums[self.count] - self.sums[self.count - last]) / last
+        if last == total:
+            return self.sums[self.count] / total
+        return numpy.mean(self[total - last:])
+
+    def all (self):
+        """
+        Returns all the values, reading the spill file if some were dropped into it.
+
+        Returns:
+            numpy.ndarray: the values.
+        """
+        values = self.values[:self.count]
+        if self.dropped > 0 and self.spill is not None:
+            values = numpy.concatenate([numpy.fromfile(self.spill, dtype = values.dtype,
+                                                       count = self.dropped), values])
+        elif self.dropped > 0:
+            raise Exception ("The first " + str(self.dropped) + " values were dropped")
+        return values.copy()
+
+    def tolist (self):
+        """
+        Returns all the values as a list.
+        """
+        return self.all().tolist()
+
+    def __len__ (self):
+        return self.dropped + self.count
+
+    def __getitem__ (self, key):
+        total = len(self)
+        if isinstance(key, slice):
+            start, stop, step = key.indices(total)
+            if step > 0 and start >= self.dropped:
+                return self.values[start - self.dropped:
+                                   max(stop - self.dropped, 0):step].copy()
+            return self.all()[key]
+        if key < 0:
+            key = key + total
+        if key < 0 or key >= total:
+            raise IndexError ("metric index out of range")
+        if key < self.dropped:
+            return self.all()[key]
+        return self.values[key - self.dropped]
+
+    def __iter__ (self):
+        return iter(self.all())
+
+    def __array__ (self, dtype = None):
+        values = self.all()
+        if dtype is not None:
+            values = values.astype(dtype)
+        return values
+
+    def __repr__ (self):
+        return repr(self.values[:self.count].tolist())
@@ -0,0 +1,320 @@
+"""
+This module runs a network written by :mod:`export` with ``numpy`` alone. Nothing is compiled
+and ``theano`` is not imported, which suits CPU boxes that only serve predictions.
+
+Convolutions are done as one matrix multiplication over unrolled image patches (im2col), and
+every layer writes into buffers that are allocated once per chunk size and reused. The outputs
+match the ones ``theano`` produces for the same inference layers up to floating point error.
+"""
+import json
+from collections import OrderedDict
+
+import numpy
+from yann.utils.serving import serve
+from yann.utils.export import _tuples
+
+def _buffer (buffers, name, shape, dtype):
+    """
+    Internal function that returns the buffer ``name`` of ``shape``, allocating it only if
+    there is no such buffer already.
+    """
+    buffer = buffers.get(name, None)
+    if buffer is None or not buffer.shape == shape or not buffer.dtype == dtype:
+        buffer = numpy.empty(shape, dtype = dtype)
+        buffers[name] = buffer
+    return buffer
+
+def conv2d (x, filters, border_mode = 'valid', stride = (1,1), buffers = None, name = 'conv'):
+    """
+    Convolution of a batch of images with a filter bank, the same as ``theano``'s ``conv2d``.
+
+    Args:
+        x: images of shape ``(batchsize, channels, height, width)``.
+        filters: filters of shape ``(nkerns, channels, filter height, filter width)``.
+        border_mode: ``'valid'`` or ``'full'``.
+        stride: subsample of the output.
+        buffers: dictionary of buffers to reuse. If ``None``, new arrays are allocated.
+        name: name of the buffers of this convolution.
+
+    Returns:
+        numpy.ndarray: of shape ``(batchsize, nkerns, out height, out width)``.
+    """
+    if buffers is None:
+        buffers = {}
+    nkerns, channels, filter_height, filter_width = filters.shape
+    if border_mode == 'full':
+        padded = _buffer(buffers, name + '_pad', (x.shape[0], x.shape[1],
+                                                  x.shape[2] + 2 * (filter_height - 1),
+                                                  x.shape[3] + 2 * (filter_width - 1)), x.dtype)
+        padded.fill(0)
+        padded[:, :, filter_height - 1 : filter_height - 1 + x.shape[2],
+                     filter_width - 1 : filter_width - 1 + x.shape[3]] = x
+        x = padded
+    elif not border_mode == 'valid':
+        raise Exception ("Border mode " + str(border_mode) + " is not supported")
+
+    batchsize, _, height, width = x.shape
+    out_height = (height - filter_height) // stride[0] + 1
+    out_width = (width - filter_width) // stride[1] + 1
+    # One row of patches per filter tap. Each row is copied as a block, which is much faster
+    # than copying the patches one by one.
+    columns = _buffer(buffers, name + '_columns', (channels, filter_height, filter_width,
+                                            batchsize, out_height, out_width), x.dtype)
+    for c in xrange(channels):
+        for i in xrange(filter_height):
+            for j in xrange(filter_width):
+                columns[c, i, j] = x[:, c, i:i + out_height * stride[0]:stride[0],
+                                           j:j + out_width * stride[1]:stride[1]]
+    columns = columns.reshape(channels * filter_height * filter_width, -1)
+    # theano flips the filters, it is a convolution and not a correlation.
+    kernels = filters[:, :, ::-1, ::-1].reshape(nkerns, -1)
+    out = _buffer(buffers, name + '_out', (nkerns, columns.shape[1]), x.dtype)
+    numpy.dot(kernels, columns, out = out)
+    return out.reshape(nkerns, batchsize, out_height, out_width).transpose(1, 0, 2, 3)
+
+def pool2d (x, ds, mode = 'max'):
+    """
+    Pooling with the border ignored, the same as :mod:`pool` does by default.
+
+    Args:
+        x: images of shape ``(batchsize, channels, height, width)``.
+        ds: tuple of pool sizes for rows and columns.
+        mode: ``'max'``, ``'sum'`` or ``'mean'``.
+
+    Returns:
+        numpy.ndarray: pooled images.
+    """
+    out_height = x.shape[2] // ds[0]
+    out_width = x.shape[3] // ds[1]
+    # Reducing a window at a time over strided slices is much faster than reducing over the
+    # inner axes of a reshaped array.
+    out = x[:, :, 0:out_height * ds[0]:ds[0], 0:out_width * ds[1]:ds[1]].copy()
+    for i in xrange(ds[0]):
+        for j in xrange(ds[1]):
+            if i == 0 and j == 0:
+                continue
+            window = x[:, :, i:out_height * ds[0]:ds[0], j:out_width * ds[1]:ds[1]]
+            if mode == 'max':
+                numpy.maximum(out, window, out = out)
+            elif mode == 'sum' or mode == 'mean':
+                out += window
+            else:
+                raise Exception ("Pool type " + str(mode) + " is not supported")
+    if mode == 'mean':
+        out /= ds[0] * ds[1]
+    return out
+
+def batch_norm (x, gamma, beta, mean, var, epsilon = 1e-4):
+    """
+    Batch normalization with the population statistics, the same as ``theano``'s
+    ``batch_normalization_test``. ``x`` is normalized in place.
+    """
+    x -= mean
+    x /= numpy.sqrt(var + epsilon)
+    x *= gamma
+    x += beta
+    return x
+
+def activate (x, activation):
+    """
+    Applies one of the activations of :mod:`activations` to ``x``, in place where possible.
+
+    Args:
+        x: numpy array. The second dimension is the one maxout and softmax run on.
+        activation: same as the ``activation`` argument of ``add_layer``.
+
+    Returns:
+        numpy.ndarray: the activations.
+    """
+    if type(activation) is tuple:
+        if activation[0] == 'relu':
+            return numpy.where(x > 0, x, x * activation[1])
+        if activation[0] == 'softmax':
+            return activate(x / float(activation[1]), 'softmax')
+        if activation[0] == 'maxout':
+            size = activation[2]
+            groups = x.reshape((x.shape[0], x.shape[1] // size, size) + x.shape[2:])
+            if activation[1] == 'maxout':
+                return groups.max(axis = 2)
+            elif activation[1] == 'meanout':
+                return groups.mean(axis = 2)
+            raise Exception ("Maxout type " + str(activation[1]) + " is not supported")
+        raise Exception ("Activation " + str(activation) + " is not supported")
+    if activation == 'relu':
+        return numpy.maximum(x, 0, out = x)
+    elif activation == 'abs':
+        return numpy.abs(x, out = x)
+    elif activation == 'sigmoid':
+        numpy.negative(x, out = x)
+        numpy.exp(x, out = x)
+        x += 1
+        return numpy.reciprocal(x, out = x)
+    elif activation == 'tanh':
+        return numpy.tanh(x, out = x)
+    elif activation == 'squared':
+        return numpy.square(x, out = x)
+    elif activation == 'softmax':
+        x -= x.max(axis = 1, keepdims = True)
+        numpy.exp(x, out = x)
+        x /= x.sum(axis = 1, keepdims = True)
+        return x
+    raise Exception ("Activation " + str(activation) + " is not supported")
+
+class numpy_network (object):
+    """
+    The inference path of a network loaded from a file written by ``export``, run with
+    ``numpy``.
+
+    Args:
+        filename: file written by ``yann.utils.export.export``.
+        verbose: Similar to the rest of the toolbox.
+
+    Notes:
+        Use ``numpy_network.predict`` and ``numpy_network.posterior`` just like the methods of
+        the same name of a cooked network. The outputs of the last chunk run are in buffers that
+        the next call overwrites, the methods return copies.
+    """
+    def __init__ (self, filename, verbose = 2):
+        if verbose >= 2:
+            print(".. Loading the network " + filename + " into the numpy engine")
+        archive = numpy.load(filename)
+        description = json.loads(str(archive['topology']))
+        self.classifier = str(description['classifier'])
+        self.chunk_size = description['chunk_size']
+        self.layers = OrderedDict()
+        self.params = {}
+        for options in description['layers']:
+            options = dict([(str(key), _tuples(value)) for key, value in options.items()])
+            id = options['id']
+            if not options['type'] in ('input', 'conv_pool', 'dot_product', 'classifier',
+                                                            'flatten', 'unflatten', 'merge'):
+                raise Exception ("Layer type " + options['type'] + " is not supported")
+            if options['type'] == 'input':
+                self.height = options['height']
+                self.width = options['width']
+                self.channels = options['channels']
+            self.layers[id] = options
+            self.params[id] = [ archive['param_' + id + '_' + str(count)]
+                                                        for count in xrange(options['params'])]
+            if verbose >= 3:
+                print("... Loaded layer " + id + " of type " + options['type'])
+        archive.close()
+        self.buffers = {}
+
+    def _forward (self, x):
+        """
+        Internal function that runs one chunk through the layers.
+
+        Returns:
+            numpy.ndarray: the output of the classifier.
+        """
+        outputs = {}
+        for id, options in self.layers.items():
+            params = self.params[id]
+            if options['type'] == 'input':
+                out = x.reshape(x.shape[0], self.height, self.width, self.channels)
+                out = out.transpose(0, 3, 1, 2)
+                if options['mean_subtract'] is True:
+                    out = out - out.mean()
+                outputs[id] = out
+                continue
+
+            inputs = [outputs[origin] for origin in options['origin']]
+            if options['type'] == 'conv_pool':
+                out = conv2d( inputs[0], params[0],
+                              border_mode = options['border_mode'],
+                              stride = options['stride'],
+                              buffers = self.buffers,
+                              name = id )
+                if not options['poolsize'] == (1,1):
+                    out = pool2d(out, options['poolsize'], mode = options['pooltype'])
+                else:
+                    out = out.copy()
+                out += params[1].reshape(1, -1, 1, 1)
+                if options['batch_norm'] is True:
+                    out = batch_norm(out, *params[2:6])
+                out = activate(out, options['activation'])
+            elif options['type'] in ('dot_product', 'classifier'):
+                out = _buffer(self.buffers, id, (inputs[0].shape[0], params[0].shape[1]),
+                                                                                params[0].dtype)
+                numpy.dot(inputs[0], params[0], out = out)
+                out += params[1]
+                if options['type'] == 'dot_product' and options['batch_norm'] is True:
+                    out = batch_norm(out, *params[2:6])
+                out = activate(out, options['activation'])
+            elif options['type'] == 'flatten':
+                out = inputs[0].reshape(inputs[0].shape[0], -1)
+            elif options['type'] == 'unflatten':
+                shape = options['shape']
+                out = inputs[0].reshape(inputs[0].shape[0], shape[2], shape[0], shape[1])
+            elif options['merge_type'] == 'sum':
+                out = inputs[0] + inputs[1]
+            else:
+                out = numpy.concatenate(inputs, axis = 1)
+            outputs[id] = out
+        return outputs[self.classifier]
+
+    def _predict_chunk (self, x):
+        """
+        Internal function that runs one chunk through the layers and returns the
+        ``(predictions, probabilities)`` of its samples, like the serving function of a network.
+        """
+        chunk = self._forward(x)
+        return chunk.argmax(axis = 1), numpy.log(chunk)
+
+    def _serve (self, data, chunk_size = None, verbose = 2):
+        """
+        Internal function that runs ``data`` through the network a chunk at a time.
+        """
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+        return serve ( forward = self._predict_chunk,
+                       data = data,
+                       features = self.height * self.width * self.channels,
+                       chunk_size = chunk_size,
+                       dtype = self.params[self.classifier][0].dtype,
+                       verbose = verbose )
+
+    def predict (self, data, chunk_size = None, verbose = 2):
+        """
+        Predicts the classes of any number of samples.
+
+        Args:
+            data: numpy array of samples. Either one vectorized image per row like in the
+                  datastream, or images of shape ``(samples, height, width, channels)``.
+            chunk_size: number of samples run through the network at once. Default is the
+                  number of samples in a cached batch of the network that was exported.
+            verbose: as always
+
+        Returns:
+            numpy.ndarray: predicted class of each sample.
+        """
+        return self._serve(data, chunk_size = chunk_size, verbose = verbose)[0]
+
+    def posterior (self, data, chunk_size = None, verbose = 2):
+        """
+        Same as ``predict``, but returns the classifier's ``probabilities`` of each sample,
+        which like the network's are the log of the softmax.
+
+        Args:
+            data: numpy array of samples.
+            chunk_size: number of samples run through the network at once.
+            verbose: as always
+
+        Returns:
+            numpy.ndarray: probabilities of each sample, one row per sample.
+        """
+        return self._serve(data, chunk_size = chunk_size, verbose = verbose)[1]
+
+def load (filename, verbose = 2):
+    """
+    Loads a network written by ``yann.utils.export.export`` into the numpy engine.
+
+    Args:
+        filename: file written by ``export``.
+        verbose: Similar to the rest of the toolbox.
+
+    Returns:
+        numpy_network: ready to ``predict``.
+    """
+    return numpy_network(filename, verbose = verbose)
@@ -0,0 +1,111 @@
+"""
+This module records where the wall time of training goes. ``network.train(profile = True)``
+creates a :mod:`profiler` and marks the phases of training with it. The report of each epoch is
+handed over to the resultor.
+"""
+import time
+from collections import OrderedDict
+
+phases = ('data', 'train', 'validate', 'visualize', 'results', 'checkpoint')
+
+class profiler(object):
+    """
+    Measures the wall time spent in each phase of training per epoch. Phases can be nested, the
+    time spent in an inner phase is not counted in the outer phase. For instance the time
+    ``validate`` spends loading batches is counted as ``data``.
+
+    Args:
+        enabled: If ``False``, every method does nothing. This lets the trainer mark phases
+                 without checking if profiling is on.
+        phases: names of the phases to record. Default is ``yann.utils.profiler.phases``.
+
+    Notes:
+        ``profiler.epochs`` is a list of all the epoch reports. Each report is an
+        ``OrderedDict`` of the epoch, the seconds spent in each phase, the seconds not spent in
+        any phase as ``other`` and the ``total`` seconds of the epoch.
+    """
+    def __init__(self, enabled = True, phases = phases):
+        self.enabled = enabled
+        self.phases = list(phases)
+        self.epochs = []
+        self.stack = []
+        self._reset()
+
+    def _reset(self):
+        """
+        Internal function that starts the clock of a new epoch.
+        """
+        self.current = OrderedDict()
+        for phase in self.phases:
+            self.current[phase] = 0.
+        self.epoch_start = time.time()
+        self.phase_start = self.epoch_start
+
+    def begin(self, phase):
+        """
+        Marks the beginning of a phase.
+
+        Args:
+            phase: name of the phase. Must be one of ``profiler.phases``.
+        """
+        if self.enabled is False:
+            return
+        now = time.time()
+        if len(self.stack) > 0:
+            self.current[self.stack[-1]] += now - self.phase_start
+        self.stack.append(phase)
+        self.phase_start = now
+
+    def end(self):
+        """
+        Marks the end of the phase that began last.
+        """
+        if self.enabled is False:
+            return
+        now = time.time()
+        self.current[self.stack.pop()] += now - self.phase_start
+        self.phase_start = now
+
+    def end_epoch(self, epoch):
+        """
+        Closes the report of the epoch and starts the next one.
+
+        Args:
+            epoch: the epoch that ended.
+
+        Returns:
+            OrderedDict: the report of the epoch, ``None`` if not enabled.
+        """
+        if self.enabled is False:
+            return None
+        total = time.time() - self.epoch_start
+        report = OrderedDict()
+        report['epoch'] = epoch
+        report.update(self.current)
+        report['other'] = total - sum(self.current.values())
+        report['total'] = total
+        self.epochs.append(report)
+        self._reset()
+        return report
+
+    def discard_epoch(self):
+        """
+        Forgets the time recorded so far in the current epoch and starts it again. Used when an
+        epoch is restarted after a ``NaN`` cost.
+        """
+        if self.enabled is False:
+            return
+        self.stack = []
+        self._reset()
+
+    def summary(self):
+        """
+        Adds up the reports of all the epochs.
+
+        Returns:
+            OrderedDict: total seconds spent in each phase, ``other`` and ``total``.
+        """
+        summary = OrderedDict()
+        for key in self.phases + ['other', 'total']:
+            summary[key] = sum(report[key] for report in self.epochs)
+        return summary
@@ -0,0 +1,48 @@
+"""
+This module has what all the ways of serving a classifier share. A cooked network, a network
+loaded by :mod:`export` and one loaded into the :mod:`numpy_engine` each provide a function that
+runs one chunk of samples forward, and ``serve`` runs any number of samples through it a chunk
+at a time. Only ``numpy`` is imported here.
+"""
+import numpy
+
+def serve (forward, data, features, chunk_size, dtype, verbose = 2):
+    """
+    Runs ``data`` through ``forward`` a chunk at a time.
+
+    Args:
+        forward: function that takes a chunk of samples, one per row, and returns their
+            ``(predictions, probabilities)``.
+        data: numpy array of samples. Either one vectorized image per row like in the
+              datastream, or images of shape ``(samples, height, width, channels)``.
+        features: number of features each sample must have.
+        chunk_size: number of samples sent to ``forward`` at once.
+        dtype: ``dtype`` of the samples that ``forward`` takes.
+        verbose: as always
+
+    Returns:
+        tuple: ``(predictions, probabilities)`` numpy arrays.
+    """
+    data = numpy.asarray(data, dtype = dtype)
+    if data.ndim == 0 or data.shape[0] == 0:
+        raise Exception ("There are no samples to serve")
+    samples = data.shape[0]
+    data = data.reshape(samples, -1)
+    if not data.shape[1] == features:
+        raise Exception ("Each sample must have " + str(features) + " features, found " + \
+                                                                            str(data.shape[1]))
+    if verbose >= 3:
+        print("... Serving " + str(samples) + " samples in chunks of " + str(chunk_size))
+
+    predictions = None
+    probabilities = None
+    for start in xrange(0, samples, chunk_size):
+        chunk_predictions, chunk_probabilities = forward(data[start:start + chunk_size])
+        if predictions is None:
+            predictions = numpy.zeros((samples,) + chunk_predictions.shape[1:],
+                                      dtype = chunk_predictions.dtype)
+            probabilities = numpy.zeros((samples,) + chunk_probabilities.shape[1:],
+                                      dtype = chunk_probabilities.dtype)
+        predictions[start:start + chunk_size] = chunk_predictions
+        probabilities[start:start + chunk_size] = chunk_probabilities
+    return predictions, probabilities
@@ -0,0 +1,104 @@
+"""
+This module runs side effects such as saving images and appending to result files in a
+background process, so that training doesn't wait on rendering or the disk.
+
+Jobs are plain module level functions with their arguments. Whatever a job needs from the
+network must be copied into ``numpy`` arrays or strings before it is put, because training goes
+on changing the parameters while the job waits. The queue of jobs is bounded. When it is full,
+``put`` blocks till the process catches up, so a slow disk slows training down instead of piling
+up copies in memory.
+
+A process is used rather than a thread because rasterizing images holds the interpreter lock,
+which a thread would have to share with training.
+"""
+import multiprocessing
+
+def _run (jobs, errors):
+    """
+    This runs in the writing process. Jobs are run in the order they were put. A ``None`` job
+    stops the process.
+
+    Args:
+        jobs: ``multiprocessing.JoinableQueue`` of ``(function, args, kwargs)``.
+        errors: sending end of a ``multiprocessing.Pipe`` to report failed jobs on.
+    """
+    while True:
+        job = jobs.get()
+        if job is None:
+            jobs.task_done()
+            break
+        function, args, kwargs = job
+        try:
+            function(*args, **kwargs)
+        except Exception as error:
+            errors.send(function.__name__ + ': ' + repr(error))
+        jobs.task_done()
+
+class writer(object):
+    """
+    A background process that runs jobs in the order they were put.
+
+    Args:
+        size: number of jobs that can wait in the queue. Default is ``16``.
+        verbose: Similar to the rest of the toolbox.
+
+    Notes:
+        A job that fails doesn't stop the process. The error is raised by the next ``put``,
+        ``wait`` or ``close``.
+    """
+    def __init__ (self, size = 16, verbose = 2):
+        if verbose >= 3:
+            print("... Starting the background writer")
+        self.jobs = multiprocessing.JoinableQueue(maxsize = size)
+        self.errors, errors = multiprocessing.Pipe(duplex = False)
+        self.process = multiprocessing.Process( target = _run,
+                                                args = (self.jobs, errors) )
+        self.process.daemon = True
+        self.process.start()
+
+    def _raise (self):
+        """
+        Internal function that raises the errors of the jobs that failed.
+        """
+        errors = []
+        while self.errors.poll():
+            try:
+                errors.append(self.errors.recv())
+            except EOFError:    # the process has stopped.
+                break
+        if len(errors) > 0:
+            raise Exception ("Background writes failed with " + ', '.join(errors))
+
+    def put (self, function, *args, **kwargs):
+        """
+        Queues ``function(*args, **kwargs)`` to be run in the background. Blocks if the queue
+        is full.
+
+        Args:
+            function: the job, a module level function.
+            args: arguments of the job, already copied.
+            kwargs: keyword arguments of the job, already copied.
+        """
+        self._raise()
+        self.jobs.put((function, args, kwargs))
+
+    def wait (self):
+        """
+        Waits till all the jobs put so far are done.
+        """
+        self.jobs.join()
+        self._raise()
+
+    def close (self, verbose = 2):
+        """
+        Waits for all the jobs and stops the process.
+
+        Args:
+            verbose: as always
+        """
+        if verbose >= 3:
+            print("... Stopping the background writer")
+        self.jobs.put(None)
+        self.jobs.join()
+        self.process.join()
+        self._raise()